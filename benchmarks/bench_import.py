@@ -0,0 +1,117 @@
+"""Times importing the package's entry points in fresh interpreters.
+
+Each statement is run in a new Python process, and the time spent executing it
+(not the interpreter startup) is reported as the best of `--repeats` runs. Heavy
+third party modules pulled in by each statement are listed too, since they are
+usually what a regression comes from.
+
+Results are written as JSON. Passing `--baseline` compares against a previous
+results file, reports imports that got slower, and exits with status 1 if any did.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_import.py --out results.json
+    PYTHONPATH=src python benchmarks/bench_import.py --baseline results.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+STATEMENTS = [
+    'import midout.gen',
+    'from midout.gen import NoiseModel',
+    'from zxxz_surface_code_circuits import make_zxxz_memory_circuit',
+    'from midout.gen import to_z_basis_interaction_circuit',
+    'from midout._make_circuit import make_circuit',
+    'from zxxz_surface_code_circuits import sinter_tasks',
+]
+HEAVY_MODULES = ['numpy', 'sinter', 'matplotlib', 'scipy', 'pymatching', 'importlib.metadata']
+
+_PROGRAM = '''
+import sys, time, json
+t0 = time.perf_counter()
+exec(sys.argv[1])
+t1 = time.perf_counter()
+print(json.dumps({'seconds': t1 - t0, 'heavy': [m for m in json.loads(sys.argv[2]) if m in sys.modules]}))
+'''
+
+
+def time_import(statement: str) -> Dict[str, Any]:
+    out = subprocess.run(
+        [sys.executable, '-c', _PROGRAM, statement, json.dumps(HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def run(*, statements: List[str], repeats: int) -> List[Dict[str, Any]]:
+    results = []
+    for statement in statements:
+        runs = [time_import(statement) for _ in range(repeats)]
+        best = min(r['seconds'] for r in runs)
+        heavy = runs[0]['heavy']
+        results.append({'statement': statement, 'seconds': best, 'heavy_modules': heavy})
+        print(f'{best * 1e3:8.1f}ms  {statement}  [{", ".join(heavy)}]', file=sys.stderr)
+    return results
+
+
+def compare(*, results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float, min_delta: float) -> List[str]:
+    """Returns a description of each import that got slower than the baseline allows."""
+    old = {e['statement']: e for e in baseline}
+    regressions = []
+    for e in results:
+        if e['statement'] not in old:
+            continue
+        before = old[e['statement']]['seconds']
+        after = e['seconds']
+        if after > before * tolerance and after - before > min_delta:
+            new_heavy = sorted(set(e['heavy_modules']) - set(old[e['statement']]['heavy_modules']))
+            suffix = f' (now imports {", ".join(new_heavy)})' if new_heavy else ''
+            regressions.append(f'{e["statement"]!r}: {before * 1e3:.1f}ms -> {after * 1e3:.1f}ms{suffix}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--statements', nargs='+', default=STATEMENTS)
+    parser.add_argument('--repeats', type=int, default=5, help='Each timing is the best of this many runs.')
+    parser.add_argument('--out', type=str, default=None, help='Where to write the JSON results. Defaults to stdout.')
+    parser.add_argument('--baseline', type=str, default=None, help='A previous JSON results file to compare against.')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='Slowdown ratio flagged as a regression.')
+    parser.add_argument('--min_delta', type=float, default=0.02, help='Ignore slowdowns smaller than this many seconds.')
+    args = parser.parse_args()
+
+    results = run(statements=args.statements, repeats=args.repeats)
+    payload = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+    text = json.dumps(payload, indent=2)
+    if args.out is None:
+        print(text)
+    else:
+        with open(args.out, 'w') as f:
+            print(text, file=f)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results=results, baseline=baseline, tolerance=args.tolerance, min_delta=args.min_delta)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Measures peak memory use of circuit generation across code distances.
+
+Each (basis, distance) point is generated in a fresh Python process, which reports
+its peak resident set size (RSS) after generating the noisy circuit, and the RSS
+right after importing the package (so the difference is what generation costs).
+
+Results are written as JSON. Passing `--baseline` compares against a previous
+results file, reports points whose peak RSS grew, and exits with status 1 if any did.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_memory.py --distances 15 25 31 --out results.json
+    PYTHONPATH=src python benchmarks/bench_memory.py --distances 15 25 31 --baseline results.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+from bench_pipeline import MIDOUT_BASES, ZXXZ_BASES
+
+_PROGRAM = '''
+import json, resource, sys
+from midout import gen
+from midout._make_circuit import make_circuit
+from zxxz_surface_code_circuits import make_zxxz_memory_circuit
+
+def rss_mb():
+    # ru_maxrss is in kilobytes on Linux (and bytes on macOS).
+    scale = 1 / 1024**2 if sys.platform == 'darwin' else 1 / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+basis, distance, rounds, p = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4])
+noise = gen.NoiseModel.uniform_depolarizing(p)
+# Touch the modules generation will import, so they count towards the import baseline.
+gen.Chunk, gen.compile_chunks_into_circuit, gen.to_z_basis_interaction_circuit
+import_rss = rss_mb()
+if basis.startswith('zxxz_'):
+    circuit = noise.noisy_circuit(make_zxxz_memory_circuit(distance=distance, basis=basis[-1], rounds=rounds))
+else:
+    circuit = make_circuit(
+        basis=basis,
+        noise=noise,
+        boundary_rounds=0 if basis == 'Y_folded' else 2,
+        memory_rounds=rounds,
+        distance=distance,
+    )
+print(json.dumps({'import_rss_mb': import_rss, 'peak_rss_mb': rss_mb()}))
+'''
+
+
+def measure(*, basis: str, distance: int, rounds: int, noise_strength: float) -> Dict[str, float]:
+    out = subprocess.run(
+        [sys.executable, '-c', _PROGRAM, basis, str(distance), str(rounds), str(noise_strength)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def run(*, bases: List[str], distances: List[int], rounds: Any, noise_strength: float) -> List[Dict[str, Any]]:
+    results = []
+    for basis in bases:
+        for distance in distances:
+            r = distance if rounds is None else rounds
+            try:
+                m = measure(basis=basis, distance=distance, rounds=r, noise_strength=noise_strength)
+            except subprocess.CalledProcessError as ex:
+                error = ex.stderr.strip().splitlines()[-1] if ex.stderr.strip() else str(ex)
+                results.append({'basis': basis, 'distance': distance, 'rounds': r, 'error': error})
+                print(f'{basis:>20} d={distance:<3} r={r:<3} error: {error}', file=sys.stderr)
+                continue
+            results.append({'basis': basis, 'distance': distance, 'rounds': r, **m})
+            print(f'{basis:>20} d={distance:<3} r={r:<3} peak={m["peak_rss_mb"]:8.1f}MB '
+                  f'generation={m["peak_rss_mb"] - m["import_rss_mb"]:8.1f}MB', file=sys.stderr)
+    return results
+
+
+def _key(result: Dict[str, Any]) -> Tuple[Any, ...]:
+    return result['basis'], result['distance'], result['rounds']
+
+
+def compare(*, results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float, min_delta: float) -> List[str]:
+    """Returns a description of each point whose peak RSS grew more than the baseline allows."""
+    old = {_key(e): e['peak_rss_mb'] for e in baseline if 'peak_rss_mb' in e}
+    regressions = []
+    for e in results:
+        if 'peak_rss_mb' not in e or _key(e) not in old:
+            continue
+        before = old[_key(e)]
+        after = e['peak_rss_mb']
+        if after > before * tolerance and after - before > min_delta:
+            basis, distance, rounds = _key(e)
+            regressions.append(f'{basis} d={distance} r={rounds}: {before:.1f}MB -> {after:.1f}MB ({after / before:.2f}x)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bases', nargs='+', default=MIDOUT_BASES + ZXXZ_BASES, choices=MIDOUT_BASES + ZXXZ_BASES)
+    parser.add_argument('--distances', type=int, nargs='+', default=[15, 25, 31])
+    parser.add_argument('--rounds', type=int, default=None, help='Memory rounds. Defaults to the distance.')
+    parser.add_argument('--noise', type=float, default=1e-3, help='Uniform depolarizing noise strength.')
+    parser.add_argument('--out', type=str, default=None, help='Where to write the JSON results. Defaults to stdout.')
+    parser.add_argument('--baseline', type=str, default=None, help='A previous JSON results file to compare against.')
+    parser.add_argument('--tolerance', type=float, default=1.1, help='Growth ratio flagged as a regression.')
+    parser.add_argument('--min_delta', type=float, default=5, help='Ignore growth smaller than this many megabytes.')
+    args = parser.parse_args()
+
+    results = run(
+        bases=args.bases,
+        distances=args.distances,
+        rounds=args.rounds,
+        noise_strength=args.noise,
+    )
+    payload = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'noise': args.noise,
+        },
+        'results': results,
+    }
+    text = json.dumps(payload, indent=2)
+    if args.out is None:
+        print(text)
+    else:
+        with open(args.out, 'w') as f:
+            print(text, file=f)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results=results, baseline=baseline, tolerance=args.tolerance, min_delta=args.min_delta)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
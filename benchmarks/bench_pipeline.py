@@ -0,0 +1,205 @@
+"""Times each stage of circuit generation across code distances.
+
+Stages (each timed separately, on the output of the previous one):
+    chunks   building the experiment's chunks
+    verify   `Chunk.verify` on every chunk (memoization disabled)
+    compile  `compile_chunks_into_circuit`
+    to_cz    `to_z_basis_interaction_circuit` (midout experiments only)
+    noise    `NoiseModel.noisy_circuit`
+    dem      `stim.Circuit.detector_error_model(decompose_errors=True)`
+
+Results are written as JSON. Passing `--baseline` compares against a previous
+results file, reports stages that got slower, and exits with status 1 if any did.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_pipeline.py --distances 3 5 7 --out results.json
+    PYTHONPATH=src python benchmarks/bench_pipeline.py --distances 3 5 7 --baseline results.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import stim
+
+from midout import gen
+from midout._make_circuit import make_circuit_chunks, split_magic_head_and_tail
+from midout.circuits.steps._patches import clear_patch_memo
+from zxxz_surface_code_circuits.zxxz_circuit import make_zxxz_memory_experiment_chunks
+
+MIDOUT_BASES = [
+    'X',
+    'Z',
+    'Y',
+    'Y_folded',
+    'Y_braid',
+    'Y_magic_measure',
+    'Y_magic_transition',
+    'Y_magic_idle',
+    'Z_magic_idle',
+    'X_magic_idle',
+]
+ZXXZ_BASES = ['zxxz_X', 'zxxz_Z']
+STAGES = ['chunks', 'verify', 'compile', 'to_cz', 'noise', 'dem']
+
+
+def _timed(stage: str, timings: Dict[str, float], func: Callable[[], Any]) -> Any:
+    t0 = time.perf_counter()
+    result = func()
+    timings[stage] = time.perf_counter() - t0
+    return result
+
+
+def _verify_all(chunks: List[gen.Chunk]) -> None:
+    for chunk in chunks:
+        chunk.verify(use_memo=False)
+
+
+def time_midout_pipeline(*, basis: str, distance: int, rounds: int, noise: gen.NoiseModel, stages: List[str]) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    boundary_rounds = 0 if basis == 'Y_folded' else 2
+    chunks, skip_mpp_head, skip_mpp_tail = _timed('chunks', timings, lambda: make_circuit_chunks(
+        basis=basis,
+        boundary_rounds=boundary_rounds,
+        memory_rounds=rounds,
+        distance=distance,
+    ))
+    if 'verify' in stages:
+        _timed('verify', timings, lambda: _verify_all(chunks))
+    circuit = _timed('compile', timings, lambda: gen.compile_chunks_into_circuit(chunks))
+    head, body, tail = split_magic_head_and_tail(circuit, skip_mpp_head=skip_mpp_head, skip_mpp_tail=skip_mpp_tail)
+    if 'to_cz' in stages or 'noise' in stages or 'dem' in stages:
+        body = _timed('to_cz', timings, lambda: gen.to_z_basis_interaction_circuit(body))
+    if 'noise' in stages or 'dem' in stages:
+        body = _timed('noise', timings, lambda: noise.noisy_circuit(body))
+    if 'dem' in stages:
+        noisy = head + body + tail
+        _timed('dem', timings, lambda: noisy.detector_error_model(decompose_errors=True))
+    return {k: v for k, v in timings.items() if k in stages}
+
+
+def time_zxxz_pipeline(*, basis: str, distance: int, rounds: int, noise: gen.NoiseModel, stages: List[str]) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    chunks = _timed('chunks', timings, lambda: make_zxxz_memory_experiment_chunks(
+        distance=distance,
+        basis=basis,
+        rounds=rounds,
+    ))
+    if 'verify' in stages:
+        _timed('verify', timings, lambda: _verify_all(chunks))
+    circuit = _timed('compile', timings, lambda: gen.compile_chunks_into_circuit(chunks))
+    if 'noise' in stages or 'dem' in stages:
+        circuit = _timed('noise', timings, lambda: noise.noisy_circuit(circuit))
+    if 'dem' in stages:
+        _timed('dem', timings, lambda: circuit.detector_error_model(decompose_errors=True))
+    return {k: v for k, v in timings.items() if k in stages}
+
+
+def run(*, bases: List[str], distances: List[int], rounds: Optional[int], noise_strength: float, stages: List[str], repeats: int) -> List[Dict[str, Any]]:
+    results = []
+    for basis in bases:
+        for distance in distances:
+            r = distance if rounds is None else rounds
+            best: Dict[str, float] = {}
+            error = None
+            for _ in range(repeats):
+                # A fresh model and an empty patch memo per run, so memoized noisy loop
+                # bodies and patches don't make later runs faster than a real (first) run.
+                noise = gen.NoiseModel.uniform_depolarizing(noise_strength)
+                clear_patch_memo()
+                try:
+                    if basis in ZXXZ_BASES:
+                        timings = time_zxxz_pipeline(basis=basis[-1], distance=distance, rounds=r, noise=noise, stages=stages)
+                    else:
+                        timings = time_midout_pipeline(basis=basis, distance=distance, rounds=r, noise=noise, stages=stages)
+                except Exception as ex:
+                    error = f'{type(ex).__name__}: {ex}'
+                    break
+                for k, v in timings.items():
+                    best[k] = min(best.get(k, float('inf')), v)
+            if error is not None:
+                results.append({'basis': basis, 'distance': distance, 'rounds': r, 'stage': None, 'error': error})
+                print(f'{basis:>20} d={distance:<3} r={r:<3} error: {error}', file=sys.stderr)
+                continue
+            for stage in STAGES:
+                if stage in best:
+                    results.append({'basis': basis, 'distance': distance, 'rounds': r, 'stage': stage, 'seconds': best[stage]})
+            summary = ' '.join(f'{stage}={best[stage]:.3f}s' for stage in STAGES if stage in best)
+            print(f'{basis:>20} d={distance:<3} r={r:<3} {summary}', file=sys.stderr)
+    return results
+
+
+def _key(result: Dict[str, Any]) -> Tuple[Any, ...]:
+    return result['basis'], result['distance'], result['rounds'], result['stage']
+
+
+def compare(*, results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float, min_delta: float) -> List[str]:
+    """Returns a description of each stage that got slower than the baseline allows."""
+    old = {_key(e): e['seconds'] for e in baseline if 'seconds' in e}
+    regressions = []
+    for e in results:
+        if 'seconds' not in e or _key(e) not in old:
+            continue
+        before = old[_key(e)]
+        after = e['seconds']
+        if after > before * tolerance and after - before > min_delta:
+            basis, distance, rounds, stage = _key(e)
+            regressions.append(f'{basis} d={distance} r={rounds} {stage}: {before:.3f}s -> {after:.3f}s ({after / before:.2f}x)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bases', nargs='+', default=MIDOUT_BASES + ZXXZ_BASES, choices=MIDOUT_BASES + ZXXZ_BASES)
+    parser.add_argument('--distances', type=int, nargs='+', default=list(range(3, 32, 2)))
+    parser.add_argument('--rounds', type=int, default=None, help='Memory rounds. Defaults to the distance.')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--noise', type=float, default=1e-3, help='Uniform depolarizing noise strength.')
+    parser.add_argument('--repeats', type=int, default=1, help='Each timing is the best of this many runs.')
+    parser.add_argument('--out', type=str, default=None, help='Where to write the JSON results. Defaults to stdout.')
+    parser.add_argument('--baseline', type=str, default=None, help='A previous JSON results file to compare against.')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Slowdown ratio flagged as a regression.')
+    parser.add_argument('--min_delta', type=float, default=0.01, help='Ignore slowdowns smaller than this many seconds.')
+    args = parser.parse_args()
+
+    results = run(
+        bases=args.bases,
+        distances=args.distances,
+        rounds=args.rounds,
+        noise_strength=args.noise,
+        stages=args.stages,
+        repeats=args.repeats,
+    )
+    payload = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'stim': stim.__version__,
+            'noise': args.noise,
+            'repeats': args.repeats,
+        },
+        'results': results,
+    }
+    text = json.dumps(payload, indent=2)
+    if args.out is None:
+        print(text)
+    else:
+        with open(args.out, 'w') as f:
+            print(text, file=f)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results=results, baseline=baseline, tolerance=args.tolerance, min_delta=args.min_delta)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
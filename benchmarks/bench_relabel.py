@@ -0,0 +1,77 @@
+"""Micro-benchmark for `relabel_circuit_into`.
+
+Compares the bulk relabeling against the original target-by-target rebuild, for both
+an identity mapping (the common single-patch case) and a shifted mapping.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_relabel.py --distances 5 15 25
+"""
+import argparse
+import time
+from typing import Callable, Dict
+
+import stim
+
+from midout.circuits._xz_memory_circuits import make_xz_memory_experiment_chunks
+from midout.gen._flow_util import relabel_circuit_into
+
+
+def relabel_circuit_into_per_target(*, circuit: stim.Circuit, old_q2i: Dict[complex, int], new_q2i: Dict[complex, int], out: stim.Circuit):
+    """The original implementation, kept here as the comparison baseline."""
+    i2i = {i: new_q2i[q] for q, i in old_q2i.items()}
+    for inst in circuit:
+        if inst.name == 'QUBIT_COORDS':
+            continue
+        targets = []
+        for t in inst.targets_copy():
+            if t.is_qubit_target:
+                targets.append(i2i[t.value])
+            elif t.is_x_target:
+                targets.append(stim.target_x(i2i[t.value]))
+            elif t.is_y_target:
+                targets.append(stim.target_y(i2i[t.value]))
+            elif t.is_z_target:
+                targets.append(stim.target_z(i2i[t.value]))
+            elif t.is_combiner:
+                targets.append(t)
+            else:
+                raise NotImplementedError(f'{inst=}')
+        out.append(inst.name, targets, inst.gate_args_copy())
+
+
+def _time(func: Callable[[], None], repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--distances', type=int, nargs='+', default=[5, 15, 25])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'d':>4} {'mapping':>8} {'per-target':>12} {'bulk':>12} {'speedup':>8}")
+    for distance in args.distances:
+        chunk = make_xz_memory_experiment_chunks(distance=distance, memory_rounds=3, boundary_rounds=0, basis='X')[1]
+        mappings = {
+            'identity': dict(chunk.q2i),
+            'shifted': {q: i + 1 for q, i in chunk.q2i.items()},
+        }
+        for name, new_q2i in mappings.items():
+            expected = stim.Circuit()
+            relabel_circuit_into_per_target(circuit=chunk.circuit, old_q2i=chunk.q2i, new_q2i=new_q2i, out=expected)
+            actual = stim.Circuit()
+            relabel_circuit_into(circuit=chunk.circuit, old_q2i=chunk.q2i, new_q2i=new_q2i, out=actual)
+            assert actual == expected
+
+            t_old = _time(lambda: relabel_circuit_into_per_target(circuit=chunk.circuit, old_q2i=chunk.q2i, new_q2i=new_q2i, out=stim.Circuit()), args.repeats)
+            t_new = _time(lambda: relabel_circuit_into(circuit=chunk.circuit, old_q2i=chunk.q2i, new_q2i=new_q2i, out=stim.Circuit()), args.repeats)
+            print(f"{distance:>4} {name:>8} {t_old * 1e3:>10.2f}ms {t_new * 1e3:>10.2f}ms {t_old / t_new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
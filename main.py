@@ -12,8 +12,9 @@ def main():
     print(circuit)
     noise_model = gen.NoiseModel.si1000(p=0.001)
     noisy_circuit = noise_model.noisy_circuit(circuit)
-    dem = noisy_circuit.detector_error_model()
-    assert len(dem.shortest_graphlike_error()) == d
+    # Reruns reuse the extracted model and its distance instead of recomputing them.
+    dem_cache = gen.DemCache('.dem_cache')
+    assert dem_cache.graphlike_distance(noisy_circuit) == d
 
 
 if __name__ == "__main__":
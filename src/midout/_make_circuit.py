@@ -1,5 +1,5 @@
 import pathlib
-from typing import Union, Any, Optional
+from typing import Union, Any, Optional, Tuple, List
 
 import stim
 
@@ -19,6 +19,14 @@ def _write(path: Any, content: Any):
     print(f'wrote file://{path.absolute()}')
 
 
+def _detector_slice_svg(circuit: stim.Circuit, *, collapse_loops: bool) -> str:
+    if collapse_loops:
+        # Same number of iterations as the collapsed HTML viewers draw.
+        circuit = gen.stim_circuit_with_shortened_loops(circuit, 3)
+    return str(circuit.diagram("time+detector-slice-svg"))
+
+
+@gen.traced()
 def make_circuit(
     *,
     basis: str,
@@ -27,9 +35,137 @@ def make_circuit(
     memory_rounds: int,
     distance: int,
     verify_chunks: bool = False,
+    verify_workers: int = 1,
     debug_out_dir: Union[None, str, pathlib.Path] = None,
+    debug_collapse_loops: bool = True,
+    debug_known_error_time_budget: Optional[float] = 30,
     convert_to_cz: bool = True,
+    cache: Optional[gen.CircuitCache] = None,
 ):
+    """Generates a noisy experiment circuit of the given kind.
+
+    When `cache` is given (and `debug_out_dir` isn't), the circuit is read from the
+    cache if it was previously generated with the same parameters. Chunks are only
+    verified when the circuit actually has to be generated. Verification runs in
+    the calling process unless `verify_workers` says otherwise, since make_circuit
+    is itself often called from pool workers.
+
+    The HTML viewers written to `debug_out_dir` draw only the first and last
+    iterations of each loop (plus one marked as standing for the rest), and the
+    detector slice diagrams cut each loop to three iterations, unless
+    `debug_collapse_loops` is False. Their highlighted shortest error is skipped
+    if it takes longer than `debug_known_error_time_budget` seconds to find.
+    """
+    if cache is not None and debug_out_dir is None:
+        return cache.get_or_make(
+            {
+                'generator': 'midout.make_circuit',
+                'basis': basis,
+                'noise': noise,
+                'boundary_rounds': boundary_rounds,
+                'memory_rounds': memory_rounds,
+                'distance': distance,
+                'convert_to_cz': convert_to_cz,
+            },
+            lambda: make_circuit(
+                basis=basis,
+                noise=noise,
+                boundary_rounds=boundary_rounds,
+                memory_rounds=memory_rounds,
+                distance=distance,
+                verify_chunks=verify_chunks,
+                verify_workers=verify_workers,
+                convert_to_cz=convert_to_cz,
+            ),
+        )
+
+    with gen.trace_span('make_circuit_chunks', basis=basis, distance=distance, memory_rounds=memory_rounds):
+        chunks, skip_mpp_head, skip_mpp_tail = make_circuit_chunks(
+            basis=basis,
+            boundary_rounds=boundary_rounds,
+            memory_rounds=memory_rounds,
+            distance=distance,
+        )
+
+    if debug_out_dir is not None:
+        patches = [chunk.end_patch() for chunk in chunks[:-1]]
+        changed_patches = [patches[k] for k in range(len(patches)) if k == 0 or patches[k] != patches[k-1]]
+        allowed_qubits = {q for patch in changed_patches for q in patch.used_set}
+        _write(debug_out_dir / "patch.svg", gen.patch_svg_viewer(
+            changed_patches,
+            show_order=False,
+            available_qubits=allowed_qubits,
+        ))
+
+    if verify_chunks:
+        with gen.trace_span('verify_chunks'):
+            gen.verify_chunks(chunks, workers=verify_workers)
+
+    if debug_out_dir is not None:
+        ignore_errors_ideal_circuit = gen.compile_chunks_into_circuit(chunks, ignore_errors=True)
+        _write(debug_out_dir / "ideal_circuit.html", gen.stim_circuit_html_viewer(
+            ignore_errors_ideal_circuit,
+            patch={k: chunks[k].end_patch() for k in range(len(chunks))},
+            collapse_loops=debug_collapse_loops,
+            known_error_in_background=True,
+            known_error_time_budget=debug_known_error_time_budget,
+        ))
+        _write(debug_out_dir / "ideal_circuit.stim", ignore_errors_ideal_circuit)
+        _write(debug_out_dir / "ideal_circuit_dets.svg", _detector_slice_svg(ignore_errors_ideal_circuit, collapse_loops=debug_collapse_loops))
+
+    magic_head, body, magic_tail = split_magic_head_and_tail(
+        gen.compile_chunks_into_circuit(chunks),
+        skip_mpp_head=skip_mpp_head,
+        skip_mpp_tail=skip_mpp_tail,
+    )
+
+    if convert_to_cz:
+        body = gen.to_z_basis_interaction_circuit(body)
+        if debug_out_dir is not None:
+            ideal_circuit = magic_head + body + magic_tail
+            _write(debug_out_dir / "ideal_cz_circuit.html", gen.stim_circuit_html_viewer(
+                ideal_circuit,
+                patch=chunks[0].end_patch(),
+                collapse_loops=debug_collapse_loops,
+                known_error_in_background=True,
+                known_error_time_budget=debug_known_error_time_budget,
+            ))
+            _write(debug_out_dir / "ideal_cz_circuit.stim", ideal_circuit)
+            _write(debug_out_dir / "ideal_cz_circuit_dets.svg", _detector_slice_svg(ideal_circuit, collapse_loops=debug_collapse_loops))
+
+    if noise is not None:
+        with gen.trace_span('noisy_circuit'):
+            body = noise.noisy_circuit(body)
+    noisy_circuit = magic_head + body + magic_tail
+
+    if debug_out_dir is not None:
+        _write(debug_out_dir / "noisy_circuit.html", gen.stim_circuit_html_viewer(
+            noisy_circuit,
+            patch=chunks[0].end_patch(),
+            collapse_loops=debug_collapse_loops,
+            known_error_in_background=True,
+            known_error_time_budget=debug_known_error_time_budget,
+        ))
+        _write(debug_out_dir / "noisy_circuit.stim", noisy_circuit)
+        _write(debug_out_dir / "noisy_circuit_dets.svg", _detector_slice_svg(noisy_circuit, collapse_loops=debug_collapse_loops))
+
+    return noisy_circuit
+
+
+def make_circuit_chunks(
+    *,
+    basis: str,
+    boundary_rounds: int,
+    memory_rounds: int,
+    distance: int,
+) -> Tuple[List[gen.Chunk], bool, bool]:
+    """Returns the chunks of the experiment `make_circuit` would generate.
+
+    Returns:
+        A (chunks, skip_mpp_head, skip_mpp_tail) tuple. The booleans say whether
+        the compiled circuit starts (ends) with magic MPP layers that must be
+        kept out of the CZ conversion and noise.
+    """
     skip_mpp_head = False
     skip_mpp_tail = False
     if basis == 'Y':
@@ -99,62 +235,21 @@ def make_circuit(
     else:
         raise NotImplementedError(f'{basis=}')
 
-    if debug_out_dir is not None:
-        patches = [chunk.end_patch() for chunk in chunks[:-1]]
-        changed_patches = [patches[k] for k in range(len(patches)) if k == 0 or patches[k] != patches[k-1]]
-        allowed_qubits = {q for patch in changed_patches for q in patch.used_set}
-        _write(debug_out_dir / "patch.svg", gen.patch_svg_viewer(
-            changed_patches,
-            show_order=False,
-            available_qubits=allowed_qubits,
-        ))
+    return chunks, skip_mpp_head, skip_mpp_tail
 
-    if verify_chunks:
-        for chunk in chunks:
-            chunk.verify()
 
-    if debug_out_dir is not None:
-        ignore_errors_ideal_circuit = gen.compile_chunks_into_circuit(chunks, ignore_errors=True)
-        _write(debug_out_dir / "ideal_circuit.html", gen.stim_circuit_html_viewer(
-            ignore_errors_ideal_circuit,
-            patch={k: chunks[k].end_patch() for k in range(len(chunks))},
-        ))
-        _write(debug_out_dir / "ideal_circuit.stim", ignore_errors_ideal_circuit)
-        _write(debug_out_dir / "ideal_circuit_dets.svg", ignore_errors_ideal_circuit.diagram("time+detector-slice-svg"))
-
-    body = gen.compile_chunks_into_circuit(chunks)
+def split_magic_head_and_tail(
+    circuit: stim.Circuit,
+    *,
+    skip_mpp_head: bool,
+    skip_mpp_tail: bool,
+) -> Tuple[stim.Circuit, stim.Circuit, stim.Circuit]:
+    """Splits a compiled experiment into (magic head, body, magic tail)."""
     mpp_indices = [
         k
-        for k, inst in enumerate(body)
+        for k, inst in enumerate(circuit)
         if isinstance(inst, stim.CircuitInstruction) and inst.name == 'MPP'
     ]
     body_start = mpp_indices[0] + 2 if skip_mpp_head else 0
-    body_end = mpp_indices[1] if skip_mpp_tail else len(body)
-    magic_head = body[:body_start]
-    magic_tail = body[body_end:]
-    body = body[body_start:body_end]
-
-    if convert_to_cz:
-        body = gen.to_z_basis_interaction_circuit(body)
-        if debug_out_dir is not None:
-            ideal_circuit = magic_head + body + magic_tail
-            _write(debug_out_dir / "ideal_cz_circuit.html", gen.stim_circuit_html_viewer(
-                ideal_circuit,
-                patch=chunks[0].end_patch(),
-            ))
-            _write(debug_out_dir / "ideal_cz_circuit.stim", ideal_circuit)
-            _write(debug_out_dir / "ideal_cz_circuit_dets.svg", ideal_circuit.diagram("time+detector-slice-svg"))
-
-    if noise is not None:
-        body = noise.noisy_circuit(body)
-    noisy_circuit = magic_head + body + magic_tail
-
-    if debug_out_dir is not None:
-        _write(debug_out_dir / "noisy_circuit.html", gen.stim_circuit_html_viewer(
-            noisy_circuit,
-            patch=chunks[0].end_patch(),
-        ))
-        _write(debug_out_dir / "noisy_circuit.stim", noisy_circuit)
-        _write(debug_out_dir / "noisy_circuit_dets.svg", noisy_circuit.diagram("time+detector-slice-svg"))
-
-    return noisy_circuit
+    body_end = mpp_indices[1] if skip_mpp_tail else len(circuit)
+    return circuit[:body_start], circuit[body_start:body_end], circuit[body_end:]
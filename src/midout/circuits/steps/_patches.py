@@ -1,11 +1,86 @@
+import collections
+import dataclasses
 import functools
-from typing import Iterable, Callable, Optional, List
+import inspect
+from typing import Any, Iterable, Callable, Optional, List, Tuple, TypeVar
 
 from midout import gen
 
 DIRS = [(0.5 + 0.5j) * 1j ** d for d in range(4)]
 DR, DL, UL, UR = DIRS
 
+TFactory = TypeVar('TFactory', bound=Callable[..., gen.Patch])
+
+# Maximum number of patches kept by `memoized_patch_factory`, across all factories.
+PATCH_MEMO_MAXSIZE = 256
+
+_patch_memo: 'collections.OrderedDict[Tuple[Any, ...], gen.Patch]' = collections.OrderedDict()
+_patch_memo_hits = 0
+_patch_memo_misses = 0
+
+
+@dataclasses.dataclass(frozen=True)
+class PatchMemoStats:
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def memoized_patch_factory(factory: TFactory) -> TFactory:
+    """Memoizes a patch factory in a bounded, least-recently-used cache shared by all factories.
+
+    Calls are keyed by the factory and its (normalized) arguments. The order
+    function of a memoized factory must be fixed by those arguments, since it
+    isn't part of the key. The returned patches are shared between callers, which
+    is safe because patches and their tiles are immutable.
+    """
+    signature = inspect.signature(factory)
+    key_prefix = (factory.__module__, factory.__qualname__)
+
+    @functools.wraps(factory)
+    def wrapper(*args, **kwargs) -> gen.Patch:
+        global _patch_memo_hits, _patch_memo_misses
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = key_prefix + tuple(sorted(bound.arguments.items()))
+        result = _patch_memo.get(key)
+        if result is not None:
+            _patch_memo_hits += 1
+            _patch_memo.move_to_end(key)
+            return result
+        _patch_memo_misses += 1
+        result = factory(*args, **kwargs)
+        _patch_memo[key] = result
+        while len(_patch_memo) > PATCH_MEMO_MAXSIZE:
+            _patch_memo.popitem(last=False)
+        return result
+
+    return wrapper  # type: ignore
+
+
+def patch_memo_stats() -> PatchMemoStats:
+    """Returns the hit and miss counts of `memoized_patch_factory` since the last clear."""
+    return PatchMemoStats(
+        hits=_patch_memo_hits,
+        misses=_patch_memo_misses,
+        size=len(_patch_memo),
+        maxsize=PATCH_MEMO_MAXSIZE,
+    )
+
+
+def clear_patch_memo() -> None:
+    """Forgets every memoized patch and resets the hit and miss counts."""
+    global _patch_memo_hits, _patch_memo_misses
+    _patch_memo.clear()
+    _patch_memo_hits = 0
+    _patch_memo_misses = 0
+
 
 def surface_code_patch(*,
                        possible_data_qubits: Iterable[complex],
@@ -74,6 +149,7 @@ def rectangular_surface_code_patch(*,
     )
 
 
+@memoized_patch_factory
 def make_ztop_yboundary_patch(*, distance: int) -> gen.Patch:
     def order_func(m: complex) -> List[complex]:
         order_S = [UR, UL, DR, DL]
@@ -100,6 +176,7 @@ def make_ztop_yboundary_patch(*, distance: int) -> gen.Patch:
     )
 
 
+@memoized_patch_factory
 def make_xtop_qubit_patch(*, distance: int) -> gen.Patch:
     def order_func(m: complex) -> List[complex]:
         order_S = [UR, UL, DR, DL]
@@ -120,6 +197,7 @@ def make_xtop_qubit_patch(*, distance: int) -> gen.Patch:
     )
 
 
+@memoized_patch_factory
 def make_stability_patch(*, distance: int, basis: str) -> gen.Patch:
     def order_func(m: complex) -> List[complex]:
         order_S = [UR, UL, DR, DL]
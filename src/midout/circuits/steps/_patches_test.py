@@ -0,0 +1,69 @@
+import pickle
+
+import pytest
+
+from midout.circuits.steps import _patches
+from midout.circuits.steps._patches import (
+    clear_patch_memo,
+    make_stability_patch,
+    make_xtop_qubit_patch,
+    memoized_patch_factory,
+    patch_memo_stats,
+)
+
+
+def test_memoized_patch_factory():
+    clear_patch_memo()
+    a = make_xtop_qubit_patch(distance=3)
+    assert make_xtop_qubit_patch(distance=3) is a
+    assert make_xtop_qubit_patch(distance=5) is not a
+    b = make_stability_patch(distance=3, basis='X')
+    assert make_stability_patch(basis='X', distance=3) is b
+    assert make_stability_patch(distance=3, basis='Z') is not b
+    stats = patch_memo_stats()
+    assert (stats.hits, stats.misses, stats.size) == (2, 4, 4)
+    assert stats.hit_rate == 2 / 6
+
+    clear_patch_memo()
+    assert patch_memo_stats().size == 0
+    assert make_xtop_qubit_patch(distance=3) is not a
+    assert make_xtop_qubit_patch(distance=3) == a
+
+
+def test_memoized_patches_are_immutable():
+    clear_patch_memo()
+    patch = make_xtop_qubit_patch(distance=3)
+    tile = patch.tiles[0]
+    with pytest.raises(AttributeError, match='immutable'):
+        patch.tiles = ()
+    with pytest.raises(AttributeError, match='immutable'):
+        tile.bases = 'ZZZZ'
+    with pytest.raises(AttributeError, match='immutable'):
+        del tile.measurement_qubit
+    assert make_xtop_qubit_patch(distance=3) is patch
+    assert patch.data_set == make_xtop_qubit_patch.__wrapped__(distance=3).data_set
+
+    restored = pickle.loads(pickle.dumps(patch))
+    assert restored == patch
+    assert restored.tiles[0].used_set == tile.used_set
+
+
+def test_memoized_patch_factory_is_bounded(monkeypatch):
+    monkeypatch.setattr(_patches, 'PATCH_MEMO_MAXSIZE', 2)
+    clear_patch_memo()
+    calls = []
+
+    @memoized_patch_factory
+    def factory(*, distance: int):
+        calls.append(distance)
+        return make_xtop_qubit_patch.__wrapped__(distance=distance)
+
+    factory(distance=3)
+    factory(distance=5)
+    factory(distance=3)
+    factory(distance=7)
+    assert patch_memo_stats().size == 2
+    factory(distance=3)
+    factory(distance=5)
+    assert calls == [3, 5, 7, 5]
+    clear_patch_memo()
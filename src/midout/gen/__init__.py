@@ -1,50 +1,141 @@
-from midout.gen._layer_translate import (
-    to_z_basis_interaction_circuit,
-)
-from midout.gen._noise import (
-    NoiseModel,
-    NoiseRule,
-    occurs_in_classical_control_system,
-)
-from midout.gen._builder import (
-    Builder,
-    AtLayer,
-    MeasurementTracker,
-)
-from midout.gen._tile import (
-    Tile,
-)
-from midout.gen._patch import (
-    Patch,
-)
-from midout.gen._util import (
-    stim_circuit_with_transformed_coords,
-    sorted_complex,
-    complex_key,
-)
-from midout.gen._viz_circuit_html import (
-    stim_circuit_html_viewer,
-)
-from midout.gen._viz_patch_svg import (
-    patch_svg_viewer,
-)
-from midout.gen._surface_code import (
-    surface_code_patch,
-    checkerboard_basis,
-)
-from midout.gen._flow_util import (
-    verify_circuit_has_all_possible_detectors,
-    standard_surface_code_chunk,
-    compile_chunks_into_circuit,
-    build_surface_code_round_circuit,
-)
-from midout.gen._chunk import (
-    Chunk,
-)
-from midout.gen._flow import (
-    Flow,
-    PauliString,
-)
-from midout.gen._flow_verifier import (
-    FlowStabilizerVerifier,
-)
+"""Tools for building, verifying and viewing stabilizer circuits.
+
+Submodules are imported on first use of one of their names, so that processes
+which only need e.g. `NoiseModel` don't pay for importing the visualizers,
+the layer translator or the flow verifier.
+"""
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from midout.gen._layer_translate import (
+        to_z_basis_interaction_circuit,
+    )
+    from midout.gen._noise import (
+        NoiseModel,
+        NoiseRule,
+        occurs_in_classical_control_system,
+    )
+    from midout.gen._builder import (
+        Builder,
+        AtLayer,
+        MeasurementTracker,
+    )
+    from midout.gen._tile import (
+        Tile,
+    )
+    from midout.gen._patch import (
+        Patch,
+    )
+    from midout.gen._util import (
+        stim_circuit_with_transformed_coords,
+        stim_circuit_with_fused_instructions,
+        stim_circuit_fingerprint,
+        stim_circuit_with_shortened_loops,
+        sorted_complex,
+        complex_key,
+    )
+    from midout.gen._viz_circuit_html import (
+        stim_circuit_html_viewer,
+    )
+    from midout.gen._viz_patch_svg import (
+        patch_svg_viewer,
+    )
+    from midout.gen._surface_code import (
+        surface_code_patch,
+        checkerboard_basis,
+    )
+    from midout.gen._flow_util import (
+        verify_circuit_has_all_possible_detectors,
+        standard_surface_code_chunk,
+        compile_chunks_into_circuit,
+        build_surface_code_round_circuit,
+    )
+    from midout.gen._chunk import (
+        Chunk,
+        verify_chunks,
+    )
+    from midout.gen._chunk_io import (
+        chunks_from_json,
+        chunks_to_json,
+        load_chunks,
+        save_chunks,
+    )
+    from midout.gen._flow import (
+        Flow,
+        PackedPauliString,
+        PauliString,
+    )
+    from midout.gen._flow_verifier import (
+        FlowStabilizerVerifier,
+    )
+    from midout.gen._circuit_cache import (
+        CircuitCache,
+    )
+    from midout.gen._dem_cache import (
+        DemCache,
+    )
+    from midout.gen._trace import (
+        Tracer,
+        tracing,
+        trace_span,
+        traced,
+    )
+
+# The submodule defining each public name.
+_LAZY_ATTRIBUTES = {
+    'to_z_basis_interaction_circuit': '_layer_translate',
+    'NoiseModel': '_noise',
+    'NoiseRule': '_noise',
+    'occurs_in_classical_control_system': '_noise',
+    'Builder': '_builder',
+    'AtLayer': '_builder',
+    'MeasurementTracker': '_builder',
+    'Tile': '_tile',
+    'Patch': '_patch',
+    'stim_circuit_with_transformed_coords': '_util',
+    'stim_circuit_with_fused_instructions': '_util',
+    'stim_circuit_fingerprint': '_util',
+    'stim_circuit_with_shortened_loops': '_util',
+    'sorted_complex': '_util',
+    'complex_key': '_util',
+    'stim_circuit_html_viewer': '_viz_circuit_html',
+    'patch_svg_viewer': '_viz_patch_svg',
+    'surface_code_patch': '_surface_code',
+    'checkerboard_basis': '_surface_code',
+    'verify_circuit_has_all_possible_detectors': '_flow_util',
+    'standard_surface_code_chunk': '_flow_util',
+    'compile_chunks_into_circuit': '_flow_util',
+    'build_surface_code_round_circuit': '_flow_util',
+    'Chunk': '_chunk',
+    'verify_chunks': '_chunk',
+    'chunks_from_json': '_chunk_io',
+    'chunks_to_json': '_chunk_io',
+    'load_chunks': '_chunk_io',
+    'save_chunks': '_chunk_io',
+    'Flow': '_flow',
+    'PackedPauliString': '_flow',
+    'PauliString': '_flow',
+    'FlowStabilizerVerifier': '_flow_verifier',
+    'CircuitCache': '_circuit_cache',
+    'DemCache': '_dem_cache',
+    'Tracer': '_trace',
+    'tracing': '_trace',
+    'trace_span': '_trace',
+    'traced': '_trace',
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'{__name__}.{module_name}'), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
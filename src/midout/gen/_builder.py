@@ -1,5 +1,6 @@
 from typing import Iterable, Dict, Callable, Any, Optional, List, Tuple, TYPE_CHECKING
 
+import array
 import dataclasses
 
 import stim
@@ -11,58 +12,129 @@ if TYPE_CHECKING:
     from midout.gen._interaction_planner import SingleQubitGatesPlanner
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class AtLayer:
     """A special class that indicates the layer to read a measurement key from."""
     key: Any
     layer: Any
 
 
+# Values stored in `MeasurementTracker._values` for keys that aren't a single measurement.
+_GROUP = -1
+_OBSTACLE = -2
+
+
 class MeasurementTracker:
-    """Tracks measurements and groups of measurements, for producing stim record targets."""
+    """Tracks measurements and groups of measurements, for producing stim record targets.
+
+    Keys are interned to integer ids, and the record of each id is stored in an
+    array: a measurement index for single measurements (the common case), or a
+    marker for groups (whose indices are kept separately) and obstacles. Copies
+    share storage until one of them records something.
+    """
     def __init__(self):
-        self.recorded: Dict[Any, Optional[List[int]]] = {}
+        self._key_ids: Dict[Any, int] = {}
+        self._values = array.array('q')
+        self._groups: Dict[int, Tuple[int, ...]] = {}
+        self._shared = False
         self.next_measurement_index = 0
 
     def copy(self) -> 'MeasurementTracker':
         result = MeasurementTracker()
-        result.recorded = {k: list(v) for k, v in self.recorded.items()}
+        result._key_ids = self._key_ids
+        result._values = self._values
+        result._groups = self._groups
+        result._shared = True
+        self._shared = True
         result.next_measurement_index = self.next_measurement_index
         return result
 
-    def _rec(self, key: Any, value: Optional[List[int]]) -> None:
-        if key in self.recorded:
+    @property
+    def recorded(self) -> Dict[Any, Optional[List[int]]]:
+        """A snapshot of the recorded keys, mapped to their measurement indices (or None for obstacles)."""
+        return {key: self._record(i) for key, i in self._key_ids.items()}
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._key_ids
+
+    def _record(self, i: int) -> Optional[List[int]]:
+        v = self._values[i]
+        if v >= 0:
+            return [v]
+        if v == _GROUP:
+            return list(self._groups[i])
+        return None
+
+    def _rec(self, key: Any, value: int, group: Tuple[int, ...] = ()) -> None:
+        if key in self._key_ids:
             raise ValueError(f'Measurement key collision: {key=}')
-        self.recorded[key] = value
+        if self._shared:
+            self._key_ids = dict(self._key_ids)
+            self._values = array.array('q', self._values)
+            self._groups = dict(self._groups)
+            self._shared = False
+        i = len(self._values)
+        self._key_ids[key] = i
+        self._values.append(value)
+        if value == _GROUP:
+            self._groups[i] = group
 
     def record_measurement(self, key: Any) -> None:
-        self._rec(key, [self.next_measurement_index])
+        self._rec(key, self.next_measurement_index)
         self.next_measurement_index += 1
 
     def make_measurement_group(self, sub_keys: Iterable[Any], *, key: Any) -> None:
-        self._rec(key, self.measurement_indices(sub_keys))
+        self._rec(key, _GROUP, tuple(self.measurement_indices(sub_keys)))
 
     def record_obstacle(self, key: Any) -> None:
-        self._rec(key, None)
+        self._rec(key, _OBSTACLE)
 
     def measurement_indices(self, keys: Iterable[Any]) -> List[int]:
+        """Returns the measurements whose parity is the parity of the given keys' records."""
+        key_ids = self._key_ids
+        values = self._values
         result = set()
         for key in keys:
-            if key not in self.recorded:
+            i = key_ids.get(key)
+            if i is None:
                 raise ValueError(f"No such measurement: {key=}")
-            for v in self.recorded[key]:
-                if v is None:
-                    raise ValueError(f"Obstacle at {key=}")
-                if v in result:
-                    result.remove(v)
+            v = values[i]
+            if v >= 0:
+                group: Iterable[int] = (v,)
+            elif v == _GROUP:
+                group = self._groups[i]
+            else:
+                raise ValueError(f"Obstacle at {key=}")
+            for m in group:
+                if m in result:
+                    result.remove(m)
                 else:
-                    result.add(v)
+                    result.add(m)
         return sorted(result)
 
+    def measurement_indices_batch(self, key_groups: Iterable[Iterable[Any]]) -> List[List[int]]:
+        """Returns `[self.measurement_indices(keys) for keys in key_groups]`.
+
+        Groups consisting of a single key (the common case) are answered with a
+        direct array lookup.
+        """
+        key_ids = self._key_ids
+        values = self._values
+        result = []
+        for keys in key_groups:
+            keys = keys if isinstance(keys, (list, tuple)) else list(keys)
+            if len(keys) == 1:
+                i = key_ids.get(keys[0])
+                if i is not None and values[i] >= 0:
+                    result.append([values[i]])
+                    continue
+            result.append(self.measurement_indices(keys))
+        return result
+
     def current_measurement_record_targets_for(self, keys: Iterable[Any]) -> List[stim.GateTarget]:
         t0 = self.next_measurement_index
         times = self.measurement_indices(keys)
-        return [stim.target_rec(t - t0) for t in sorted(times)]
+        return [stim.target_rec(t - t0) for t in times]
 
 
 class Builder:
@@ -240,7 +312,7 @@ class Builder:
             coords = None
 
         if ignore_non_existent:
-            keys = [k for k in keys if k in self.tracker.recorded]
+            keys = [k for k in keys if k in self.tracker]
         targets = self.tracker.current_measurement_record_targets_for(keys)
         self.circuit.append('DETECTOR', targets, coords)
 
@@ -1,6 +1,7 @@
+import pytest
 import stim
 
-from midout.gen._builder import Builder
+from midout.gen._builder import Builder, MeasurementTracker
 
 
 def test_builder_init():
@@ -10,3 +11,35 @@ def test_builder_init():
         QUBIT_COORDS(0, 1) 1
         QUBIT_COORDS(3, 2) 2
     """)
+
+
+def test_measurement_tracker():
+    tracker = MeasurementTracker()
+    tracker.record_measurement('a')
+    tracker.record_measurement('b')
+    tracker.record_measurement('c')
+    tracker.make_measurement_group(['a', 'b'], key='ab')
+    tracker.record_obstacle('wall')
+    assert 'ab' in tracker and 'd' not in tracker
+    assert tracker.measurement_indices(['ab', 'c']) == [0, 1, 2]
+    assert tracker.measurement_indices(['ab', 'b']) == [0]
+    assert tracker.measurement_indices_batch([['c'], ['ab'], ('a', 'a'), iter(['b'])]) == [[2], [0, 1], [], [1]]
+    assert tracker.recorded == {'a': [0], 'b': [1], 'c': [2], 'ab': [0, 1], 'wall': None}
+    assert tracker.current_measurement_record_targets_for(['a', 'c']) == [stim.target_rec(-3), stim.target_rec(-1)]
+    with pytest.raises(ValueError, match='Obstacle'):
+        tracker.measurement_indices(['wall'])
+    with pytest.raises(ValueError, match='No such'):
+        tracker.measurement_indices_batch([['d']])
+    with pytest.raises(ValueError, match='collision'):
+        tracker.record_measurement('a')
+
+
+def test_measurement_tracker_copy_on_write():
+    tracker = MeasurementTracker()
+    tracker.record_measurement('a')
+    copy = tracker.copy()
+    assert copy._values is tracker._values
+    copy.record_measurement('b')
+    tracker.record_measurement('c')
+    assert tracker.recorded == {'a': [0], 'c': [1]}
+    assert copy.recorded == {'a': [0], 'b': [1]}
@@ -1,4 +1,7 @@
-from typing import Iterable, Dict, Callable
+import concurrent.futures
+import hashlib
+import os
+from typing import Iterable, Dict, Callable, Optional, Set, Tuple
 
 import stim
 
@@ -7,6 +10,9 @@ from midout.gen._flow import Flow, PauliString
 from midout.gen._patch import Patch
 from midout.gen._tile import Tile
 
+# Fingerprints of chunks that have already passed verification in this process.
+_VERIFIED_FINGERPRINTS: Set[str] = set()
+
 
 class Chunk:
     def __init__(self,
@@ -29,8 +35,42 @@ class Chunk:
     def __mul__(self, other: int) -> 'Chunk':
         return self.with_repetitions(other)
 
-    def verify(self):
-        """Checks that this chunk's circuit actually implements its flows."""
+    def fingerprint(self) -> str:
+        """Returns a hash of everything that `verify` depends on.
+
+        Chunks with equal fingerprints either both pass or both fail
+        verification. Flow centers and discarded stabilizers don't affect
+        verification, so they aren't included.
+        """
+        h = hashlib.sha256()
+        h.update(str(self.circuit).encode('utf8'))
+        h.update(repr(sorted(self.q2i.items(), key=lambda e: (e[1], e[0].real, e[0].imag))).encode('utf8'))
+        for flow in self.flows:
+            h.update(repr((
+                str(flow.start),
+                str(flow.end),
+                flow.measurement_indices,
+                flow.obs_index,
+            )).encode('utf8'))
+        h.update(repr(self.repetitions != 1).encode('utf8'))
+        return h.hexdigest()
+
+    def verify(self, *, use_memo: bool = True):
+        """Checks that this chunk's circuit actually implements its flows.
+
+        Args:
+            use_memo: When True, a chunk structurally identical to one that
+                already passed verification in this process is not checked
+                again.
+        """
+        fingerprint = self.fingerprint() if use_memo else None
+        if fingerprint is not None and fingerprint in _VERIFIED_FINGERPRINTS:
+            return
+        self._verify_uncached()
+        if fingerprint is not None:
+            _VERIFIED_FINGERPRINTS.add(fingerprint)
+
+    def _verify_uncached(self):
         from midout.gen._flow_verifier import FlowStabilizerVerifier
         FlowStabilizerVerifier.verify(self)
 
@@ -51,24 +91,22 @@ class Chunk:
         return FlowStabilizerVerifier.invert(self)
 
     def with_xz_flipped(self) -> 'Chunk':
-        return Chunk(
-            q2i=self.q2i,
-            circuit=circuit_with_xz_flipped(self.circuit),
-            flows=[flow.with_xz_flipped() for flow in self.flows],
-            discarded_inputs=[p.with_xz_flipped() for p in self.discarded_inputs],
-            discarded_outputs=[p.with_xz_flipped() for p in self.discarded_outputs],
-            repetitions=self.repetitions,
-        )
+        """Returns an equivalent chunk with the roles of X and Z exchanged.
+
+        The result is a lazy view: its circuit and flows are only rewritten when
+        first accessed, and further transforms of it are folded into that one
+        rewrite.
+        """
+        return ChunkView(self, xz_flipped=True)
 
     def with_transformed_coords(self, transform: Callable[[complex], complex]) -> 'Chunk':
-        return Chunk(
-            q2i={transform(q): i for q, i in self.q2i.items()},
-            circuit=stim_circuit_with_transformed_coords(self.circuit, transform),
-            flows=[flow.with_transformed_coords(transform) for flow in self.flows],
-            discarded_inputs=[p.with_transformed_coords(transform) for p in self.discarded_inputs],
-            discarded_outputs=[p.with_transformed_coords(transform) for p in self.discarded_outputs],
-            repetitions=self.repetitions,
-        )
+        """Returns an equivalent chunk with its qubit positions transformed.
+
+        The result is a lazy view: its circuit and flows are only rewritten when
+        first accessed, and further transforms of it are folded into that one
+        rewrite.
+        """
+        return ChunkView(self, transform=transform)
 
     def magic_init_chunk(self) -> 'Chunk':
         """Returns a chunk that initializes the stabilizers needed by this one.
@@ -107,6 +145,178 @@ class Chunk:
         return self._boundary_patch(True)
 
 
+class ChunkView(Chunk):
+    """A chunk defined as an XZ-flipped and/or coordinate-transformed view of another chunk.
+
+    The circuit, qubit mapping, flows and discarded stabilizers are built in a
+    single pass when one of them is first accessed. Transforming a view again
+    composes the transforms instead of building the intermediate chunk.
+    """
+
+    def __init__(self,
+                 base: Chunk,
+                 *,
+                 xz_flipped: bool = False,
+                 transform: Optional[Callable[[complex], complex]] = None):
+        self._base = base
+        self._xz_flipped = xz_flipped
+        self._transform = transform
+        self._materialized: Optional[Chunk] = None
+        self.repetitions = base.repetitions
+
+    def _chunk(self) -> Chunk:
+        if self._materialized is None:
+            self._materialized = _flipped_and_transformed_chunk(
+                self._base,
+                xz_flipped=self._xz_flipped,
+                transform=self._transform,
+            )
+        return self._materialized
+
+    @property
+    def circuit(self) -> stim.Circuit:
+        return self._chunk().circuit
+
+    @property
+    def q2i(self) -> Dict[complex, int]:
+        return self._chunk().q2i
+
+    @property
+    def flows(self) -> Tuple[Flow, ...]:
+        return self._chunk().flows
+
+    @property
+    def discarded_inputs(self) -> Iterable[PauliString]:
+        return self._chunk().discarded_inputs
+
+    @property
+    def discarded_outputs(self) -> Iterable[PauliString]:
+        return self._chunk().discarded_outputs
+
+    def with_repetitions(self, new_repetitions: int) -> 'Chunk':
+        return ChunkView(
+            self._base.with_repetitions(new_repetitions),
+            xz_flipped=self._xz_flipped,
+            transform=self._transform,
+        )
+
+    def with_xz_flipped(self) -> 'Chunk':
+        return ChunkView(
+            self._base,
+            xz_flipped=not self._xz_flipped,
+            transform=self._transform,
+        )
+
+    def with_transformed_coords(self, transform: Callable[[complex], complex]) -> 'Chunk':
+        first = self._transform
+        return ChunkView(
+            self._base,
+            xz_flipped=self._xz_flipped,
+            transform=transform if first is None else lambda q: transform(first(q)),
+        )
+
+    def __reduce__(self):
+        # The transform is often a local function, so pickle the materialized chunk.
+        c = self._chunk()
+        return Chunk, (c.circuit, c.q2i, c.flows, c.discarded_inputs, c.discarded_outputs, c.repetitions)
+
+
+def _flipped_and_transformed_pauli_string(
+        pauli_string: PauliString,
+        *,
+        xz_flipped: bool,
+        transform: Callable[[complex], complex]) -> PauliString:
+    flip = _PAULI_XZ_FLIPPED if xz_flipped else _PAULI_IDENTITY
+    return PauliString({transform(q): flip[p] for q, p in pauli_string.qubits.items()})
+
+
+def _flipped_and_transformed_chunk(
+        chunk: Chunk,
+        *,
+        xz_flipped: bool,
+        transform: Optional[Callable[[complex], complex]]) -> Chunk:
+    if transform is None:
+        transform = _identity
+    flows = []
+    for flow in chunk.flows:
+        flows.append(Flow(
+            start=_flipped_and_transformed_pauli_string(flow.start, xz_flipped=xz_flipped, transform=transform),
+            end=_flipped_and_transformed_pauli_string(flow.end, xz_flipped=xz_flipped, transform=transform),
+            measurement_indices=flow.measurement_indices,
+            obs_index=flow.obs_index,
+            center=transform(flow.center),
+        ))
+    return Chunk(
+        q2i={transform(q): i for q, i in chunk.q2i.items()},
+        circuit=circuit_with_xz_flipped_and_transformed_coords(
+            chunk.circuit,
+            xz_flipped=xz_flipped,
+            transform=None if transform is _identity else transform,
+        ),
+        flows=flows,
+        discarded_inputs=[
+            _flipped_and_transformed_pauli_string(p, xz_flipped=xz_flipped, transform=transform)
+            for p in chunk.discarded_inputs
+        ],
+        discarded_outputs=[
+            _flipped_and_transformed_pauli_string(p, xz_flipped=xz_flipped, transform=transform)
+            for p in chunk.discarded_outputs
+        ],
+        repetitions=chunk.repetitions,
+    )
+
+
+def _identity(q: complex) -> complex:
+    return q
+
+
+def _verify_chunk_and_fingerprint(chunk: Chunk) -> str:
+    chunk._verify_uncached()
+    return chunk.fingerprint()
+
+
+def verify_chunks(chunks: Iterable[Chunk], *, workers: Optional[int] = None) -> None:
+    """Verifies many chunks, checking each distinct chunk only once.
+
+    Chunks that are structurally identical (e.g. the same round body reused
+    with different repetition counts) are verified once, and chunks that
+    already passed verification earlier in the process are skipped.
+
+    Args:
+        chunks: The chunks to verify.
+        workers: Number of worker processes used to check distinct chunks.
+            Defaults to `os.cpu_count()`. When set to 1, or when there is at
+            most one chunk left to check, verification runs in the calling
+            process.
+
+    Raises:
+        ValueError: A chunk's circuit doesn't implement its flows.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f'{workers=} < 1')
+
+    pending: Dict[str, Chunk] = {}
+    for chunk in chunks:
+        fingerprint = chunk.fingerprint()
+        if fingerprint not in _VERIFIED_FINGERPRINTS:
+            pending.setdefault(fingerprint, chunk)
+
+    if workers == 1 or len(pending) <= 1:
+        for fingerprint, chunk in pending.items():
+            chunk._verify_uncached()
+            _VERIFIED_FINGERPRINTS.add(fingerprint)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+        for fingerprint in pool.map(_verify_chunk_and_fingerprint, pending.values()):
+            _VERIFIED_FINGERPRINTS.add(fingerprint)
+
+
+_PAULI_IDENTITY = {"X": "X", "Y": "Y", "Z": "Z"}
+_PAULI_XZ_FLIPPED = {"X": "Z", "Y": "Y", "Z": "X"}
+
 XZ_FLIPPED = {
     "I": "I",
     "X": "Z",
@@ -182,3 +392,51 @@ def circuit_with_xz_flipped(circuit: stim.Circuit) -> stim.Circuit:
                 raise NotImplementedError(f'{inst=}')
             result.append(stim.CircuitInstruction(other, inst.targets_copy(), inst.gate_args_copy()))
     return result
+
+
+def circuit_with_xz_flipped_and_transformed_coords(
+        circuit: stim.Circuit,
+        *,
+        xz_flipped: bool,
+        transform: Optional[Callable[[complex], complex]]) -> stim.Circuit:
+    """Applies `circuit_with_xz_flipped` and `stim_circuit_with_transformed_coords` in one pass.
+
+    Args:
+        circuit: The circuit to rewrite.
+        xz_flipped: Whether to exchange the roles of X and Z.
+        transform: The transformation to apply to qubit and detector positions, or
+            None to leave them unchanged.
+
+    Returns:
+        The rewritten circuit.
+    """
+    result = stim.Circuit()
+    for inst in circuit:
+        if isinstance(inst, stim.CircuitRepeatBlock):
+            result.append(stim.CircuitRepeatBlock(
+                body=circuit_with_xz_flipped_and_transformed_coords(
+                    inst.body_copy(),
+                    xz_flipped=xz_flipped,
+                    transform=transform,
+                ),
+                repeat_count=inst.repeat_count))
+            continue
+
+        name = inst.name
+        if xz_flipped:
+            name = XZ_FLIPPED.get(name)
+            if name is None:
+                raise NotImplementedError(f'{inst=}')
+        args = inst.gate_args_copy()
+        if transform is not None:
+            if inst.name == "QUBIT_COORDS" or inst.name == "DETECTOR":
+                args = list(args)
+                while len(args) < 2:
+                    args.append(0)
+                c = transform(args[0] + args[1] * 1j)
+                args[0] = c.real
+                args[1] = c.imag
+            elif inst.name == "SHIFT_COORDS" and any(args[:2]):
+                raise NotImplementedError(f"Shifting first two coords: {inst=}")
+        result.append(stim.CircuitInstruction(name, inst.targets_copy(), args))
+    return result
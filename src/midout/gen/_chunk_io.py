@@ -0,0 +1,201 @@
+import gzip
+import json
+import pathlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import stim
+
+from midout.gen._chunk import Chunk
+from midout.gen._flow import Flow, PauliString
+
+CHUNKS_FORMAT = 'midout-chunks'
+CHUNKS_FORMAT_VERSION = 1
+
+
+class _PauliStringTable:
+    """Encodes pauli strings as text like 'X0 Z4', where the numbers index a qubit table."""
+
+    def __init__(self):
+        self.qubits: List[complex] = []
+        self._indices: Dict[complex, int] = {}
+
+    def encode(self, pauli_string: PauliString) -> str:
+        terms = []
+        for q, p in pauli_string.qubits.items():
+            i = self._indices.get(q)
+            if i is None:
+                i = len(self.qubits)
+                self._indices[q] = i
+                self.qubits.append(q)
+            terms.append(f'{p}{i}')
+        return ' '.join(terms)
+
+
+def _encode_complex(c: complex) -> List[float]:
+    return [c.real, c.imag]
+
+
+def _decode_complex(v: List[float]) -> complex:
+    return v[0] + v[1] * 1j
+
+
+def _encode_chunk(chunk: Chunk) -> Dict[str, Any]:
+    table = _PauliStringTable()
+    flows = []
+    for flow in chunk.flows:
+        try:
+            json.dumps(flow.obs_index)
+        except TypeError as ex:
+            raise ValueError(f'Flow obs_index must be JSON serializable: {flow!r}') from ex
+        flows.append([
+            table.encode(flow.start),
+            table.encode(flow.end),
+            list(flow.measurement_indices),
+            flow.obs_index,
+            _encode_complex(flow.center),
+        ])
+    discarded_inputs = [table.encode(p) for p in chunk.discarded_inputs]
+    discarded_outputs = [table.encode(p) for p in chunk.discarded_outputs]
+    return {
+        'circuit': str(chunk.circuit),
+        'q2i': [[q.real, q.imag, i] for q, i in chunk.q2i.items()],
+        'qubits': [_encode_complex(q) for q in table.qubits],
+        'flows': flows,
+        'discarded_inputs': discarded_inputs,
+        'discarded_outputs': discarded_outputs,
+        'repetitions': chunk.repetitions,
+    }
+
+
+class LoadedChunk(Chunk):
+    """A chunk read by `load_chunks`.
+
+    The circuit is parsed, and the flows and discarded stabilizers are decoded,
+    the first time they are accessed. Pickling sends the undecoded data, so a
+    loaded chunk is cheap to pass to worker processes.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+        self._circuit: Optional[stim.Circuit] = None
+        self._q2i: Optional[Dict[complex, int]] = None
+        self._decoded: Optional[Tuple[Tuple[Flow, ...], Tuple[PauliString, ...], Tuple[PauliString, ...]]] = None
+        self.repetitions = data['repetitions']
+
+    @property
+    def circuit(self) -> stim.Circuit:
+        if self._circuit is None:
+            self._circuit = stim.Circuit(self._data['circuit'])
+        return self._circuit
+
+    @property
+    def q2i(self) -> Dict[complex, int]:
+        if self._q2i is None:
+            self._q2i = {r + i * 1j: k for r, i, k in self._data['q2i']}
+        return self._q2i
+
+    def _decode(self) -> Tuple[Tuple[Flow, ...], Tuple[PauliString, ...], Tuple[PauliString, ...]]:
+        if self._decoded is None:
+            qubits = [_decode_complex(q) for q in self._data['qubits']]
+            # Identical stabilizers (e.g. a tile's start and end) share one PauliString.
+            decoded: Dict[str, PauliString] = {}
+
+            def pauli_string(text: str) -> PauliString:
+                result = decoded.get(text)
+                if result is None:
+                    result = PauliString({qubits[int(term[1:])]: term[0] for term in text.split()})
+                    decoded[text] = result
+                return result
+
+            flows = tuple(
+                Flow(
+                    start=pauli_string(start),
+                    end=pauli_string(end),
+                    measurement_indices=measurement_indices,
+                    obs_index=obs_index,
+                    center=_decode_complex(center),
+                )
+                for start, end, measurement_indices, obs_index, center in self._data['flows']
+            )
+            self._decoded = (
+                flows,
+                tuple(pauli_string(p) for p in self._data['discarded_inputs']),
+                tuple(pauli_string(p) for p in self._data['discarded_outputs']),
+            )
+        return self._decoded
+
+    @property
+    def flows(self) -> Tuple[Flow, ...]:
+        return self._decode()[0]
+
+    @property
+    def discarded_inputs(self) -> Tuple[PauliString, ...]:
+        return self._decode()[1]
+
+    @property
+    def discarded_outputs(self) -> Tuple[PauliString, ...]:
+        return self._decode()[2]
+
+    def with_repetitions(self, new_repetitions: int) -> 'Chunk':
+        # Like `Chunk.with_repetitions`, the discarded stabilizers aren't kept.
+        return LoadedChunk({
+            **self._data,
+            'discarded_inputs': [],
+            'discarded_outputs': [],
+            'repetitions': new_repetitions,
+        })
+
+    def __reduce__(self):
+        return LoadedChunk, (self._data,)
+
+
+def chunks_to_json(chunks: Iterable[Chunk]) -> Dict[str, Any]:
+    """Returns a JSON-serializable description of a list of chunks. See `save_chunks`."""
+    return {
+        'format': CHUNKS_FORMAT,
+        'version': CHUNKS_FORMAT_VERSION,
+        'chunks': [_encode_chunk(chunk) for chunk in chunks],
+    }
+
+
+def chunks_from_json(data: Dict[str, Any]) -> List[Chunk]:
+    """Inverts `chunks_to_json`. The returned chunks decode their contents lazily."""
+    if data.get('format') != CHUNKS_FORMAT:
+        raise ValueError(f"Not a chunk file: format={data.get('format')!r}")
+    if data.get('version') != CHUNKS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported chunk file version {data.get('version')!r} (expected {CHUNKS_FORMAT_VERSION}).")
+    return [LoadedChunk(c) for c in data['chunks']]
+
+
+def _open(path: Union[str, pathlib.Path], mode: str):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf8')
+    return open(path, mode, encoding='utf8')
+
+
+def save_chunks(chunks: Union[Chunk, Iterable[Chunk]], path: Union[str, pathlib.Path]) -> None:
+    """Writes chunks to a file, in a versioned JSON format.
+
+    Each chunk is stored as its circuit text, its qubit mapping, a table of the
+    qubit positions used by its flows, and its flows as rows of
+    (start, end, measurement indices, observable index, center). Stabilizers are
+    stored as text like 'X0 Z4', indexing into the qubit table.
+
+    Args:
+        chunks: The chunk, or list of chunks, to save.
+        path: Where to write. The file is gzip compressed if the path ends with '.gz'.
+    """
+    if isinstance(chunks, Chunk):
+        chunks = [chunks]
+    with _open(path, 'w') as f:
+        json.dump(chunks_to_json(chunks), f, separators=(',', ':'))
+
+
+def load_chunks(path: Union[str, pathlib.Path]) -> List[Chunk]:
+    """Reads chunks written by `save_chunks`.
+
+    Only the file is read up front. Each chunk's circuit, flows and stabilizers
+    are built when first accessed.
+    """
+    with _open(path, 'r') as f:
+        return chunks_from_json(json.load(f))
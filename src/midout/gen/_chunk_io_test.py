@@ -0,0 +1,82 @@
+import json
+import pickle
+
+import pytest
+import stim
+
+from midout import gen
+from midout._make_circuit import make_circuit_chunks
+from midout.gen._chunk_io import LoadedChunk
+
+
+def _flow_fields(flow: gen.Flow) -> tuple:
+    return flow.start, flow.end, flow.measurement_indices, flow.obs_index, flow.center
+
+
+def _assert_same_chunk(actual: gen.Chunk, expected: gen.Chunk):
+    assert actual.circuit == expected.circuit
+    assert actual.q2i == expected.q2i
+    assert actual.repetitions == expected.repetitions
+    assert [_flow_fields(f) for f in actual.flows] == [_flow_fields(f) for f in expected.flows]
+    assert tuple(actual.discarded_inputs) == tuple(expected.discarded_inputs)
+    assert tuple(actual.discarded_outputs) == tuple(expected.discarded_outputs)
+
+
+@pytest.mark.parametrize('suffix', ['.json', '.json.gz'])
+def test_save_load_chunks_round_trip(tmp_path, suffix):
+    chunks, _, _ = make_circuit_chunks(basis='Y', boundary_rounds=2, memory_rounds=3, distance=3)
+    path = tmp_path / f'chunks{suffix}'
+    gen.save_chunks(chunks, path)
+    loaded = gen.load_chunks(path)
+
+    assert len(loaded) == len(chunks)
+    for actual, expected in zip(loaded, chunks):
+        _assert_same_chunk(actual, expected)
+    assert gen.compile_chunks_into_circuit(loaded) == gen.compile_chunks_into_circuit(chunks)
+
+
+def test_loaded_chunk_is_lazy_and_picklable(tmp_path):
+    chunk = gen.Chunk(
+        circuit=stim.Circuit("""
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0.5) 1
+            RX 0
+            R 1
+            CX 0 1
+            M 1
+            DETECTOR(1, 0) rec[-1]
+        """),
+        q2i={0: 0, 1 + 0.5j: 1},
+        flows=[
+            gen.Flow(center=1, start=gen.PauliString({0: 'X', 1 + 0.5j: 'Z'}), end=gen.PauliString({0: 'Y'}), obs_index=0),
+            gen.Flow(center=0.5j, end=gen.PauliString({1 + 0.5j: 'Z'}), measurement_indices=[0]),
+        ],
+        discarded_outputs=[gen.PauliString({1 + 0.5j: 'X'})],
+    )
+    path = tmp_path / 'chunk.json'
+    gen.save_chunks(chunk, path)
+    loaded, = gen.load_chunks(path)
+
+    assert isinstance(loaded, LoadedChunk)
+    assert loaded._circuit is None
+    assert loaded._decoded is None
+    _assert_same_chunk(loaded, chunk)
+
+    restored = pickle.loads(pickle.dumps(gen.load_chunks(path)[0]))
+    assert restored._decoded is None
+    _assert_same_chunk(restored, chunk)
+
+    repeated = loaded.with_repetitions(5)
+    assert repeated.repetitions == 5
+    assert [_flow_fields(f) for f in repeated.flows] == [_flow_fields(f) for f in chunk.flows]
+    assert repeated.discarded_outputs == ()
+
+
+def test_chunks_from_json_checks_version():
+    data = gen.chunks_to_json([])
+    assert json.loads(json.dumps(data)) == data
+    assert gen.chunks_from_json(data) == []
+    with pytest.raises(ValueError, match='version'):
+        gen.chunks_from_json({**data, 'version': data['version'] + 1})
+    with pytest.raises(ValueError, match='format'):
+        gen.chunks_from_json({**data, 'format': 'other'})
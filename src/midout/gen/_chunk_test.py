@@ -1,5 +1,7 @@
+import pickle
 from typing import Iterable, Dict, Callable
 
+import pytest
 import stim
 
 from midout import gen
@@ -54,3 +56,150 @@ def test_inverse_circuit():
         CX 3 4 2 0
         M 4 3 2 1 0
     """)
+
+
+def test_verify_chunks_dedupes_identical_chunks(monkeypatch):
+    from midout.gen import _chunk
+    monkeypatch.setattr(_chunk, '_VERIFIED_FINGERPRINTS', set())
+
+    def make(h: str) -> gen.Chunk:
+        return gen.Chunk(
+            circuit=stim.Circuit(f"{h} 0"),
+            q2i={0: 0},
+            flows=[gen.Flow(
+                center=0,
+                start=gen.PauliString({0: 'X'}),
+                end=gen.PauliString({0: 'Z'}),
+            )],
+        )
+
+    calls = []
+    original = gen.Chunk._verify_uncached
+    monkeypatch.setattr(gen.Chunk, '_verify_uncached', lambda self: calls.append(self) or original(self))
+
+    a = make('H')
+    assert a.fingerprint() == make('H').fingerprint()
+    assert a.fingerprint() != make('H_XY').fingerprint()
+    gen.verify_chunks([a, make('H'), a], workers=1)
+    assert len(calls) == 1
+    make('H').verify()
+    assert len(calls) == 1
+
+    with pytest.raises(ValueError):
+        gen.verify_chunks([make('H_XY')], workers=1)
+    with pytest.raises(ValueError):
+        make('H_XY').verify()
+    assert len(calls) == 3
+
+
+def test_verify_chunks_parallel():
+    chunks = [
+        gen.Chunk(
+            circuit=stim.Circuit(f"H {k}"),
+            q2i={k: k},
+            flows=[gen.Flow(
+                center=k,
+                start=gen.PauliString({k: 'X'}),
+                end=gen.PauliString({k: 'Z'}),
+            )],
+        )
+        for k in range(3)
+    ]
+    gen.verify_chunks(chunks, workers=2)
+
+    chunks.append(gen.Chunk(
+        circuit=stim.Circuit("H 5"),
+        q2i={5: 5},
+        flows=[gen.Flow(
+            center=5,
+            start=gen.PauliString({5: 'X'}),
+            end=gen.PauliString({5: 'X'}),
+        )],
+    ))
+    with pytest.raises(ValueError):
+        gen.verify_chunks(chunks, workers=2)
+
+
+def test_chunk_transform_views_are_lazy_and_composed():
+    chunk = gen.Chunk(
+        circuit=stim.Circuit("""
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0) 1
+            RX 0
+            R 1
+            CX 0 1
+            M 1
+            DETECTOR(1, 0) rec[-1]
+        """),
+        q2i={0: 0, 1: 1},
+        flows=[
+            gen.Flow(center=1, start=gen.PauliString({0: 'X', 1: 'Z'}), end=gen.PauliString({0: 'Y'})),
+        ],
+        discarded_outputs=[gen.PauliString({1: 'X'})],
+    )
+
+    def shift(q: complex) -> complex:
+        return q + 1j
+
+    def mirror(q: complex) -> complex:
+        return -q.real + q.imag * 1j
+
+    view = chunk.with_xz_flipped().with_transformed_coords(shift).with_transformed_coords(mirror)
+    assert isinstance(view, gen.Chunk)
+    assert view._base is chunk
+    assert view._materialized is None
+    view = view.with_repetitions(3)
+    assert view.repetitions == 3
+
+    assert view.circuit == stim.Circuit("""
+        QUBIT_COORDS(0, 1) 0
+        QUBIT_COORDS(-1, 1) 1
+        R 0
+        RX 1
+        XCZ 0 1
+        MX 1
+        DETECTOR(-1, 1) rec[-1]
+    """)
+    assert view.q2i == {1j: 0, -1 + 1j: 1}
+    (flow,) = view.flows
+    assert flow.start == gen.PauliString({1j: 'Z', -1 + 1j: 'X'})
+    assert flow.end == gen.PauliString({1j: 'Y'})
+    assert flow.center == -1 + 1j
+
+    view = chunk.with_xz_flipped()
+    assert view._materialized is None
+    flipped = gen.Chunk(
+        circuit=stim.Circuit("""
+            QUBIT_COORDS(0, 0) 0
+            QUBIT_COORDS(1, 0) 1
+            R 0
+            RX 1
+            XCZ 0 1
+            MX 1
+            DETECTOR(1, 0) rec[-1]
+        """),
+        q2i={0: 0, 1: 1},
+        flows=[
+            gen.Flow(center=1, start=gen.PauliString({0: 'Z', 1: 'X'}), end=gen.PauliString({0: 'Y'})),
+        ],
+        discarded_outputs=[gen.PauliString({1: 'Z'})],
+    )
+    assert view.circuit == flipped.circuit
+    assert view.q2i == flipped.q2i
+    assert [(f.start, f.end, f.center) for f in view.flows] == [(f.start, f.end, f.center) for f in flipped.flows]
+    assert list(view.discarded_inputs) == list(flipped.discarded_inputs)
+    assert list(view.discarded_outputs) == list(flipped.discarded_outputs)
+    assert view.with_xz_flipped().circuit == chunk.circuit
+
+
+def test_chunk_transform_view_pickles_materialized():
+    chunk = gen.Chunk(
+        circuit=stim.Circuit("QUBIT_COORDS(0, 0) 0\nR 0\nM 0"),
+        q2i={0: 0},
+        flows=[gen.Flow(center=0, measurement_indices=[0])],
+    )
+    view = chunk.with_transformed_coords(lambda q: q + 2)
+    copy = pickle.loads(pickle.dumps(view))
+    assert type(copy) is gen.Chunk
+    assert copy.circuit == view.circuit
+    assert copy.q2i == {2: 0}
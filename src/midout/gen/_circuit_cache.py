@@ -0,0 +1,164 @@
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+import stim
+
+INDEX_FILE_NAME = 'index.json'
+
+# Bump when the layout of cached entries, or the way keys are computed, changes.
+CACHE_FORMAT_VERSION = 1
+
+# Packages whose sources determine the generated circuits.
+_GENERATOR_PACKAGES = ('midout', 'zxxz_surface_code_circuits')
+
+
+@functools.lru_cache(maxsize=None)
+def _generator_source_hash() -> str:
+    """Hashes the (non-test) sources of the circuit generating packages.
+
+    Editing a generator changes the hash, which invalidates every entry it produced,
+    even when the package version stays the same (e.g. in an editable install).
+    """
+    root = pathlib.Path(__file__).parents[2]
+    result = hashlib.sha256()
+    for package in _GENERATOR_PACKAGES:
+        for path in sorted((root / package).rglob('*.py')):
+            if path.name.endswith('_test.py'):
+                continue
+            result.update(path.relative_to(root).as_posix().encode('utf8'))
+            result.update(b'\0')
+            result.update(path.read_bytes())
+            result.update(b'\0')
+    return result.hexdigest()
+
+
+class CircuitCache:
+    """A persistent, size-bounded cache of generated circuits.
+
+    Circuits are stored as `.stim` files in a directory, named by a stable hash of
+    the parameters that produced them, plus `CACHE_FORMAT_VERSION`, a hash of the
+    generator sources, and the stim version. An
+    index file tracks the size and last use time of each entry, and the least
+    recently used entries are evicted when the total size exceeds `max_bytes`.
+
+    The cache is safe to share between processes in the sense that files are
+    written atomically; concurrent index updates may lose recency information
+    but never corrupt cached circuits.
+    """
+
+    def __init__(self,
+                 directory: Union[str, pathlib.Path],
+                 *,
+                 max_bytes: int = 2**30):
+        """
+        Args:
+            directory: Where to store the cached circuits. Created if missing.
+            max_bytes: Total size of cached circuit files to keep before evicting
+                least recently used entries.
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(params: Dict[str, Any]) -> str:
+        """Returns the cache key for circuits generated from the given parameters.
+
+        Values that aren't JSON serializable (e.g. noise models) are keyed by their
+        repr, so they must have a deterministic repr.
+        """
+        payload = json.dumps(
+            {
+                'params': params,
+                'format_version': CACHE_FORMAT_VERSION,
+                'source_hash': _generator_source_hash(),
+                'stim_version': stim.__version__,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode('utf8')).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f'{key}.stim'
+
+    def _read_index(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self.directory / INDEX_FILE_NAME) as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+
+        # Reconcile with the files actually present (other processes may have
+        # added or evicted entries without our index update surviving).
+        result = {}
+        for path in self.directory.glob('*.stim'):
+            key = path.stem
+            entry = index.get(key)
+            if entry is None:
+                stat = path.stat()
+                entry = {'size': stat.st_size, 'last_used': stat.st_mtime}
+            result[key] = entry
+        return result
+
+    def _write_index(self, index: Dict[str, Dict[str, float]]) -> None:
+        path = self.directory / INDEX_FILE_NAME
+        tmp_path = path.with_name(f'{INDEX_FILE_NAME}.tmp{os.getpid()}')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[stim.Circuit]:
+        """Returns the cached circuit for the given key, or None if not cached."""
+        path = self._path(key)
+        try:
+            circuit = stim.Circuit.from_file(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        index = self._read_index()
+        if key in index:
+            index[key]['last_used'] = time.time()
+            self._write_index(index)
+        return circuit
+
+    def put(self, key: str, circuit: stim.Circuit) -> None:
+        """Stores a circuit under the given key, evicting old entries if needed."""
+        path = self._path(key)
+        tmp_path = path.with_name(f'{path.name}.tmp{os.getpid()}')
+        circuit.to_file(tmp_path)
+        os.replace(tmp_path, path)
+
+        index = self._read_index()
+        index[key] = {'size': path.stat().st_size, 'last_used': time.time()}
+        total = sum(entry['size'] for entry in index.values())
+        for old_key in sorted(index, key=lambda k: index[k]['last_used']):
+            if total <= self.max_bytes or old_key == key:
+                break
+            total -= index.pop(old_key)['size']
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+        self._write_index(index)
+
+    def get_or_make(self,
+                    params: Dict[str, Any],
+                    make: Callable[[], stim.Circuit]) -> stim.Circuit:
+        """Returns the cached circuit for `params`, calling `make` to produce it on a miss."""
+        key = self.key(params)
+        circuit = self.get(key)
+        if circuit is None:
+            circuit = make()
+            self.put(key, circuit)
+        return circuit
+
+    def clear(self) -> None:
+        """Deletes every cached circuit."""
+        for path in self.directory.glob('*.stim'):
+            os.remove(path)
+        self._write_index({})
@@ -0,0 +1,84 @@
+import stim
+
+from midout import gen
+from midout._make_circuit import make_circuit
+from midout.gen import _circuit_cache
+
+
+def test_key_is_stable_and_parameter_sensitive():
+    a = gen.CircuitCache.key({'distance': 3, 'noise': gen.NoiseModel.si1000(1e-3)})
+    b = gen.CircuitCache.key({'noise': gen.NoiseModel.si1000(1e-3), 'distance': 3})
+    c = gen.CircuitCache.key({'distance': 3, 'noise': gen.NoiseModel.si1000(2e-3)})
+    assert a == b
+    assert a != c
+
+
+def test_key_ignores_noise_rule_insertion_order():
+    def noise(gate_names) -> gen.NoiseModel:
+        return gen.NoiseModel(
+            idle_depolarization=1e-3,
+            gate_rules={name: gen.NoiseRule(after={'X_ERROR': 1e-3, 'Z_ERROR': 2e-3}) for name in gate_names},
+            measure_rules={'Z': gen.NoiseRule(after={'Z_ERROR': 2e-3, 'X_ERROR': 1e-3}, flip_result=1e-3)},
+        )
+    a = noise(['H', 'CX'])
+    b = noise(['CX', 'H'])
+    assert repr(a) == repr(b)
+    assert gen.CircuitCache.key({'noise': a}) == gen.CircuitCache.key({'noise': b})
+
+
+def test_key_depends_on_format_version_and_generator_sources(monkeypatch):
+    key = gen.CircuitCache.key({'distance': 3})
+    monkeypatch.setattr(_circuit_cache, 'CACHE_FORMAT_VERSION', _circuit_cache.CACHE_FORMAT_VERSION + 1)
+    assert gen.CircuitCache.key({'distance': 3}) != key
+    monkeypatch.undo()
+
+    source_hash = _circuit_cache._generator_source_hash()
+    assert len(source_hash) == 64
+    monkeypatch.setattr(_circuit_cache, '_generator_source_hash', lambda: 'edited')
+    assert gen.CircuitCache.key({'distance': 3}) != key
+
+
+def test_get_or_make(tmp_path):
+    cache = gen.CircuitCache(tmp_path)
+    calls = []
+
+    def make() -> stim.Circuit:
+        calls.append(1)
+        return stim.Circuit("H 0\nM 0")
+
+    assert cache.get_or_make({'x': 1}, make) == stim.Circuit("H 0\nM 0")
+    assert cache.get_or_make({'x': 1}, make) == stim.Circuit("H 0\nM 0")
+    assert len(calls) == 1
+
+    # A fresh cache object over the same directory (e.g. a restarted worker) hits.
+    assert gen.CircuitCache(tmp_path).get_or_make({'x': 1}, make) == stim.Circuit("H 0\nM 0")
+    assert len(calls) == 1
+
+
+def test_lru_eviction(tmp_path):
+    circuit = stim.Circuit("H 0 1 2 3\nM 0 1 2 3")
+    size = len(str(circuit)) + 1
+    cache = gen.CircuitCache(tmp_path, max_bytes=size * 2)
+    cache.put('a', circuit)
+    cache.put('b', circuit)
+    assert cache.get('a') is not None
+    cache.put('c', circuit)
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+
+
+def test_make_circuit_uses_cache(tmp_path):
+    cache = gen.CircuitCache(tmp_path)
+    kwargs = dict(
+        basis='Z',
+        distance=3,
+        noise=gen.NoiseModel.si1000(1e-3),
+        boundary_rounds=0,
+        memory_rounds=3,
+    )
+    expected = make_circuit(**kwargs)
+    assert make_circuit(**kwargs, cache=cache) == expected
+    assert len(list(tmp_path.glob('*.stim'))) == 1
+    assert make_circuit(**kwargs, cache=cache) == expected
+    assert len(list(tmp_path.glob('*.stim'))) == 1
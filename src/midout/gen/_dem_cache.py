@@ -0,0 +1,192 @@
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import pathlib
+from typing import Callable, Dict, Iterable, Optional, Union
+
+import stim
+
+from midout.gen._trace import trace_span
+from midout.gen._util import stim_circuit_fingerprint
+
+
+class DemCache:
+    """A persistent cache of detector error models, keyed by circuit fingerprint.
+
+    Each entry is a `.dem` file named by a hash of the circuit's fingerprint (see
+    `stim_circuit_fingerprint`), the options used to extract the model, and the
+    stim version. When requested, the length of the model's shortest graphlike
+    error is stored next to it in a `.json` file, since finding it is also slow.
+
+    Files are written atomically, so several processes can share one directory.
+    """
+
+    def __init__(self,
+                 directory: Union[str, pathlib.Path],
+                 *,
+                 decompose_errors: bool = False):
+        """
+        Args:
+            directory: Where to store the cached models. Created if missing.
+            decompose_errors: Passed to `stim.Circuit.detector_error_model`.
+                Models extracted with different options are cached separately.
+        """
+        self.directory = pathlib.Path(directory)
+        self.decompose_errors = decompose_errors
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, circuit: stim.Circuit) -> str:
+        """Returns the cache key for the given circuit's detector error model."""
+        payload = json.dumps(
+            {
+                'circuit': stim_circuit_fingerprint(circuit),
+                'decompose_errors': self.decompose_errors,
+                'stim_version': stim.__version__,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode('utf8')).hexdigest()
+
+    def _dem_path(self, key: str) -> pathlib.Path:
+        return self.directory / f'{key}.dem'
+
+    def _distance_path(self, key: str) -> pathlib.Path:
+        return self.directory / f'{key}.json'
+
+    def _read_dem(self, key: str) -> Optional[stim.DetectorErrorModel]:
+        try:
+            return stim.DetectorErrorModel.from_file(self._dem_path(key))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _read_distance(self, key: str) -> Optional[int]:
+        try:
+            with open(self._distance_path(key)) as f:
+                return json.load(f)['graphlike_distance']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def _write_dem(self, key: str, dem: stim.DetectorErrorModel) -> None:
+        path = self._dem_path(key)
+        tmp_path = path.with_name(f'{path.name}.tmp{os.getpid()}')
+        dem.to_file(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _write_distance(self, key: str, distance: int) -> None:
+        path = self._distance_path(key)
+        tmp_path = path.with_name(f'{path.name}.tmp{os.getpid()}')
+        with open(tmp_path, 'w') as f:
+            json.dump({'graphlike_distance': distance}, f)
+        os.replace(tmp_path, path)
+
+    def _is_complete(self, key: str, *, graphlike_distance: bool) -> bool:
+        if not self._dem_path(key).exists():
+            return False
+        return not graphlike_distance or self._distance_path(key).exists()
+
+    def _dem_for_key(self, key: str, circuit: stim.Circuit) -> stim.DetectorErrorModel:
+        dem = self._read_dem(key)
+        if dem is None:
+            with trace_span('DemCache.detector_error_model'):
+                dem = circuit.detector_error_model(decompose_errors=self.decompose_errors)
+            self._write_dem(key, dem)
+        return dem
+
+    def _distance_for_key(self, key: str, circuit: stim.Circuit) -> int:
+        distance = self._read_distance(key)
+        if distance is None:
+            dem = self._dem_for_key(key, circuit)
+            with trace_span('DemCache.graphlike_distance'):
+                distance = len(dem.shortest_graphlike_error())
+            self._write_distance(key, distance)
+        return distance
+
+    def get(self, circuit: stim.Circuit) -> Optional[stim.DetectorErrorModel]:
+        """Returns the cached detector error model of a circuit, or None if not cached."""
+        return self._read_dem(self.key(circuit))
+
+    def detector_error_model(self, circuit: stim.Circuit) -> stim.DetectorErrorModel:
+        """Returns the circuit's detector error model, extracting and caching it on a miss."""
+        return self._dem_for_key(self.key(circuit), circuit)
+
+    def graphlike_distance(self, circuit: stim.Circuit) -> int:
+        """Returns the length of the circuit's shortest graphlike logical error.
+
+        Uses (and populates) the cached detector error model, so it's equal to
+        `len(circuit.detector_error_model(...).shortest_graphlike_error())`.
+        """
+        return self._distance_for_key(self.key(circuit), circuit)
+
+    def populate(self,
+                 circuits: Iterable[stim.Circuit],
+                 *,
+                 graphlike_distances: bool = False,
+                 workers: Optional[int] = None,
+                 progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Computes the missing cache entries for many circuits, in parallel.
+
+        Afterwards `detector_error_model` (and `graphlike_distance`, if requested)
+        are cache hits for every given circuit. Circuits that are already cached,
+        or that repeat an earlier circuit, aren't recomputed.
+
+        Args:
+            circuits: The circuits to compute entries for.
+            graphlike_distances: Whether to also compute and cache the length of
+                each model's shortest graphlike error.
+            workers: Number of worker processes. Defaults to `os.cpu_count()`.
+                When set to 1, or when at most one entry is missing, entries are
+                computed in the calling process. Workers write the entries
+                directly, so large models aren't sent back to the caller.
+            progress: Called as `progress(done, total)` before the first missing
+                entry is computed and after each one finishes, where `total` is
+                the number of missing entries. For example
+                `lambda done, total: print(f'{done}/{total}', file=sys.stderr)`.
+
+        Returns:
+            The number of entries that were computed.
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError(f'{workers=} < 1')
+
+        pending: Dict[str, stim.Circuit] = {}
+        for circuit in circuits:
+            key = self.key(circuit)
+            if key not in pending and not self._is_complete(key, graphlike_distance=graphlike_distances):
+                pending[key] = circuit
+
+        total = len(pending)
+        if progress is not None:
+            progress(0, total)
+        compute = functools.partial(_populate_entry, self, graphlike_distance=graphlike_distances)
+        if workers == 1 or total <= 1:
+            for done, item in enumerate(pending.items(), start=1):
+                compute(item)
+                if progress is not None:
+                    progress(done, total)
+            return total
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, total)) as pool:
+            futures = [pool.submit(compute, item) for item in pending.items()]
+            for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                future.result()
+                if progress is not None:
+                    progress(done, total)
+        return total
+
+    def clear(self) -> None:
+        """Deletes every cached entry."""
+        for pattern in ['*.dem', '*.json']:
+            for path in self.directory.glob(pattern):
+                os.remove(path)
+
+
+def _populate_entry(cache: DemCache, item: tuple, *, graphlike_distance: bool) -> None:
+    key, circuit = item
+    if graphlike_distance:
+        cache._distance_for_key(key, circuit)
+    else:
+        cache._dem_for_key(key, circuit)
@@ -0,0 +1,62 @@
+import stim
+
+from midout import gen
+
+
+def _noisy_repetition_code(distance: int) -> stim.Circuit:
+    return stim.Circuit.generated(
+        'repetition_code:memory',
+        distance=distance,
+        rounds=3,
+        after_clifford_depolarization=1e-3,
+    )
+
+
+def test_fingerprint():
+    a = _noisy_repetition_code(3)
+    assert gen.stim_circuit_fingerprint(a) == gen.stim_circuit_fingerprint(a.copy())
+    assert gen.stim_circuit_fingerprint(a) != gen.stim_circuit_fingerprint(_noisy_repetition_code(5))
+
+
+def test_detector_error_model_is_cached(tmp_path, monkeypatch):
+    circuit = _noisy_repetition_code(3)
+    cache = gen.DemCache(tmp_path)
+    assert cache.get(circuit) is None
+    assert cache.detector_error_model(circuit) == circuit.detector_error_model()
+    assert cache.graphlike_distance(circuit) == 3
+
+    # A fresh cache object over the same directory (e.g. a restarted worker) hits.
+    calls = []
+    monkeypatch.setattr(stim.Circuit, 'detector_error_model', lambda *args, **kwargs: calls.append(1))
+    other = gen.DemCache(tmp_path)
+    assert other.get(circuit) is not None
+    assert other.detector_error_model(circuit) == cache.get(circuit)
+    assert other.graphlike_distance(circuit) == 3
+    assert calls == []
+
+    # Models extracted with different options don't collide.
+    assert gen.DemCache(tmp_path, decompose_errors=True).get(circuit) is None
+
+    cache.clear()
+    assert cache.get(circuit) is None
+
+
+def test_populate(tmp_path):
+    circuits = [_noisy_repetition_code(d) for d in [3, 5, 3, 7]]
+    cache = gen.DemCache(tmp_path, decompose_errors=True)
+    assert cache.populate(circuits[:1], workers=1) == 1
+
+    reports = []
+    computed = cache.populate(
+        circuits,
+        graphlike_distances=True,
+        workers=2,
+        progress=lambda done, total: reports.append((done, total)),
+    )
+    assert computed == 3
+    assert reports == [(0, 3), (1, 3), (2, 3), (3, 3)]
+    assert len(list(tmp_path.glob('*.dem'))) == 3
+    assert [cache.graphlike_distance(c) for c in circuits] == [3, 5, 3, 7]
+    assert cache.get(circuits[1]) == circuits[1].detector_error_model(decompose_errors=True)
+
+    assert cache.populate(circuits, graphlike_distances=True) == 0
@@ -1,15 +1,157 @@
-from typing import Iterable, Tuple, Any, Optional, Dict, Callable
+import weakref
+from typing import Iterable, Tuple, Any, Optional, Dict, Callable, List
 
 from midout import gen
 from midout.gen._tile import Tile
 from midout.gen._util import sorted_complex
 
 
+class _QubitTable:
+    """Interned qubit positions. The bit for a qubit in a `PackedPauliString` is its index here."""
+    __slots__ = ('qubit_to_index', 'index_to_qubit', '__weakref__')
+
+    def __init__(self):
+        self.qubit_to_index: Dict[complex, int] = {}
+        self.index_to_qubit: List[complex] = []
+
+    def index(self, q: complex) -> int:
+        i = self.qubit_to_index.get(q)
+        if i is None:
+            i = len(self.index_to_qubit)
+            self.qubit_to_index[q] = i
+            self.index_to_qubit.append(q)
+        return i
+
+
+# Every packed pauli string holds a reference to the table its bits index into, and
+# only this weak reference is global. So all live strings share one table, and the
+# table (with every qubit position it interned) is freed once none of them remain.
+# Indices are only meaningful within one process.
+_CURRENT_QUBIT_TABLE: Optional['weakref.ref[_QubitTable]'] = None
+
+
+def _qubit_table() -> _QubitTable:
+    global _CURRENT_QUBIT_TABLE
+    table = None if _CURRENT_QUBIT_TABLE is None else _CURRENT_QUBIT_TABLE()
+    if table is None:
+        table = _QubitTable()
+        _CURRENT_QUBIT_TABLE = weakref.ref(table)
+    return table
+
+
+def _set_bits(mask: int) -> Iterable[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class PackedPauliString:
+    """A qubit-to-pauli mapping stored as X and Z bitmasks over interned qubits.
+
+    Multiplication, commutation checks, hashing and equality are a few integer
+    operations, instead of dictionary work proportional to the number of qubits.
+    Convert with `PauliString.packed` and `PackedPauliString.unpacked`.
+    """
+    __slots__ = ('xs', 'zs', '_hash', '_table')
+
+    def __init__(self, xs: int = 0, zs: int = 0, _table: Optional[_QubitTable] = None):
+        self.xs = xs
+        self.zs = zs
+        self._hash = hash((xs, zs))
+        self._table = _qubit_table() if _table is None else _table
+
+    @staticmethod
+    def from_qubits(qubits: Dict[complex, str]) -> 'PackedPauliString':
+        table = _qubit_table()
+        xs = 0
+        zs = 0
+        for q, p in qubits.items():
+            bit = 1 << table.index(q)
+            if p == 'X':
+                xs |= bit
+            elif p == 'Z':
+                zs |= bit
+            elif p == 'Y':
+                xs |= bit
+                zs |= bit
+            elif p != 'I':
+                raise ValueError(f'Not a pauli: {p!r}')
+        return PackedPauliString(xs, zs, table)
+
+    @property
+    def qubits(self) -> Dict[complex, str]:
+        xs = self.xs
+        zs = self.zs
+        index_to_qubit = self._table.index_to_qubit
+        result = {}
+        for i in _set_bits(xs | zs):
+            result[index_to_qubit[i]] = 'IXZY'[(xs >> i & 1) + 2 * (zs >> i & 1)]
+        return {q: result[q] for q in sorted_complex(result.keys())}
+
+    def unpacked(self) -> 'PauliString':
+        result = PauliString(self.qubits, _sorted=True)
+        result._packed = self
+        return result
+
+    def __len__(self) -> int:
+        return (self.xs | self.zs).bit_count()
+
+    def __bool__(self):
+        return bool(self.xs | self.zs)
+
+    def __mul__(self, other: 'PackedPauliString') -> 'PackedPauliString':
+        return PackedPauliString(self.xs ^ other.xs, self.zs ^ other.zs, self._table)
+
+    def anticommutes(self, other: 'PackedPauliString') -> bool:
+        return ((self.xs & other.zs) ^ (self.zs & other.xs)).bit_count() % 2 == 1
+
+    def with_xz_flipped(self) -> 'PackedPauliString':
+        return PackedPauliString(self.zs, self.xs, self._table)
+
+    def with_transformed_coords(self, transform: Callable[[complex], complex]) -> 'PackedPauliString':
+        return PackedPauliString.from_qubits({transform(q): p for q, p in self.qubits.items()})
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, PackedPauliString):
+            return NotImplemented
+        return self.xs == other.xs and self.zs == other.zs
+
+    def __reduce__(self):
+        # Qubit indices are process-local, so pickle by qubit position.
+        return PackedPauliString.from_qubits, (self.qubits,)
+
+    def __repr__(self):
+        return f'PackedPauliString.from_qubits({self.qubits!r})'
+
+    def __str__(self):
+        return str(self.unpacked())
+
+
 class PauliString:
     """A qubit-to-pauli mapping."""
-    def __init__(self, qubits: Dict[complex, str]):
-        self.qubits = {q: qubits[q] for q in gen.sorted_complex(qubits.keys())}
+    __slots__ = ('qubits', '_hash', '_packed', '__weakref__')
+
+    def __init__(self, qubits: Dict[complex, str], *, _sorted: bool = False):
+        if _sorted:
+            self.qubits = qubits
+        else:
+            self.qubits = {q: qubits[q] for q in gen.sorted_complex(qubits.keys())}
         self._hash = hash(tuple(self.qubits.items()))
+        self._packed: Optional[PackedPauliString] = None
+
+    def packed(self) -> PackedPauliString:
+        """Returns the equivalent `PackedPauliString` (computed once and cached)."""
+        if self._packed is None:
+            self._packed = PackedPauliString.from_qubits(self.qubits)
+        return self._packed
+
+    def __reduce__(self):
+        # The cached packed form isn't pickled, because its bit indices are process-local.
+        return PauliString, (self.qubits,)
 
     def __bool__(self):
         return bool(self.qubits)
@@ -43,13 +185,10 @@ class PauliString:
     def with_xz_flipped(self) -> 'PauliString':
         return PauliString({
             q: "Z" if p == 'X' else 'X' if p == 'Z' else p for q, p in self.qubits.items()
-        })
+        }, _sorted=True)
 
     def anticommutes(self, other: 'PauliString') -> bool:
-        t = 0
-        for q in self.qubits.keys() & other.qubits.keys():
-            t += self.qubits[q] != other.qubits[q]
-        return t % 2 == 1
+        return self.packed().anticommutes(other.packed())
 
     def with_transformed_coords(self, transform: Callable[[complex], complex]) -> 'PauliString':
         return PauliString({
@@ -57,12 +196,32 @@ class PauliString:
         })
 
     @staticmethod
-    def from_tile_data(tile: Tile) -> 'PauliString':
-        return PauliString({
-            k: v
-            for k, v in zip(tile.ordered_data_qubits, tile.bases)
-            if k is not None
-        })
+    def from_tile_data(tile: Tile, *, bases: Optional[str] = None) -> 'PauliString':
+        """Returns the stabilizer of a tile.
+
+        Args:
+            tile: The tile.
+            bases: Overrides the tile's bases.
+
+        Equal tiles share one PauliString instance for as long as any of them
+        is alive, so the flows of chunks built from the same patch don't each
+        hold their own copy.
+        """
+        if bases is None:
+            bases = tile.bases
+        interned = _TILE_PAULI_STRINGS.get(tile)
+        if interned is None:
+            interned = {}
+            _TILE_PAULI_STRINGS[tile] = interned
+        result = interned.get(bases)
+        if result is None:
+            result = PauliString({
+                k: v
+                for k, v in zip(tile.ordered_data_qubits, bases)
+                if k is not None
+            })
+            interned[bases] = result
+        return result
 
     def __hash__(self):
         return self._hash
@@ -70,12 +229,18 @@ class PauliString:
     def __eq__(self, other):
         if not isinstance(other, PauliString):
             return NotImplemented
-        return self.qubits == other.qubits
+        return self._hash == other._hash and self.qubits == other.qubits
+
+
+# The stabilizers of live tiles (by bases), shared by `PauliString.from_tile_data`.
+_TILE_PAULI_STRINGS: 'weakref.WeakKeyDictionary[Tile, Dict[str, PauliString]]' = weakref.WeakKeyDictionary()
+_EMPTY_PAULI_STRING = PauliString({})
 
 
 class Flow:
     """A rule for how a stabilizer travels into, through, and/or out of a chunk.
     """
+    __slots__ = ('start', 'end', 'measurement_indices', 'obs_index', 'center')
 
     def __init__(self,
                  *,
@@ -85,8 +250,8 @@ class Flow:
                  obs_index: Any = None,
                  center: complex,
                  ):
-        self.start = PauliString({}) if start is None else start
-        self.end = PauliString({}) if end is None else end
+        self.start = _EMPTY_PAULI_STRING if start is None else start
+        self.end = _EMPTY_PAULI_STRING if end is None else end
         self.measurement_indices: Tuple[int, ...] = tuple(measurement_indices)
         self.obs_index = obs_index
         self.center = center
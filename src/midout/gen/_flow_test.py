@@ -1,3 +1,8 @@
+import pathlib
+import pickle
+import subprocess
+import sys
+
 from midout import gen
 
 
@@ -10,3 +15,67 @@ def test_mul():
     c = gen.PauliString({q: p for q, p in enumerate(c) if p != 'I'})
     assert a * b == c
 
+
+def test_packed_pauli_string():
+    a = gen.PauliString({1j: 'X', 2: 'Y', 3 + 1j: 'Z'})
+    b = gen.PauliString({2: 'Z', 3 + 1j: 'Z', 5: 'X'})
+    pa = a.packed()
+    pb = b.packed()
+    assert pa.unpacked() == a
+    assert list(pa.qubits) == list(a.qubits)
+    assert gen.PackedPauliString.from_qubits(a.qubits) == pa
+    assert hash(gen.PackedPauliString.from_qubits(a.qubits)) == hash(pa)
+    assert len(pa) == 3
+    assert bool(pa) and not gen.PackedPauliString()
+
+    assert (pa * pb).unpacked() == gen.PauliString({1j: 'X', 2: 'X', 5: 'X'})
+    assert pa.anticommutes(pb) and a.anticommutes(b)
+    assert not pa.anticommutes(pa)
+    assert pa.with_xz_flipped().unpacked() == a.with_xz_flipped() == gen.PauliString({1j: 'Z', 2: 'Y', 3 + 1j: 'X'})
+    assert pa.with_transformed_coords(lambda q: q + 1).unpacked() == a.with_transformed_coords(lambda q: q + 1)
+
+
+def test_packed_pauli_string_pickles_by_position():
+    a = gen.PauliString({7 + 3j: 'X', 8 + 3j: 'Y'})
+    a.packed()
+    b = pickle.loads(pickle.dumps(a))
+    assert b == a
+    assert b.packed() == a.packed()
+    assert pickle.loads(pickle.dumps(a.packed())) == a.packed()
+
+
+def test_packed_qubit_table_is_freed_with_its_strings():
+    # In a fresh interpreter, since other tests keep packed strings alive.
+    code = """
+import gc
+from midout import gen
+from midout.gen import _flow
+
+a = gen.PauliString({7j: 'X', 1 + 7j: 'Z'}).packed()
+b = gen.PauliString({1 + 7j: 'Y', 2 + 7j: 'X'}).packed()
+table = _flow._qubit_table()
+assert a._table is b._table is (a * b)._table is table
+assert 2 + 7j in table.qubit_to_index
+
+del a, b, table
+gc.collect()
+table = _flow._qubit_table()
+assert 2 + 7j not in table.qubit_to_index
+c = gen.PauliString({2 + 7j: 'X'}).packed()
+assert c._table is table
+assert c.unpacked() == gen.PauliString({2 + 7j: 'X'})
+"""
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=pathlib.Path(__file__).parents[2])
+
+
+def test_from_tile_data_is_interned():
+    tile = gen.Tile(bases='X', measurement_qubit=0, ordered_data_qubits=[1, None, 2, 3])
+    same = gen.Tile(bases='X', measurement_qubit=0, ordered_data_qubits=[1, None, 2, 3])
+    a = gen.PauliString.from_tile_data(tile)
+    assert a == gen.PauliString({1: 'X', 2: 'X', 3: 'X'})
+    assert gen.PauliString.from_tile_data(same) is a
+    b = gen.PauliString.from_tile_data(tile, bases='ZXXZ')
+    assert b == gen.PauliString({1: 'Z', 2: 'X', 3: 'Z'})
+    assert gen.PauliString.from_tile_data(same, bases='ZXXZ') is b
+    assert not hasattr(a, '__dict__')
+    assert not hasattr(gen.Flow(start=a, center=0), '__dict__')
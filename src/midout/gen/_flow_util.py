@@ -1,12 +1,14 @@
+import hashlib
 from typing import Union, List, Tuple, Any, Optional, Dict, Callable, Literal
 
 import stim
 
 from midout.gen._chunk import Chunk
-from midout.gen._flow import PauliString, Flow
+from midout.gen._flow import PackedPauliString, PauliString, Flow
 from midout.gen._builder import MeasurementTracker, Builder, AtLayer
 from midout.gen._patch import Patch
-from midout.gen._util import sorted_complex
+from midout.gen._trace import traced
+from midout.gen._util import sorted_complex, stim_circuit_with_fused_instructions
 
 
 def magic_init_for_chunk(
@@ -136,43 +138,53 @@ def standard_surface_code_chunk(
         out=out,
     )
 
+    tile_measurements = out.tracker.measurement_indices_batch(
+        [AtLayer(tile.measurement_qubit, save_layer)]
+        for tile in patch.tiles
+    )
+    measured_tiles = [
+        tile
+        for tile in patch.tiles
+        if all(q is None or measure_data_basis.get(q) == b for q, b in zip(tile.ordered_data_qubits, tile.bases))
+    ]
+    measured_tile_measurements = out.tracker.measurement_indices_batch(
+        [AtLayer(q, save_layer) for q in tile.used_set]
+        for tile in measured_tiles
+    )
+
     flows = []
     if not init_data_basis:
         flows.extend(
             Flow(
                 center=tile.measurement_qubit,
                 start=PauliString.from_tile_data(tile),
-                measurement_indices=out.tracker.measurement_indices([AtLayer(tile.measurement_qubit, save_layer)]),
+                measurement_indices=ms,
             )
-            for tile in patch.tiles
+            for tile, ms in zip(patch.tiles, tile_measurements)
         )
     if not measure_data_basis:
         flows.extend(
             Flow(
                 center=tile.measurement_qubit,
                 end=PauliString.from_tile_data(tile),
-                measurement_indices=out.tracker.measurement_indices([AtLayer(tile.measurement_qubit, save_layer)]),
+                measurement_indices=ms,
             )
-            for tile in patch.tiles
+            for tile, ms in zip(patch.tiles, tile_measurements)
         )
     flows.extend(
         Flow(
             center=tile.measurement_qubit,
-            measurement_indices=out.tracker.measurement_indices([AtLayer(tile.measurement_qubit, save_layer)])
+            measurement_indices=ms,
         )
-        for tile in patch.tiles
+        for tile, ms in zip(patch.tiles, tile_measurements)
         if all(q is None or init_data_basis.get(q) == b for q, b in zip(tile.ordered_data_qubits, tile.bases))
     )
     flows.extend(
         Flow(
             center=tile.measurement_qubit,
-            measurement_indices=out.tracker.measurement_indices([
-                AtLayer(q, save_layer)
-                for q in tile.used_set
-            ]),
+            measurement_indices=ms,
         )
-        for tile in patch.tiles
-        if all(q is None or measure_data_basis.get(q) == b for q, b in zip(tile.ordered_data_qubits, tile.bases))
+        for tile, ms in zip(measured_tiles, measured_tile_measurements)
     )
     if obs is not None:
         start_obs = dict(obs.qubits)
@@ -208,34 +220,227 @@ def standard_surface_code_chunk(
 
 
 def relabel_circuit_into(*, circuit: stim.Circuit, old_q2i: Dict[complex, int], new_q2i: Dict[complex, int], out: stim.Circuit):
-    i2i = {i: new_q2i[q] for q, i in old_q2i.items()}
-
+    """Appends a copy of a chunk circuit, with qubit indices translated from one q2i to another.
+
+    QUBIT_COORDS instructions are dropped. When the mappings agree on every qubit,
+    instructions are copied as is. Otherwise the whole circuit is remapped through a
+    dense index list and rebuilt from text in one parse, which is much faster than
+    appending instructions target by target.
+    """
+    if all(new_q2i[q] == i for q, i in old_q2i.items()):
+        for inst in circuit:
+            if inst.name != 'QUBIT_COORDS':
+                out.append(inst)
+        return
+
+    # A plain list, not a numpy array: each instruction only has a few dozen targets,
+    # so creating an index array per instruction costs more than the lookups save.
+    # Indices missing from old_q2i are -1, so they're caught instead of kept as is.
+    remap = [-1] * (max(old_q2i.values(), default=-1) + 1)
+    for q, i in old_q2i.items():
+        remap[i] = new_q2i[q]
+
+    lines = []
     for inst in circuit:
         if inst.name == 'QUBIT_COORDS':
             continue
-        targets = []
-        for t in inst.targets_copy():
-            if t.is_qubit_target:
-                targets.append(i2i[t.value])
-            elif t.is_x_target:
-                targets.append(stim.target_x(i2i[t.value]))
-            elif t.is_y_target:
-                targets.append(stim.target_y(i2i[t.value]))
-            elif t.is_z_target:
-                targets.append(stim.target_z(i2i[t.value]))
-            elif t.is_combiner:
-                targets.append(t)
-            else:
-                raise NotImplementedError(f'{inst=}')
-        out.append(inst.name, targets, inst.gate_args_copy())
+        targets = inst.targets_copy()
+        try:
+            values = [remap[t.value] for t in targets]
+        except IndexError:
+            values = None
+        if values is None or -1 in values:
+            values = _checked_remapped_values(remap, inst)
+        if all(t.is_qubit_target for t in targets):
+            terms = [str(v) for v in values]
+        else:
+            terms = []
+            for t, v in zip(targets, values):
+                if t.is_qubit_target:
+                    terms.append(str(v))
+                elif t.is_x_target:
+                    terms.append(f'X{v}')
+                elif t.is_y_target:
+                    terms.append(f'Y{v}')
+                elif t.is_z_target:
+                    terms.append(f'Z{v}')
+                elif t.is_combiner:
+                    terms.append('*')
+                else:
+                    raise NotImplementedError(f'{inst=}')
+        args = inst.gate_args_copy()
+        arg_text = '(' + ', '.join(repr(a) for a in args) + ')' if args else ''
+        tag_text = f'[{_escape_tag(inst.tag)}]' if inst.tag else ''
+        target_text = ' '.join(terms).replace(' * ', '*')
+        lines.append(f'{inst.name}{tag_text}{arg_text} {target_text}')
+    out += stim.Circuit('\n'.join(lines))
+
+
+def _checked_remapped_values(remap: List[int], inst: stim.CircuitInstruction) -> List[int]:
+    """Remaps the target values of an instruction, failing on unmapped qubit indices.
+
+    The slow path of `relabel_circuit_into`, used when the bulk lookup hit a gap
+    (which may also come from a non-qubit target, e.g. a combiner).
+    """
+    values = []
+    for t in inst.targets_copy():
+        if t.is_qubit_target or t.is_x_target or t.is_y_target or t.is_z_target:
+            v = remap[t.value] if t.value < len(remap) else -1
+            if v == -1:
+                raise ValueError(f'Qubit index {t.value} in {inst} is missing from old_q2i.')
+            values.append(v)
+        else:
+            values.append(t.value)
+    return values
+
+
+def _escape_tag(tag: str) -> str:
+    """Escapes an instruction tag the way stim writes it in circuit text."""
+    return tag.replace('\\', '\\B').replace(']', '\\C').replace('\r', '\\r').replace('\n', '\\n')
 
 
 class ChunkCompileState:
-    def __init__(self, *, open_flows: Dict[Tuple[PauliString, Any], Union[Flow, Literal["discard"]]], measure_offset: int):
+    def __init__(self, *, open_flows: Dict[Tuple[PackedPauliString, Any], Union[Flow, Literal["discard"]]], measure_offset: int):
         self.open_flows = open_flows
         self.measure_offset = measure_offset
 
+    def loop_key(self) -> Dict[Tuple[PackedPauliString, Any], Any]:
+        """Summarizes everything about this state that affects how the next chunk compiles.
+
+        Measurement indices are made relative to the current measurement offset, so two
+        states with equal keys compile an identical chunk into an identical circuit. The
+        centers of observable flows are dropped because they never reach the circuit.
+        """
+        result = {}
+        for key, flow in self.open_flows.items():
+            if isinstance(flow, Flow):
+                result[key] = (
+                    tuple(m - self.measure_offset for m in flow.measurement_indices),
+                    flow.center if flow.obs_index is None else None,
+                )
+            else:
+                result[key] = flow
+        return result
+
 
+def _compile_chunk_flows(
+    *,
+    chunk: Chunk,
+    state: ChunkCompileState,
+    ignore_errors: bool,
+) -> Tuple[List[Flow], Dict[Tuple[PackedPauliString, Any], Union[Flow, Literal['discard']]]]:
+    """Matches a chunk's flows against the open flows, returning (finished flows, new open flows)."""
+    prev_flows = dict(state.open_flows)
+    next_flows: Dict[Tuple[PackedPauliString, Any], Union[Flow, Literal['discard']]] = {}
+    dumped_flows: List[Flow] = []
+    for flow in chunk.flows:
+        flow = Flow(
+            center=flow.center,
+            start=flow.start,
+            end=flow.end,
+            obs_index=flow.obs_index,
+            measurement_indices=[m + state.measure_offset for m in flow.measurement_indices]
+        )
+        if flow.start:
+            prev = prev_flows.pop((flow.start.packed(), flow.obs_index), None)
+            if prev is None:
+                if ignore_errors:
+                    continue
+                else:
+                    raise ValueError(f"Missing prev {flow!r} have {prev_flows!r}")
+            elif prev == 'discard':
+                continue
+            flow = prev.concat(flow, 0)
+        if flow.end:
+            if flow.obs_index is not None and flow.measurement_indices:
+                dumped_flows.append(flow)
+                flow = Flow(start=flow.start, end=flow.end, obs_index=flow.obs_index, center=flow.center)
+            next_flows[(flow.end.packed(), flow.obs_index)] = flow
+        else:
+            dumped_flows.append(flow)
+    for discarded in chunk.discarded_inputs:
+        prev = prev_flows.pop((discarded.packed(), None), None)
+    for discarded in chunk.discarded_outputs:
+        assert (discarded.packed(), None) not in next_flows
+        next_flows[(discarded.packed(), None)] = "discard"
+    for flow, val in prev_flows.items():
+        if val != "discard" and not ignore_errors:
+            raise ValueError(f"Some flows weren't matched when moving into chunk: {list(prev_flows.values())!r}")
+    return dumped_flows, next_flows
+
+
+def _append_flow_annotations(*, dumped_flows: List[Flow], new_measure_offset: int, out_circuit: stim.Circuit) -> None:
+    any_detectors = False
+    for flow in dumped_flows:
+        targets = []
+        for m in flow.measurement_indices:
+            targets.append(stim.target_rec(m - new_measure_offset))
+        if flow.obs_index is None:
+            out_circuit.append("DETECTOR", targets, (flow.center.real, flow.center.imag, 0))
+            any_detectors = True
+        else:
+            out_circuit.append("OBSERVABLE_INCLUDE", targets, flow.obs_index)
+    if any_detectors:
+        out_circuit.append("SHIFT_COORDS", [], (0, 0, 1))
+
+
+def _compile_repeated_chunk_from_template(
+    *,
+    chunk: Chunk,
+    state: ChunkCompileState,
+    include_detectors: bool,
+    ignore_errors: bool,
+    out_circuit: stim.Circuit,
+    q2i: Dict[complex, int],
+) -> ChunkCompileState:
+    """Compiles a repeated chunk by relabelling its circuit once and only iterating its flows.
+
+    Each iteration's output is the same relabelled body followed by annotations that depend
+    only on `state.loop_key()`. Iterations are simulated symbolically until that key stops
+    changing, after which every remaining iteration is known to be identical to the last one.
+    """
+    body = stim.Circuit()
+    relabel_circuit_into(circuit=chunk.circuit, out=body, old_q2i=chunk.q2i, new_q2i=q2i)
+    num_measurements = chunk.circuit.num_measurements
+
+    annotations: List[stim.Circuit] = []
+    prev_key = None
+    while len(annotations) < chunk.repetitions:
+        if include_detectors:
+            key = state.loop_key()
+            if key == prev_key:
+                break
+            prev_key = key
+            dumped_flows, next_flows = _compile_chunk_flows(chunk=chunk, state=state, ignore_errors=ignore_errors)
+        else:
+            dumped_flows, next_flows = [], {}
+        new_measure_offset = state.measure_offset + num_measurements
+        annotation = stim.Circuit()
+        _append_flow_annotations(dumped_flows=dumped_flows, new_measure_offset=new_measure_offset, out_circuit=annotation)
+        annotation.append("TICK")
+        annotations.append(annotation)
+        state = ChunkCompileState(open_flows=next_flows, measure_offset=new_measure_offset)
+        if not include_detectors:
+            break
+
+    # Any iterations not simulated repeat the last one. The returned state isn't advanced
+    # past them, which is fine because only relative measurement offsets reach the circuit.
+    remaining = chunk.repetitions - len(annotations)
+    k = 0
+    while k < len(annotations):
+        k2 = k + 1
+        while k2 < len(annotations) and annotations[k2] == annotations[k]:
+            k2 += 1
+        count = k2 - k
+        if k2 == len(annotations):
+            count += remaining
+        out_circuit += (body + annotations[k]) * count
+        k = k2
+
+    return state
+
+
+@traced()
 def compile_chunk_into_circuit(
     *,
     chunk: Chunk,
@@ -244,9 +449,19 @@ def compile_chunk_into_circuit(
     ignore_errors: bool,
     out_circuit: stim.Circuit,
     q2i: Dict[complex, int],
+    symbolic_loops: bool = True,
 ) -> ChunkCompileState:
     if chunk.repetitions == 0:
         return state
+    if chunk.repetitions > 1 and symbolic_loops:
+        return _compile_repeated_chunk_from_template(
+            chunk=chunk,
+            state=state,
+            include_detectors=include_detectors,
+            ignore_errors=ignore_errors,
+            out_circuit=out_circuit,
+            q2i=q2i,
+        )
     if chunk.repetitions > 1:
         no_reps = chunk.with_repetitions(1)
         circuits = []
@@ -289,59 +504,15 @@ def compile_chunk_into_circuit(
 
         return state
 
-    prev_flows = dict(state.open_flows)
-    next_flows: Dict[Tuple[PauliString, Any], Union[Flow, Literal['discard']]] = {}
     dumped_flows: List[Flow] = []
+    next_flows: Dict[Tuple[PackedPauliString, Any], Union[Flow, Literal['discard']]] = {}
     if include_detectors:
-        for flow in chunk.flows:
-            flow = Flow(
-                center=flow.center,
-                start=flow.start,
-                end=flow.end,
-                obs_index=flow.obs_index,
-                measurement_indices=[m + state.measure_offset for m in flow.measurement_indices]
-            )
-            if flow.start:
-                prev = prev_flows.pop((flow.start, flow.obs_index), None)
-                if prev is None:
-                    if ignore_errors:
-                        continue
-                    else:
-                        raise ValueError(f"Missing prev {flow!r} have {prev_flows!r}")
-                elif prev == 'discard':
-                    continue
-                flow = prev.concat(flow, 0)
-            if flow.end:
-                if flow.obs_index is not None and flow.measurement_indices:
-                    dumped_flows.append(flow)
-                    flow = Flow(start=flow.start, end=flow.end, obs_index=flow.obs_index, center=flow.center)
-                next_flows[(flow.end, flow.obs_index)] = flow
-            else:
-                dumped_flows.append(flow)
-        for discarded in chunk.discarded_inputs:
-            prev = prev_flows.pop((discarded, None), None)
-        for discarded in chunk.discarded_outputs:
-            assert (discarded, None) not in next_flows
-            next_flows[(discarded, None)] = "discard"
-        for flow, val in prev_flows.items():
-            if val != "discard" and not ignore_errors:
-                raise ValueError(f"Some flows weren't matched when moving into chunk: {list(prev_flows.values())!r}")
+        dumped_flows, next_flows = _compile_chunk_flows(chunk=chunk, state=state, ignore_errors=ignore_errors)
 
     new_measure_offset = state.measure_offset + chunk.circuit.num_measurements
     relabel_circuit_into(circuit=chunk.circuit, out=out_circuit, old_q2i=chunk.q2i, new_q2i=q2i)
     if include_detectors:
-        any_detectors = False
-        for flow in dumped_flows:
-            targets = []
-            for m in flow.measurement_indices:
-                targets.append(stim.target_rec(m - new_measure_offset))
-            if flow.obs_index is None:
-                out_circuit.append("DETECTOR", targets, (flow.center.real, flow.center.imag, 0))
-                any_detectors = True
-            else:
-                out_circuit.append("OBSERVABLE_INCLUDE", targets, flow.obs_index)
-        if any_detectors:
-            out_circuit.append("SHIFT_COORDS", [], (0, 0, 1))
+        _append_flow_annotations(dumped_flows=dumped_flows, new_measure_offset=new_measure_offset, out_circuit=out_circuit)
     out_circuit.append("TICK")
 
     return ChunkCompileState(
@@ -349,12 +520,30 @@ def compile_chunk_into_circuit(
         open_flows=next_flows,
     )
 
+@traced()
 def compile_chunks_into_circuit(
         chunks: List[Chunk],
         *,
         include_detectors: bool = True,
         ignore_errors: bool = False,
+        symbolic_loops: bool = True,
+        fuse_instructions: bool = False,
 ) -> stim.Circuit:
+    """Compiles a list of chunks into a single circuit, matching up their flows into detectors.
+
+    Args:
+        chunks: The chunks to compile, in order.
+        include_detectors: Whether to annotate detectors and observables from the flows.
+        ignore_errors: Skip flows that can't be matched instead of raising an exception.
+        symbolic_loops: When set, repeated chunks are compiled by iterating only their
+            flows until the loop reaches a steady state, instead of recompiling and
+            comparing the whole circuit of each iteration. Produces the same circuit.
+        fuse_instructions: Merge same-gate instructions within each moment, using
+            `stim_circuit_with_fused_instructions`.
+
+    Returns:
+        The compiled circuit.
+    """
     all_qubits = set()
     for c in chunks:
         all_qubits |= c.q2i.keys()
@@ -372,74 +561,133 @@ def compile_chunks_into_circuit(
             ignore_errors=ignore_errors,
             out_circuit=full_circuit,
             q2i=q2i,
+            symbolic_loops=symbolic_loops,
         )
     if include_detectors:
         if state.open_flows:
             if not ignore_errors:
                 raise ValueError("Unterminated")
+    if fuse_instructions:
+        full_circuit = stim_circuit_with_fused_instructions(full_circuit)
     return full_circuit
 
 
-def verify_circuit_has_all_possible_detectors(circuit: stim.Circuit):
+# Loop iterations whose starting state is snapshotted while looking for a period.
+# Snapshots cost O(n^3) for n qubits, so loops that don't settle quickly are just unrolled.
+_MAX_LOOP_SNAPSHOTS = 8
+
+
+def _unsigned_stabilizer_group_key(sim: stim.TableauSimulator) -> bytes:
+    """Identifies the simulator's stabilizer group, ignoring signs.
+
+    Whether a measurement is determined only depends on the group up to signs,
+    and random measurement results and noise only change signs.
+    """
+    text = '\n'.join(str(s)[1:] for s in sim.canonical_stabilizers())
+    return hashlib.sha256(text.encode('utf8')).digest()
+
+
+def verify_circuit_has_all_possible_detectors(
+        circuit: stim.Circuit,
+        *,
+        extrapolate_loops: bool = True,
+):
+    """Checks that every determined measurement is covered by a detector or observable.
+
+    Args:
+        circuit: The circuit to check. MPP isn't supported.
+        extrapolate_loops: When set, each REPEAT block is simulated only until
+            the stabilizer group at the start of an iteration (ignoring signs)
+            repeats an earlier one. The remaining iterations repeat that cycle,
+            so their determined measurements are counted without simulating
+            them. When not set, every iteration is simulated.
+
+    Raises:
+        ValueError: The number of detectors and observables differs from the
+            number of determined measurements.
+    """
     num_declarations = circuit.num_detectors + circuit.num_observables
     num_determined_measurements = 0
     num_detectors_seen = 0
     sim = stim.TableauSimulator()
-    coords = circuit.get_final_qubit_coordinates()
-
-    # last_obs_sightings = {}
-    # tick = 0
-    # def pre_run_block(block: stim.Circuit, reps: int):
-    #     nonlocal num_determined_measurements, tick, num_detectors_seen
-    #     for _ in range(reps):
-    #         for inst in block:
-    #             if isinstance(inst, stim.CircuitRepeatBlock):
-    #                 pre_run_block(inst.body_copy(), inst.repeat_count)
-    #             elif inst.name == 'OBSERVABLE_INCLUDE':
-    #                 last_obs_sightings[int(inst.gate_args_copy()[0])] = tick
-    #             elif inst.name == 'TICK':
-    #                 tick += 1
-    # pre_run_block(circuit, 1)
+    peekers = {
+        'M': sim.peek_z,
+        'MR': sim.peek_z,
+        'MX': sim.peek_x,
+        'MRX': sim.peek_x,
+        'MY': sim.peek_y,
+        'MRY': sim.peek_y,
+    }
 
     tick = 0
+
+    def run_measurements(inst: stim.CircuitInstruction):
+        nonlocal num_determined_measurements
+        peek = peekers[inst.name]
+        determined_targets = []
+        random_targets = []
+        for t in inst.targets_copy():
+            assert t.is_qubit_target
+            if peek(t.value) != 0:
+                determined_targets.append(t)
+            else:
+                random_targets.append(t)
+        num_determined_measurements += len(determined_targets)
+        if len(random_targets) <= 1:
+            sim.do(inst)
+            return
+
+        # Measuring a determined observable doesn't change the stabilizer group (up to
+        # signs), but a random result can determine a later target (e.g. `M 0 1` on a
+        # Bell pair). So only the random targets are measured one at a time.
+        args = inst.gate_args_copy()
+        for t in random_targets:
+            num_determined_measurements += peek(t.value) != 0
+            sim.do(stim.CircuitInstruction(inst.name, [t], args))
+        if determined_targets:
+            sim.do(stim.CircuitInstruction(inst.name, determined_targets, args))
+
+    def run_body(block: stim.Circuit):
+        nonlocal num_detectors_seen, tick
+        for inst in block:
+            if isinstance(inst, stim.CircuitRepeatBlock):
+                run_block(inst.body_copy(), inst.repeat_count)
+            elif inst.name == 'DETECTOR':
+                num_detectors_seen += 1
+            elif inst.name == 'TICK':
+                tick += 1
+            elif inst.name in peekers:
+                run_measurements(inst)
+            elif inst.name == 'MPP':
+                raise NotImplementedError(f'{inst=}')
+            else:
+                sim.do(inst)
+
     def run_block(block: stim.Circuit, reps: int):
-        nonlocal num_determined_measurements, tick, num_detectors_seen
-        for _ in range(reps):
-            for inst in block:
-                if isinstance(inst, stim.CircuitRepeatBlock):
-                    run_block(inst.body_copy(), inst.repeat_count)
-                elif inst.name == 'DETECTOR':
-                    num_detectors_seen += 1
-                elif inst.name == 'TICK':
-                    tick += 1
-                    # num_observables_done = sum(v <= tick for v in last_obs_sightings.values())
-                    # if num_detectors_seen + num_observables_done != num_determined_measurements:
-                    #     raise ValueError(f"at {tick=} found {num_detectors_seen=} + {num_observables_done=} != {num_determined_measurements=}")
-                elif inst.name == 'M' or inst.name == 'MR':
-                    args = inst.gate_args_copy()
-                    for t in inst.targets_copy():
-                        assert t.is_qubit_target
-                        known = sim.peek_z(t.value) != 0
-                        num_determined_measurements += known
-                        sim.do(stim.CircuitInstruction(inst.name, [t.value], args))
-                elif inst.name == 'MX' or inst.name == 'MRX':
-                    args = inst.gate_args_copy()
-                    for t in inst.targets_copy():
-                        assert t.is_qubit_target
-                        known = sim.peek_x(t.value) != 0
-                        num_determined_measurements += known
-                        sim.do(stim.CircuitInstruction(inst.name, [t.value], args))
-                elif inst.name == 'MY' or inst.name == 'MRY':
-                    args = inst.gate_args_copy()
-                    for t in inst.targets_copy():
-                        assert t.is_qubit_target
-                        known = sim.peek_y(t.value) != 0
-                        num_determined_measurements += known
-                        sim.do(stim.CircuitInstruction(inst.name, [t.value], args))
-                elif inst.name == 'MPP':
-                    raise NotImplementedError(f'{inst=}')
-                else:
-                    sim.do(inst)
+        nonlocal num_determined_measurements, num_detectors_seen, tick
+        seen: Dict[bytes, int] = {}
+        totals_at_start: List[Tuple[int, int, int]] = []
+        for k in range(reps):
+            if extrapolate_loops and reps > 1 and len(seen) < _MAX_LOOP_SNAPSHOTS:
+                key = _unsigned_stabilizer_group_key(sim)
+                totals = (num_determined_measurements, num_detectors_seen, tick)
+                j = seen.get(key)
+                if j is not None:
+                    # Iterations j..k-1 form a cycle returning to the same group, so
+                    # every further pass through the cycle adds the same counts.
+                    period = k - j
+                    cycles = (reps - k) // period
+                    num_determined_measurements += cycles * (totals[0] - totals_at_start[j][0])
+                    num_detectors_seen += cycles * (totals[1] - totals_at_start[j][1])
+                    tick += cycles * (totals[2] - totals_at_start[j][2])
+                    # The leftover partial cycle is simulated.
+                    for _ in range(reps - k - cycles * period):
+                        run_body(block)
+                    return
+                seen[key] = k
+                totals_at_start.append(totals)
+            run_body(block)
+
     run_block(circuit, 1)
     if num_declarations != num_determined_measurements:
         raise ValueError(f"{num_declarations=} != {num_determined_measurements=}")
@@ -1,3 +1,4 @@
+import pytest
 import stim
 
 from midout import gen
@@ -173,3 +174,144 @@ def test_verify_normal_patch():
         SHIFT_COORDS(0, 0, 1)
         TICK
     """)
+
+
+def test_symbolic_loops_matches_recompiled_loops():
+    from midout.circuits._braiding_circuit import make_y_braiding_experiment_chunks
+    from midout.circuits._xz_memory_circuits import make_xz_memory_experiment_chunks
+    from midout.circuits._y_memory_circuit import make_y_memory_experiment_chunks
+    from midout.circuits.steps._folded_y import folded_surface_code_memory_y_chunks
+
+    chunk_lists = [
+        make_y_braiding_experiment_chunks(distance=5, boundary_rounds=3, memory_rounds=7),
+        make_xz_memory_experiment_chunks(distance=4, memory_rounds=10, boundary_rounds=4, basis='X'),
+        make_y_memory_experiment_chunks(distance=5, boundary_rounds=3, memory_rounds=9),
+        folded_surface_code_memory_y_chunks(distance=5, rounds=6),
+    ]
+    for chunks in chunk_lists:
+        expected = gen.compile_chunks_into_circuit(chunks, symbolic_loops=False)
+        actual = gen.compile_chunks_into_circuit(chunks, symbolic_loops=True)
+        assert actual == expected
+        assert gen.compile_chunks_into_circuit(chunks, include_detectors=False).num_measurements == expected.num_measurements
+
+
+def test_relabel_circuit_into():
+    from midout.gen._flow_util import relabel_circuit_into
+
+    circuit = stim.Circuit("""
+        QUBIT_COORDS(0, 0) 0
+        QUBIT_COORDS(0, 1) 1
+        QUBIT_COORDS(0, 2) 2
+        R 0 1 2
+        TICK
+        CX 0 1
+        MPP X0*Z1 Y2
+        M(0.125) 0 1 2
+    """)
+    out = stim.Circuit("H 7")
+    relabel_circuit_into(circuit=circuit, old_q2i={0: 0, 1j: 1, 2j: 2}, new_q2i={0: 5, 1j: 3, 2j: 4}, out=out)
+    assert out == stim.Circuit("""
+        H 7
+        R 5 3 4
+        TICK
+        CX 5 3
+        MPP X5*Z3 Y4
+        M(0.125) 5 3 4
+    """)
+
+    out = stim.Circuit()
+    relabel_circuit_into(circuit=circuit, old_q2i={0: 0, 1j: 1, 2j: 2}, new_q2i={0: 0, 1j: 1, 2j: 2, 3j: 3}, out=out)
+    assert out == circuit[3:]
+
+
+def test_relabel_circuit_into_rejects_unmapped_qubits():
+    from midout.gen._flow_util import relabel_circuit_into
+
+    # Qubit 0 is unmapped but unused, so combiners (whose value is 0) are fine.
+    out = stim.Circuit()
+    relabel_circuit_into(circuit=stim.Circuit("MPP X1*Z2"), old_q2i={1j: 1, 2j: 2}, new_q2i={1j: 4, 2j: 3}, out=out)
+    assert out == stim.Circuit("MPP X4*Z3")
+
+    with pytest.raises(ValueError, match='Qubit index 1 '):
+        relabel_circuit_into(circuit=stim.Circuit("CX 0 1"), old_q2i={0: 0, 2j: 2}, new_q2i={0: 1, 2j: 0}, out=stim.Circuit())
+    with pytest.raises(ValueError, match='Qubit index 7 '):
+        relabel_circuit_into(circuit=stim.Circuit("MPP X0*Y7"), old_q2i={0: 0}, new_q2i={0: 1}, out=stim.Circuit())
+
+
+def test_relabel_circuit_into_keeps_tags():
+    from midout.gen._flow_util import relabel_circuit_into
+
+    circuit = stim.Circuit()
+    circuit.append('QUBIT_COORDS', [0], [0, 0])
+    circuit.append('QUBIT_COORDS', [1], [0, 1])
+    circuit.append(stim.CircuitInstruction('R', [0, 1], tag='reset'))
+    circuit.append(stim.CircuitInstruction('DEPOLARIZE1', [0], [0.125], tag='odd]tag\\with\nescapes'))
+    circuit.append(stim.CircuitInstruction('MPP', [stim.target_x(0), stim.target_combiner(), stim.target_z(1)], tag='a * b'))
+    circuit.append(stim.CircuitInstruction('M', [1]))
+    out = stim.Circuit()
+    relabel_circuit_into(circuit=circuit, old_q2i={0: 0, 1j: 1}, new_q2i={0: 3, 1j: 2}, out=out)
+
+    expected = stim.Circuit()
+    expected.append(stim.CircuitInstruction('R', [3, 2], tag='reset'))
+    expected.append(stim.CircuitInstruction('DEPOLARIZE1', [3], [0.125], tag='odd]tag\\with\nescapes'))
+    expected.append(stim.CircuitInstruction('MPP', [stim.target_x(3), stim.target_combiner(), stim.target_z(2)], tag='a * b'))
+    expected.append(stim.CircuitInstruction('M', [2]))
+    assert out == expected
+    assert [inst.tag for inst in out] == ['reset', 'odd]tag\\with\nescapes', 'a * b', '']
+
+
+def test_verify_circuit_has_all_possible_detectors_extrapolates_loops():
+    circuit = stim.Circuit.generated('surface_code:rotated_memory_x', distance=3, rounds=20)
+    gen.verify_circuit_has_all_possible_detectors(circuit, extrapolate_loops=False)
+    gen.verify_circuit_has_all_possible_detectors(circuit)
+
+    # Too many iterations to simulate one by one.
+    gen.verify_circuit_has_all_possible_detectors(
+        stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=10**9))
+
+    missing_detector = stim.Circuit("""
+        R 0 1
+        REPEAT 1000000 {
+            M 0 1
+            DETECTOR rec[-1]
+        }
+    """)
+    with pytest.raises(ValueError, match='num_declarations=1000000 != num_determined_measurements=2000000'):
+        gen.verify_circuit_has_all_possible_detectors(missing_detector)
+
+    # Nested loops, where qubits 4 and 5 make a cycle of period 2 with iterations left over.
+    for reps in [1, 2, 3, 7, 8]:
+        nested = stim.Circuit(f"""
+            R 0 2 3 4
+            RX 1 5
+            REPEAT 3 {{
+                REPEAT {reps} {{
+                    SWAP 0 1
+                    SWAP 4 5
+                    M 0 3
+                }}
+                RX 1
+            }}
+        """)
+        with pytest.raises(ValueError) as slow:
+            gen.verify_circuit_has_all_possible_detectors(nested, extrapolate_loops=False)
+        with pytest.raises(ValueError) as fast:
+            gen.verify_circuit_has_all_possible_detectors(nested)
+        assert str(fast.value) == str(slow.value)
+
+
+def test_verify_circuit_has_all_possible_detectors_correlated_targets():
+    gen.verify_circuit_has_all_possible_detectors(stim.Circuit("""
+        RX 0
+        R 1
+        CX 0 1
+        M 0 1
+        DETECTOR rec[-1] rec[-2]
+    """))
+    with pytest.raises(ValueError):
+        gen.verify_circuit_has_all_possible_detectors(stim.Circuit("""
+            RX 0
+            R 1
+            CX 0 1
+            M 0 1
+        """))
@@ -6,6 +6,7 @@ import stim
 
 from midout.gen._flow import Flow
 from midout.gen._chunk import Chunk
+from midout.gen._trace import traced
 
 
 FLIP_REV_SET = {
@@ -53,39 +54,69 @@ REV_DICT = {
     "TICK": "TICK",
 }
 
+def _pack_flow_bits(bits: np.ndarray) -> np.ndarray:
+    """Packs a (rows, flows) boolean array into (rows, words) uint64 words, 64 flows per word."""
+    rows, num_flows = bits.shape
+    num_words = (num_flows + 63) // 64
+    packed = np.packbits(bits, axis=1, bitorder='little')
+    padded = np.zeros(shape=(rows, num_words * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view('<u8').astype(np.uint64)
+
+
+def _unpack_flow_bits(words: np.ndarray, num_flows: int) -> np.ndarray:
+    """Inverse of `_pack_flow_bits` for a single row of words."""
+    return np.unpackbits(words.astype('<u8').view(np.uint8), bitorder='little')[:num_flows].astype(np.bool_)
+
+
 class FlowStabilizerVerifier:
+    """Checks that a circuit implements a set of flows, by propagating the flows backwards.
+
+    The Pauli terms of every flow are tracked simultaneously, bit-packed so that bit
+    `k % 64` of word `k // 64` in `xs[q]` (`zs[q]`) is the X (Z) component of flow `k` on
+    qubit `q`. Each instruction updates all of its targets with whole-row NumPy operations.
+    """
+
     def __init__(self, next_measurement: int, q2i: Dict[complex, int], flows: Iterable[Flow]):
         self.flows: Tuple[Flow, ...] = tuple(flows)
         self.q2i = q2i
-        self.i2m = collections.defaultdict(list)
         self.measurement_to_can_be_destructive: Set[int] = set()
         self.reset_index = 0
         self.next_measurement = next_measurement
         self.reset_to_flow_indices: DefaultDict[int, List[int]] = collections.defaultdict(list)
         num_qubits = max(q2i.values()) + 1
-        self.xs = np.zeros(shape=(num_qubits, len(self.flows)), dtype=np.bool8)
-        self.zs = np.zeros(shape=(num_qubits, len(self.flows)), dtype=np.bool8)
+        num_measurements = max(
+            [next_measurement + 1] + [m + 1 for flow in self.flows for m in flow.measurement_indices]
+        )
+
+        xs = np.zeros(shape=(num_qubits, len(self.flows)), dtype=np.bool_)
+        zs = np.zeros(shape=(num_qubits, len(self.flows)), dtype=np.bool_)
+        measured = np.zeros(shape=(num_measurements, len(self.flows)), dtype=np.bool_)
         for k in range(len(self.flows)):
             flow: Flow = self.flows[k]
             for m in flow.measurement_indices:
-                self.i2m[m].append(k)
+                measured[m, k] ^= True
             for q, p in flow.end.qubits.items():
                 assert p == 'X' or p == 'Y' or p == 'Z'
-                self.xs[q2i[q], k] = p == 'X' or p == 'Y'
-                self.zs[q2i[q], k] = p == 'Z' or p == 'Y'
+                xs[q2i[q], k] = p == 'X' or p == 'Y'
+                zs[q2i[q], k] = p == 'Z' or p == 'Y'
+        self.xs = _pack_flow_bits(xs)
+        self.zs = _pack_flow_bits(zs)
+        self.measurement_masks = _pack_flow_bits(measured)
 
-    def fail_if(self, mask: np.ndarray, msg: str):
-        if np.any(mask):
-            for k in range(len(mask)):
-                if mask[k]:
-                    self.fail(k, msg)
+    def fail_if(self, masks: np.ndarray, msg: str):
+        """Fails on the first flow set in the first non-zero row of packed masks."""
+        for row in np.atleast_2d(masks):
+            if np.any(row):
+                self.fail(int(np.flatnonzero(_unpack_flow_bits(row, len(self.flows)))[0]), msg)
 
     def pauli_terms(self, k: int) -> str:
         i2q = {i: q for q, i in self.q2i.items()}
+        w, b = divmod(k, 64)
         terms = []
         for q in range(self.xs.shape[0]):
-            x = self.xs[q, k]
-            z = self.zs[q, k]
+            x = int(self.xs[q, w] >> np.uint64(b)) & 1
+            z = int(self.zs[q, w] >> np.uint64(b)) & 1
             if x or z:
                 terms.append('_XZY'[x + z*2] + repr(i2q[q]))
         return '*'.join(terms)
@@ -94,17 +125,20 @@ class FlowStabilizerVerifier:
         raise ValueError(f"{msg} for flow {self.flows[k]} with current value {self.pauli_terms(k)}")
 
     def finish(self):
+        xs = np.zeros(shape=(self.xs.shape[0], len(self.flows)), dtype=np.bool_)
+        zs = np.zeros(shape=(self.xs.shape[0], len(self.flows)), dtype=np.bool_)
         for k in range(len(self.flows)):
             for q, p in self.flows[k].start.qubits.items():
                 assert p == 'X' or p == 'Y' or p == 'Z'
-                self.xs[self.q2i[q], k] ^= p == 'X' or p == 'Y'
-                self.zs[self.q2i[q], k] ^= p == 'Z' or p == 'Y'
-        if np.any(self.xs) or np.any(self.zs):
-            for k in range(len(self.flows)):
-                if np.any(self.xs[:, k]) or np.any(self.zs[:, k]):
-                    self.fail(k, "Mismatch at start")
+                xs[self.q2i[q], k] = p == 'X' or p == 'Y'
+                zs[self.q2i[q], k] = p == 'Z' or p == 'Y'
+        self.xs ^= _pack_flow_bits(xs)
+        self.zs ^= _pack_flow_bits(zs)
+        mismatched = np.bitwise_or.reduce(self.xs | self.zs, axis=0)
+        self.fail_if(mismatched, "Mismatch at start")
 
     @staticmethod
+    @traced('FlowStabilizerVerifier.verify')
     def verify(chunk: 'Chunk') -> 'FlowStabilizerVerifier':
         verifier = FlowStabilizerVerifier(
             q2i=chunk.q2i,
@@ -184,214 +218,165 @@ class FlowStabilizerVerifier:
         )
 
     def rev_apply(self, inst: stim.CircuitInstruction):
-        if inst.name == 'H' or inst.name == 'SQRT_Y' or inst.name == "SQRT_Y_DAG":
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                tmp = self.xs[q].copy()
-                self.xs[q, :] = self.zs[q]
-                self.zs[q, :] = tmp
-        elif inst.name == 'I' or inst.name == 'Z' or inst.name == 'X' or inst.name == 'Y':
-            pass
-        elif inst.name == 'S' or inst.name == 'S_DAG' or inst.name == 'H_XY':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.zs[q, :] ^= self.xs[q]
-        elif inst.name == 'SQRT_X' or inst.name == 'SQRT_X_DAG' or inst.name == 'H_YZ':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.xs[q, :] ^= self.zs[q]
-        elif inst.name == 'C_XYZ':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.zs[q, :] ^= self.xs[q]
-                self.xs[q, :] ^= self.zs[q]
-        elif inst.name == 'C_ZYX':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.xs[q, :] ^= self.zs[q]
-                self.zs[q, :] ^= self.xs[q]
-        elif inst.name == 'RY':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.fail_if(self.xs[q] ^ self.zs[q], "Anticommuted with RY")
-                for k in range(len(self.flows)):
-                    if self.xs[q, k] and self.zs[q, k]:
-                        self.reset_to_flow_indices[self.reset_index].append(k)
-                self.reset_index += 1
-                self.xs[q, :] = 0
-                self.zs[q, :] = 0
-        elif inst.name == 'RX':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.fail_if(self.zs[q], "Anticommuted with RX")
-                for k in range(len(self.flows)):
-                    if self.xs[q, k]:
-                        self.reset_to_flow_indices[self.reset_index].append(k)
-                self.reset_index += 1
-                self.xs[q, :] = 0
-        elif inst.name == 'R':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                self.fail_if(self.xs[q], "Anticommuted with R")
-                for k in range(len(self.flows)):
-                    if self.zs[q, k]:
-                        self.reset_to_flow_indices[self.reset_index].append(k)
-                self.reset_index += 1
-                self.zs[q, :] = 0
-        elif inst.name == 'M':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                m = self.next_measurement
-                self.next_measurement -= 1
-                self.fail_if(self.xs[q], "Anticommuted with M")
-                if not np.any(self.xs[q, :]) and not np.any(self.zs[q, :]):
-                    self.measurement_to_can_be_destructive.add(m)
-                for s in self.i2m[m]:
-                    self.zs[q, s] ^= True
-        elif inst.name == 'MY':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                m = self.next_measurement
-                self.next_measurement -= 1
-                self.fail_if(self.xs[q] ^ self.zs[q], "Anticommuted with M")
-                if not np.any(self.xs[q, :]) and not np.any(self.zs[q, :]):
-                    self.measurement_to_can_be_destructive.add(m)
-                for s in self.i2m[m]:
-                    self.xs[q, s] ^= True
-                    self.zs[q, s] ^= True
-        elif inst.name == 'MX':
-            for t in inst.targets_copy()[::-1]:
-                assert t.is_qubit_target
-                q = t.value
-                m = self.next_measurement
-                self.next_measurement -= 1
-                self.fail_if(self.zs[q], "Anticommuted with MX")
-                if not np.any(self.xs[q, :]) and not np.any(self.zs[q, :]):
-                    self.measurement_to_can_be_destructive.add(m)
-                for s in self.i2m[m]:
-                    self.xs[q, s] ^= True
-        elif inst.name == 'XCZ':
-            ts = inst.targets_copy()
-            for k in range(0, len(ts), 2)[::-1]:
-                t1 = ts[k]
-                t2 = ts[k + 1]
-                assert t1.is_qubit_target
-                assert t2.is_qubit_target
-                q1 = t1.value
-                q2 = t2.value
-                self.xs[q1] ^= self.xs[q2]
-                self.zs[q2] ^= self.zs[q1]
-        elif inst.name == 'CX':
-            ts = inst.targets_copy()
-            for k in range(0, len(ts), 2)[::-1]:
-                t1 = ts[k]
-                t2 = ts[k + 1]
-                assert t1.is_qubit_target
-                assert t2.is_qubit_target
-                q1 = t1.value
-                q2 = t2.value
-                self.xs[q2] ^= self.xs[q1]
-                self.zs[q1] ^= self.zs[q2]
-        elif inst.name == 'CZ':
-            ts = inst.targets_copy()
-            for k in range(0, len(ts), 2)[::-1]:
-                t1 = ts[k]
-                t2 = ts[k + 1]
-                assert t1.is_qubit_target
-                assert t2.is_qubit_target
-                q1 = t1.value
-                q2 = t2.value
-                self.zs[q2] ^= self.xs[q1]
-                self.zs[q1] ^= self.xs[q2]
-        elif inst.name == 'CY' or inst.name == 'YCZ':
-            ts = inst.targets_copy()
-            for k in range(0, len(ts), 2)[::-1]:
-                t1 = ts[k]
-                t2 = ts[k + 1]
-                if inst.name == 'YCZ':
-                    t1, t2 = t2, t1
-                assert t1.is_qubit_target
-                assert t2.is_qubit_target
-                q1 = t1.value
-                q2 = t2.value
-                yt = self.xs[q2] ^ self.zs[q2]
-                self.zs[q1] ^= yt
-                self.zs[q2] ^= self.xs[q1]
-                self.xs[q2] ^= self.xs[q1]
-        elif inst.name == 'XCY' or inst.name == 'YCX':
-            ts = inst.targets_copy()
-            for k in range(0, len(ts), 2)[::-1]:
-                t1 = ts[k]
-                t2 = ts[k + 1]
-                if inst.name == 'YCX':
-                    t1, t2 = t2, t1
-                assert t1.is_qubit_target
-                assert t2.is_qubit_target
-                q1 = t1.value
-                q2 = t2.value
-                yt = self.xs[q2] ^ self.zs[q2]
-                self.xs[q1] ^= yt
-                self.zs[q2] ^= self.zs[q1]
-                self.xs[q2] ^= self.zs[q1]
-        elif inst.name == 'MPP':
-            targets = inst.targets_copy()[::-1]
-            start = 0
-            while start < len(targets):
-                end = start + 1
-                while end < len(targets) and targets[end].is_combiner:
-                    end += 2
-
-                x_mask = np.zeros(shape=self.xs.shape[0], dtype=np.bool8)
-                z_mask = np.zeros(shape=self.xs.shape[0], dtype=np.bool8)
-                for t in targets[start:end:2]:
-                    if t.is_x_target:
-                        x_mask[t.value] ^= True
-                    elif t.is_y_target:
-                        x_mask[t.value] ^= True
-                        z_mask[t.value] ^= True
-                    elif t.is_z_target:
-                        z_mask[t.value] ^= True
-                    else:
-                        raise NotImplementedError(f'{inst=}')
-
-                for k in range(self.xs.shape[1]):
-                    x_combos = np.sum(np.bitwise_and(self.xs[:, k], z_mask), axis=0)
-                    z_combos = np.sum(np.bitwise_and(self.zs[:, k], x_mask), axis=0)
-                    if np.any((x_combos + z_combos) & 1):
-                        raise ValueError("Anticommuted with MPP")
-                m = self.next_measurement
-                self.next_measurement -= 1
-                for s in self.i2m[m]:
-                    self.zs[:, s] ^= z_mask
-                    self.xs[:, s] ^= x_mask
-
-                start = end
-
-        elif inst.name == 'TICK':
-            pass
-            # for x in range(-4, 40):
-            #     for y in range(-4, 40):
-            #         c = y*0.5 + x*0.5j
-            #         v = ' '
-            #         if c in self.q2i:
-            #             v = '.'
-            #             q = self.q2i[c]
-            #             r = self.xs[q, 0] + self.zs[q, 0] * 2
-            #             if r:
-            #                 v = '_XZY'[r]
-            #         print(v, end='')
-            #     print()
-        elif inst.name == 'QUBIT_COORDS':
-            pass
-        else:
+        name = inst.name
+        if name in ['TICK', 'QUBIT_COORDS', 'I', 'X', 'Y', 'Z']:
+            return
+        if name == 'MPP':
+            self._rev_apply_mpp(inst)
+            return
+
+        targets = inst.targets_copy()
+        for t in targets:
+            if not t.is_qubit_target:
+                raise NotImplementedError(f'{inst=}')
+        qs = [t.value for t in targets]
+        arity = 2 if name in _REV_APPLY_2Q else 1
+        if name not in _REV_APPLY_1Q and name not in _REV_APPLY_2Q:
             raise NotImplementedError(f'{inst=}')
+
+        groups = [qs[k:k + arity] for k in range(0, len(qs), arity)][::-1]
+        if len(set(qs)) == len(qs):
+            # Disjoint targets don't interact, so they can all be updated at once.
+            self._rev_apply_groups(name, np.array(groups, dtype=np.intp).reshape(len(groups), arity))
+        else:
+            for group in groups:
+                self._rev_apply_groups(name, np.array([group], dtype=np.intp))
+
+    def _rev_apply_groups(self, name: str, groups: np.ndarray):
+        """Applies an instruction in reverse to (reversed-order) groups of distinct qubits."""
+        xs = self.xs
+        zs = self.zs
+        if name in _REV_APPLY_2Q:
+            q1 = groups[:, 0]
+            q2 = groups[:, 1]
+            if name in ['YCZ', 'YCX']:
+                q1, q2 = q2, q1
+            if name == 'XCZ':
+                xs[q1] ^= xs[q2]
+                zs[q2] ^= zs[q1]
+            elif name == 'CX':
+                xs[q2] ^= xs[q1]
+                zs[q1] ^= zs[q2]
+            elif name == 'CZ':
+                zs[q2] ^= xs[q1]
+                zs[q1] ^= xs[q2]
+            elif name == 'CY' or name == 'YCZ':
+                yt = xs[q2] ^ zs[q2]
+                zs[q1] ^= yt
+                zs[q2] ^= xs[q1]
+                xs[q2] ^= xs[q1]
+            elif name == 'XCY' or name == 'YCX':
+                yt = xs[q2] ^ zs[q2]
+                xs[q1] ^= yt
+                zs[q2] ^= zs[q1]
+                xs[q2] ^= zs[q1]
+            else:
+                raise NotImplementedError(f'{name=}')
+            return
+
+        q = groups[:, 0]
+        if name == 'H' or name == 'SQRT_Y' or name == "SQRT_Y_DAG":
+            tmp = xs[q]
+            xs[q] = zs[q]
+            zs[q] = tmp
+        elif name == 'S' or name == 'S_DAG' or name == 'H_XY':
+            zs[q] ^= xs[q]
+        elif name == 'SQRT_X' or name == 'SQRT_X_DAG' or name == 'H_YZ':
+            xs[q] ^= zs[q]
+        elif name == 'C_XYZ':
+            zs[q] ^= xs[q]
+            xs[q] ^= zs[q]
+        elif name == 'C_ZYX':
+            xs[q] ^= zs[q]
+            zs[q] ^= xs[q]
+        elif name in ['R', 'RX', 'RY']:
+            if name == 'R':
+                self._fail_if_any(xs[q], name, groups, "Anticommuted with R")
+                reset_flows = zs[q]
+            elif name == 'RX':
+                self._fail_if_any(zs[q], name, groups, "Anticommuted with RX")
+                reset_flows = xs[q]
+            else:
+                self._fail_if_any(xs[q] ^ zs[q], name, groups, "Anticommuted with RY")
+                reset_flows = xs[q] & zs[q]
+            if np.any(reset_flows):
+                bits = np.unpackbits(reset_flows.astype('<u8').view(np.uint8), axis=1, bitorder='little')
+                for j, k in zip(*np.nonzero(bits[:, :len(self.flows)])):
+                    self.reset_to_flow_indices[self.reset_index + int(j)].append(int(k))
+            self.reset_index += len(q)
+            if name != 'RX':
+                zs[q] = 0
+            if name != 'R':
+                xs[q] = 0
+        elif name in ['M', 'MX', 'MY']:
+            if name == 'M':
+                self._fail_if_any(xs[q], name, groups, "Anticommuted with M")
+            elif name == 'MX':
+                self._fail_if_any(zs[q], name, groups, "Anticommuted with MX")
+            else:
+                self._fail_if_any(xs[q] ^ zs[q], name, groups, "Anticommuted with M")
+            ms = self.next_measurement - np.arange(len(q))
+            self.next_measurement -= len(q)
+            untouched = ~np.any(xs[q] | zs[q], axis=1)
+            self.measurement_to_can_be_destructive.update(int(m) for m in ms[untouched])
+            masks = self.measurement_masks[ms]
+            if name != 'MX':
+                zs[q] ^= masks
+            if name != 'M':
+                xs[q] ^= masks
+        else:
+            raise NotImplementedError(f'{name=}')
+
+    def _fail_if_any(self, masks: np.ndarray, name: str, groups: np.ndarray, msg: str):
+        if not np.any(masks):
+            return
+        if len(groups) > 1:
+            # Replay target by target, so the failure reports the same state as sequential application.
+            for k in range(len(groups)):
+                self._rev_apply_groups(name, groups[k:k + 1])
+        self.fail_if(masks, msg)
+
+    def _rev_apply_mpp(self, inst: stim.CircuitInstruction):
+        targets = inst.targets_copy()[::-1]
+        num_qubits = self.xs.shape[0]
+        start = 0
+        while start < len(targets):
+            end = start + 1
+            while end < len(targets) and targets[end].is_combiner:
+                end += 2
+
+            x_mask = np.zeros(shape=num_qubits, dtype=np.bool_)
+            z_mask = np.zeros(shape=num_qubits, dtype=np.bool_)
+            for t in targets[start:end:2]:
+                if t.is_x_target:
+                    x_mask[t.value] ^= True
+                elif t.is_y_target:
+                    x_mask[t.value] ^= True
+                    z_mask[t.value] ^= True
+                elif t.is_z_target:
+                    z_mask[t.value] ^= True
+                else:
+                    raise NotImplementedError(f'{inst=}')
+            xq = np.flatnonzero(x_mask)
+            zq = np.flatnonzero(z_mask)
+
+            anticommutes = np.bitwise_xor.reduce(self.xs[zq], axis=0) ^ np.bitwise_xor.reduce(self.zs[xq], axis=0)
+            if np.any(anticommutes):
+                raise ValueError("Anticommuted with MPP")
+            mask = self.measurement_masks[self.next_measurement]
+            self.next_measurement -= 1
+            self.zs[zq] ^= mask
+            self.xs[xq] ^= mask
+
+            start = end
+
+
+_REV_APPLY_1Q = {
+    'H', 'SQRT_Y', 'SQRT_Y_DAG',
+    'S', 'S_DAG', 'H_XY',
+    'SQRT_X', 'SQRT_X_DAG', 'H_YZ',
+    'C_XYZ', 'C_ZYX',
+    'R', 'RX', 'RY',
+    'M', 'MX', 'MY',
+}
+_REV_APPLY_2Q = {'XCZ', 'CX', 'CZ', 'CY', 'YCZ', 'XCY', 'YCX'}
@@ -384,3 +384,35 @@ def test_reset_analysis():
         CX 2 0
         M 4 3 2 1 0
     """)
+
+
+def test_verify_many_flows_across_packed_words():
+    # More than 64 flows, so the flow bits span multiple packed words, with a
+    # gate acting on the same qubit twice in one instruction.
+    n = 70
+    flows = []
+    for k in range(n):
+        q = complex(k, 0)
+        flows.append(gen.Flow(
+            center=q,
+            start=gen.PauliString({q: 'X'}),
+            end=gen.PauliString({q: 'X'}),
+        ))
+    chunk = gen.Chunk(
+        circuit=stim.Circuit(f"""
+            H {' '.join(str(k) for k in range(n))} 0 0
+            H {' '.join(str(k) for k in range(n))}
+        """),
+        q2i={complex(k, 0): k for k in range(n)},
+        flows=flows,
+    )
+    chunk.verify()
+
+    flows[-1] = gen.Flow(
+        center=complex(n - 1, 0),
+        start=gen.PauliString({complex(n - 1, 0): 'X'}),
+        end=gen.PauliString({complex(n - 1, 0): 'Z'}),
+    )
+    chunk = gen.Chunk(circuit=chunk.circuit, q2i=chunk.q2i, flows=flows)
+    with pytest.raises(ValueError):
+        chunk.verify()
@@ -1,11 +1,13 @@
+import bisect
 import collections
 import dataclasses
-from typing import List, TypeVar, Dict, Type, Optional, AbstractSet, cast, Set
+from typing import List, TypeVar, Dict, Type, Optional, AbstractSet, cast, Set, Sequence, DefaultDict
 
 import numpy as np
-import sinter
 import stim
 
+from midout.gen._trace import trace_span, traced
+
 R_XYZ = 0
 R_XZY = 1
 R_YXZ = 2
@@ -46,6 +48,27 @@ ORIENTATION_MULTIPLICATION_TABLE = np.array([
 ], dtype=np.uint8)
 
 
+def _append_lines(out: stim.Circuit, lines: List[str]) -> None:
+    """Appends instructions given as stim circuit text.
+
+    Parsing text is much faster than appending python target lists one
+    instruction at a time.
+    """
+    if lines:
+        out += stim.Circuit('\n'.join(lines))
+
+
+def _pauli_target_text(t: stim.GateTarget) -> str:
+    prefix = '!' if t.is_inverted_result_target else ''
+    if t.is_x_target:
+        return f'{prefix}X{t.value}'
+    if t.is_y_target:
+        return f'{prefix}Y{t.value}'
+    if t.is_z_target:
+        return f'{prefix}Z{t.value}'
+    raise NotImplementedError(f'{t=}')
+
+
 class Layer:
     def copy(self) -> 'Layer':
         raise NotImplementedError()
@@ -110,8 +133,7 @@ class ResetLayer(Layer):
         ]
 
     def append_into_stim_circuit(self, out: stim.Circuit) -> None:
-        for t, b in zip(self.targets, self.bases):
-            out.append('R' + b, [t])
+        _append_lines(out, [f'R{b} {t}' for t, b in zip(self.targets, self.bases)])
 
 
 @dataclasses.dataclass
@@ -134,8 +156,7 @@ class MeasureLayer(Layer):
         ]
 
     def append_into_stim_circuit(self, out: stim.Circuit) -> None:
-        for t, b in zip(self.targets, self.bases):
-            out.append('M' + b, [t])
+        _append_lines(out, [f'M{b} {t}' for t, b in zip(self.targets, self.bases)])
 
 
 @dataclasses.dataclass
@@ -170,13 +191,8 @@ class MppLayer(Layer):
         ]
 
     def append_into_stim_circuit(self, out: stim.Circuit) -> None:
-        flat_targets = []
-        for group in self.targets:
-            for t in group:
-                flat_targets.append(t)
-                flat_targets.append(stim.target_combiner())
-            flat_targets.pop()
-        out.append('MPP', flat_targets)
+        products = ['*'.join(_pauli_target_text(t) for t in group) for group in self.targets]
+        _append_lines(out, ['MPP ' + ' '.join(products)])
 
 
 @dataclasses.dataclass
@@ -227,9 +243,11 @@ class InteractLayer(Layer):
             if gate in ['XCX', 'YCY', 'ZCZ']:
                 t1, t2 = sorted([t1, t2])
             groups[gate].append((t1, t2))
+        lines = []
         for gate in sorted(groups.keys()):
-            for pair in sorted(groups[gate]):
-                out.append(gate, pair)
+            for t1, t2 in sorted(groups[gate]):
+                lines.append(f'{gate} {t1} {t2}')
+        _append_lines(out, lines)
 
     def optimized(self, next_layer: Optional['Layer']) -> List[Optional['Layer']]:
         if isinstance(next_layer, SwapLayer):
@@ -326,10 +344,12 @@ class RotationLayer(Layer):
         return RotationLayer(rotations={q: R_YZX if r == R_ZXY else R_ZXY if r == R_YZX else r for q, r in self.rotations.items()})
 
     def append_into_stim_circuit(self, out: stim.Circuit) -> None:
-        v = sinter.group_by(self.rotations.items(), key=lambda e: e[1])
-        for r, items in sorted(v.items(), key=lambda e: ORIENTATIONS[e[0]]):
+        v = collections.defaultdict(list)
+        for q, r in self.rotations.items():
             if r:
-                out.append(ORIENTATIONS[r], sorted(q for q, _ in items))
+                v[r].append(q)
+        for r, qs in sorted(v.items(), key=lambda e: ORIENTATIONS[e[0]]):
+            _append_lines(out, [ORIENTATIONS[r] + ' ' + ' '.join(str(q) for q in sorted(qs))])
 
     def prepend_rotation(self, rotation_index: int, target: int):
         r1 = self.rotations.setdefault(target, R_XYZ)
@@ -382,8 +402,7 @@ class SwapLayer(Layer):
             t2 = self.targets2[k]
             t1, t2 = sorted([t1, t2])
             pairs.append((t1, t2))
-        for pair in sorted(pairs):
-            out.append("SWAP", pair)
+        _append_lines(out, [f'SWAP {t1} {t2}' for t1, t2 in sorted(pairs)])
 
     def optimized(self, next_layer: Optional['Layer']) -> List[Optional['Layer']]:
         if isinstance(next_layer, InteractLayer):
@@ -411,8 +430,7 @@ class ISwapLayer(Layer):
             t2 = self.targets2[k]
             t1, t2 = sorted([t1, t2])
             pairs.append((t1, t2))
-        for pair in sorted(pairs):
-            out.append("ISWAP", pair)
+        _append_lines(out, [f'ISWAP {t1} {t2}' for t1, t2 in sorted(pairs)])
 
     def optimized(self, next_layer: Optional['Layer']) -> List[Optional['Layer']]:
         return [self, next_layer]
@@ -470,6 +488,103 @@ class EmptyLayer(Layer):
         return True
 
 
+class _LayerIndex:
+    """Sorted per-qubit positions of the layers touching each qubit.
+
+    Lets the rotation folding passes find the previous/next layer touching a
+    qubit (or the previous/next rotation layer) by bisection instead of walking
+    over layers one by one, and is updated incrementally as the passes move
+    rotations between layers.
+    """
+
+    def __init__(self, layers: Sequence[Layer], touched: Sequence[AbstractSet[int]]):
+        # Layers where the qubit is in the layer's touched set.
+        self.touching: DefaultDict[int, List[int]] = collections.defaultdict(list)
+        # Rotation layers with an entry (possibly the identity) for the qubit.
+        self.rotation_entries: DefaultDict[int, List[int]] = collections.defaultdict(list)
+        # Rotation layers that aren't vacuous, and how many non-identity rotations they have.
+        self.rotation_layers: List[int] = []
+        self.rotation_counts: Dict[int, int] = {}
+        for k, (layer, qs) in enumerate(zip(layers, touched)):
+            for q in qs:
+                self.touching[q].append(k)
+            if isinstance(layer, RotationLayer):
+                for q in layer.rotations:
+                    self.rotation_entries[q].append(k)
+                self.rotation_counts[k] = len(qs)
+                if qs:
+                    self.rotation_layers.append(k)
+
+    @staticmethod
+    def _set(positions: List[int], k: int, present: bool) -> bool:
+        """Adds or removes k from the sorted positions, returning whether anything changed."""
+        i = bisect.bisect_left(positions, k)
+        found = i < len(positions) and positions[i] == k
+        if present and not found:
+            positions.insert(i, k)
+            return True
+        if not present and found:
+            del positions[i]
+            return True
+        return False
+
+    def next_touching(self, qubit: int, k: int) -> Optional[int]:
+        """Returns the first layer after layer k that touches the qubit."""
+        positions = self.touching.get(qubit, ())
+        i = bisect.bisect_right(positions, k)
+        return positions[i] if i < len(positions) else None
+
+    def reachable_rotation_layer(self, qubit: int, k: int, delta: int) -> Optional[int]:
+        """Returns the nearest non-vacuous rotation layer before (delta=-1) or after (delta=+1) layer k.
+
+        Returns None if a layer touching the qubit is strictly in the way.
+        """
+        positions = self.touching.get(qubit, ())
+        if delta < 0:
+            i = bisect.bisect_left(self.rotation_layers, k)
+            if i == 0:
+                return None
+            rot = self.rotation_layers[i - 1]
+            j = bisect.bisect_left(positions, k)
+            if j > 0 and positions[j - 1] > rot:
+                return None
+        else:
+            i = bisect.bisect_right(self.rotation_layers, k)
+            if i == len(self.rotation_layers):
+                return None
+            rot = self.rotation_layers[i]
+            j = bisect.bisect_right(positions, k)
+            if j < len(positions) and positions[j] < rot:
+                return None
+        return rot
+
+    def reachable_earlier_rotation_entry(self, qubit: int, k: int) -> Optional[int]:
+        """Returns the nearest rotation layer before layer k with an entry for the qubit.
+
+        Returns None if a layer touching the qubit is strictly in the way.
+        """
+        entries = self.rotation_entries.get(qubit)
+        if not entries:
+            return None
+        i = bisect.bisect_left(entries, k)
+        if i == 0:
+            return None
+        rot = entries[i - 1]
+        positions = self.touching.get(qubit, ())
+        j = bisect.bisect_left(positions, k)
+        if j > 0 and positions[j - 1] > rot:
+            return None
+        return rot
+
+    def update_rotation_layer(self, k: int, layer: 'RotationLayer', qubit: int) -> None:
+        """Records that the entry for `qubit` in the rotation layer at `k` changed."""
+        rotated = bool(layer.rotations.get(qubit))
+        if self._set(self.touching[qubit], k, rotated):
+            self.rotation_counts[k] += 1 if rotated else -1
+            self._set(self.rotation_layers, k, self.rotation_counts[k] > 0)
+        self._set(self.rotation_entries[qubit], k, qubit in layer.rotations)
+
+
 TLayer = TypeVar('TLayer')
 
 
@@ -694,6 +809,7 @@ class LayerCircuit:
             resets.append(loop_boundary_resets & (set() if len(resets) == 0 else resets[0]))
         new_layers = [layer.copy() for layer in self.layers]
 
+        index = _LayerIndex(self.layers, sets)
         for k, layer in enumerate(new_layers):
             if isinstance(layer, LoopLayer):
                 layer.body = layer.body.with_rotations_before_resets_removed(loop_boundary_resets=self._resets_at_layer(k + 1, end_resets=all_touched))
@@ -701,13 +817,11 @@ class LayerCircuit:
                 drops = []
                 for q, r in layer.rotations.items():
                     if r:
-                        k2 = k + 1
-                        while k2 < len(sets):
-                            if q in sets[k2]:
-                                if q in resets[k2]:
-                                    drops.append(q)
-                                break
-                            k2 += 1
+                        k2 = index.next_touching(q, k)
+                        if k2 is None:
+                            k2 = len(self.layers)
+                        if q in resets[k2]:
+                            drops.append(q)
                 for q in drops:
                     del layer.rotations[q]
 
@@ -715,18 +829,9 @@ class LayerCircuit:
 
 
     def with_squashed_rotations(self) -> 'LayerCircuit':
-        sets = [layer.touched() for layer in self.layers]
-        def scan(qubit: int, start_layer: int, delta: int) -> Optional[int]:
-            while True:
-                start_layer += delta
-                if start_layer < 0 or start_layer >= len(sets):
-                    return None
-                if isinstance(new_layers[start_layer], RotationLayer) and not new_layers[start_layer].is_vacuous():
-                    return start_layer
-                if qubit in sets[start_layer]:
-                    return None
-
         new_layers = [layer.copy() for layer in self.layers]
+        index = _LayerIndex(new_layers, [layer.touched() for layer in new_layers])
+
         cur_layer_index = 0
         while cur_layer_index < len(new_layers):
             layer = new_layers[cur_layer_index]
@@ -735,9 +840,9 @@ class LayerCircuit:
                 for q, r in layer.rotations.items():
                     if not r:
                         continue
-                    new_layer_index = scan(q, cur_layer_index, -1)
+                    new_layer_index = index.reachable_rotation_layer(q, cur_layer_index, -1)
                     if new_layer_index is None:
-                        new_layer_index = scan(q, cur_layer_index, +1)
+                        new_layer_index = index.reachable_rotation_layer(q, cur_layer_index, +1)
                     if new_layer_index is not None:
                         rewrites[q] = new_layer_index
                     else:
@@ -752,31 +857,20 @@ class LayerCircuit:
                             new_layer.prepend_rotation(r, q)
                         else:
                             new_layer.append_rotation(r, q)
-                        if new_layer.rotations.get(q):
-                            sets[new_layer_index].add(q)
-                        elif q in sets[new_layer_index]:
-                            sets[new_layer_index].remove(q)
+                        index.update_rotation_layer(new_layer_index, new_layer, q)
+                    cleared = list(layer.rotations)
                     layer.rotations.clear()
-                    sets[cur_layer_index].clear()
+                    for q in cleared:
+                        index.update_rotation_layer(cur_layer_index, layer, q)
             elif isinstance(layer, LoopLayer):
                 layer.body = layer.body.with_squashed_rotations()
             cur_layer_index += 1
         return LayerCircuit([layer for layer in new_layers if not layer.is_vacuous()])
 
     def with_rotations_merged_earlier(self) -> 'LayerCircuit':
-        sets = [layer.touched() for layer in self.layers]
-        def scan(qubit: int, start_layer: int) -> Optional[int]:
-            while True:
-                start_layer -= 1
-                if start_layer < 0:
-                    return None
-                l = new_layers[start_layer]
-                if isinstance(l, RotationLayer) and qubit in l.rotations:
-                    return start_layer
-                if qubit in sets[start_layer]:
-                    return None
-
         new_layers = [layer.copy() for layer in self.layers]
+        index = _LayerIndex(new_layers, [layer.touched() for layer in new_layers])
+
         cur_layer_index = 0
         while cur_layer_index < len(new_layers):
             layer = new_layers[cur_layer_index]
@@ -785,17 +879,14 @@ class LayerCircuit:
                 for q, r in layer.rotations.items():
                     if not r:
                         continue
-                    v = scan(q, cur_layer_index)
+                    v = index.reachable_earlier_rotation_entry(q, cur_layer_index)
                     if v is not None:
                         rewrites[q] = v
                 for q, dst in rewrites.items():
                     new_layer: RotationLayer = cast(RotationLayer, new_layers[dst])
                     new_layer.append_rotation(layer.rotations.pop(q), q)
-                    sets[cur_layer_index].remove(q)
-                    if new_layer.rotations.get(q):
-                        sets[dst].add(q)
-                    elif q in sets[dst]:
-                        sets[dst].remove(q)
+                    index.update_rotation_layer(cur_layer_index, layer, q)
+                    index.update_rotation_layer(dst, new_layer, q)
             elif isinstance(layer, LoopLayer):
                 layer.body = layer.body.with_rotations_merged_earlier()
             cur_layer_index += 1
@@ -829,13 +920,22 @@ class LayerCircuit:
         return circuit
 
 
+@traced()
 def to_z_basis_interaction_circuit(circuit: stim.Circuit) -> stim.Circuit:
-    c = LayerCircuit.from_stim_circuit(circuit)
-    c = c.with_merged_layers()
-    c = c.to_z_basis()
-    c = c.with_merged_layers()
-    c = c.with_squashed_rotations()
-    c = c.with_rotations_merged_earlier()
-    c = c.with_rotations_before_resets_removed()
+    with trace_span('LayerCircuit.from_stim_circuit'):
+        c = LayerCircuit.from_stim_circuit(circuit)
+    with trace_span('LayerCircuit.with_merged_layers'):
+        c = c.with_merged_layers()
+    with trace_span('LayerCircuit.to_z_basis'):
+        c = c.to_z_basis()
+    with trace_span('LayerCircuit.with_merged_layers'):
+        c = c.with_merged_layers()
+    with trace_span('LayerCircuit.with_squashed_rotations'):
+        c = c.with_squashed_rotations()
+    with trace_span('LayerCircuit.with_rotations_merged_earlier'):
+        c = c.with_rotations_merged_earlier()
+    with trace_span('LayerCircuit.with_rotations_before_resets_removed'):
+        c = c.with_rotations_before_resets_removed()
     c = c.with_irrelevant_tail_layers_removed()
-    return c.to_stim_circuit()
+    with trace_span('LayerCircuit.to_stim_circuit'):
+        return c.to_stim_circuit()
@@ -1,6 +1,6 @@
 import stim
 
-from midout.gen._layer_translate import LayerCircuit, to_z_basis_interaction_circuit, _basis_before_rotation, R_ZXY
+from midout.gen._layer_translate import LayerCircuit, to_z_basis_interaction_circuit, _basis_before_rotation, R_ZXY, _LayerIndex
 
 
 def test_to_cz_circuit_rotation_folding():
@@ -478,3 +478,35 @@ def test_with_rotations_merged_earlier():
         TICK
         S 1 2
     """)
+
+
+def test_layer_index():
+    c = LayerCircuit.from_stim_circuit(stim.Circuit("""
+        H 0 1
+        TICK
+        CZ 1 2
+        TICK
+        I 0
+        TICK
+        M 2
+        TICK
+        S 1 2
+    """))
+    index = _LayerIndex(c.layers, [layer.touched() for layer in c.layers])
+    assert index.next_touching(0, 0) is None
+    assert index.next_touching(2, 1) == 3
+    assert index.reachable_rotation_layer(0, 4, -1) == 0
+    assert index.reachable_rotation_layer(1, 4, -1) is None
+    assert index.reachable_rotation_layer(0, 0, +1) == 4
+    assert index.reachable_earlier_rotation_entry(0, 4) == 2
+    assert index.reachable_earlier_rotation_entry(2, 4) is None
+
+    # Moving the only rotation out of a layer makes it stop being a destination.
+    layer = c.layers[4]
+    del layer.rotations[1]
+    index.update_rotation_layer(4, layer, 1)
+    assert index.reachable_rotation_layer(0, 0, +1) == 4
+    del layer.rotations[2]
+    index.update_rotation_layer(4, layer, 2)
+    assert index.reachable_rotation_layer(0, 0, +1) is None
+    assert index.next_touching(2, 3) is None
@@ -0,0 +1,41 @@
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from midout import gen
+
+SRC_DIR = pathlib.Path(__file__).parents[2]
+
+
+def _modules_loaded_by(statement: str) -> str:
+    return subprocess.run(
+        [sys.executable, '-c', f'{statement}\nimport sys\nprint(sorted(sys.modules))'],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=SRC_DIR,
+    ).stdout
+
+
+def test_all_names_resolve():
+    for name in gen.__all__:
+        assert getattr(gen, name).__name__ == name
+    assert set(gen.__all__) <= set(dir(gen))
+    with pytest.raises(AttributeError):
+        _ = gen.not_a_real_name
+
+
+def test_import_gen_is_light():
+    loaded = _modules_loaded_by('from midout.gen import NoiseModel')
+    assert "'sinter" not in loaded
+    assert "'numpy" not in loaded
+    assert 'midout.gen._viz' not in loaded
+    assert 'midout.gen._flow_verifier' not in loaded
+
+
+def test_import_zxxz_memory_circuit_doesnt_import_sinter():
+    loaded = _modules_loaded_by('from zxxz_surface_code_circuits import make_zxxz_memory_circuit')
+    assert "'sinter" not in loaded
+    assert 'midout.gen._viz' not in loaded
@@ -1,9 +1,16 @@
-from typing import Optional, Dict, Set, List, Iterator, Union, AbstractSet, DefaultDict, Any
+from typing import Optional, Dict, Set, List, Iterator, Iterable, Union, AbstractSet, DefaultDict, Any, TextIO, Tuple, FrozenSet
 
 import collections
+import pathlib
+import re
 
 import stim
 
+from midout.gen._util import stim_circuit_with_fused_instructions
+
+# Noisy REPEAT bodies memoized per NoiseModel (least recently used are dropped).
+REPEAT_BODY_CACHE_MAXSIZE = 64
+
 CLIFFORD_1Q = 'C1'
 CLIFFORD_2Q = 'C2'
 ANNOTATION = 'info'
@@ -98,6 +105,9 @@ OP_MEASURE_BASES = {
 }
 COLLAPSING_OPS = {op for op, t in OP_TYPES.items() if t == JUST_RESET_1Q or t == JUST_MEASURE_1Q or t == MPP or t == MEASURE_RESET_1Q}
 
+# Matches the qubit index of each target in the text of a quantum operation (e.g. '3' and '5' in 'X3*!Z5').
+TARGET_QUBIT_PATTERN = re.compile(r'\d+')
+
 
 class NoiseRule:
     """Describes how to add noise to an operation."""
@@ -126,28 +136,41 @@ class NoiseRule:
         self.after = after
         self.flip_result = flip_result
 
+    def __repr__(self) -> str:
+        return f'NoiseRule(after={_sorted_dict(self.after)!r}, flip_result={self.flip_result!r})'
+
     def append_noisy_version_of(self,
                                 *,
                                 split_op: stim.CircuitInstruction,
-                                out_during_moment: stim.Circuit,
-                                after_moments: DefaultDict[Any, stim.Circuit],
-                                immune_qubits: AbstractSet[int]) -> None:
-        targets = split_op.targets_copy()
-        if immune_qubits and any((t.is_qubit_target or t.is_x_target or t.is_y_target or t.is_z_target) and t.value in immune_qubits for t in targets):
-            out_during_moment.append(split_op)
+                                split_op_text: str,
+                                out_during_moment: List[str],
+                                after_moments: DefaultDict[Any, List[str]],
+                                immune_mask: int) -> None:
+        """Appends the noisy version of an operation, as lines of stim circuit text.
+
+        Args:
+            split_op: The operation to make noisy.
+            split_op_text: The text of the operation (i.e. `str(split_op)`).
+            out_during_moment: Receives the line for the operation itself.
+            after_moments: Receives the qubits hit by each noise channel applied after
+                the moment, keyed by (channel name, probability).
+            immune_mask: Bitmask of qubits that must not receive noise.
+        """
+        head, targets_text = _split_instruction_text(split_op_text)
+        qubits = TARGET_QUBIT_PATTERN.findall(targets_text)
+        if immune_mask and any(immune_mask >> int(q) & 1 for q in qubits):
+            out_during_moment.append(split_op_text)
             return
 
-        args = split_op.gate_args_copy()
         if self.flip_result:
             t = OP_TYPES[split_op.name]
             assert t == MPP or t == JUST_MEASURE_1Q or t == MEASURE_RESET_1Q
-            assert len(args) == 0
-            args = [self.flip_result]
-
-        out_during_moment.append(split_op.name, targets, args)
-        raw_targets = [t.value for t in targets if not t.is_combiner]
+            assert head == split_op.name
+            out_during_moment.append(f'{split_op.name}({float(self.flip_result)!r}) {targets_text}')
+        else:
+            out_during_moment.append(split_op_text)
         for op_name, arg in self.after.items():
-            after_moments[(op_name, arg)].append(op_name, raw_targets, arg)
+            after_moments[(op_name, arg)].extend(qubits)
 
 
 class NoiseModel:
@@ -164,6 +187,21 @@ class NoiseModel:
         self.measure_rules = measure_rules
         self.any_clifford_1q_rule = any_clifford_1q_rule
         self.any_clifford_2q_rule = any_clifford_2q_rule
+        # Noise rule for each (gate name, measured Pauli product) seen so far.
+        self._rule_cache: Dict[Tuple[str, Optional[str]], Optional[NoiseRule]] = {}
+        # Noisy REPEAT bodies keyed by (body text, system qubits, immune qubits).
+        self._repeat_body_cache: 'collections.OrderedDict[Tuple[str, FrozenSet[int], FrozenSet[int]], stim.Circuit]' = collections.OrderedDict()
+        self.repeat_body_cache_hits = 0
+        self.repeat_body_cache_misses = 0
+
+    def __repr__(self) -> str:
+        return (f'NoiseModel('
+                f'idle_depolarization={self.idle_depolarization!r}, '
+                f'additional_depolarization_waiting_for_m_or_r={self.additional_depolarization_waiting_for_m_or_r!r}, '
+                f'gate_rules={_sorted_dict(self.gate_rules)!r}, '
+                f'measure_rules={_sorted_dict(self.measure_rules)!r}, '
+                f'any_clifford_1q_rule={self.any_clifford_1q_rule!r}, '
+                f'any_clifford_2q_rule={self.any_clifford_2q_rule!r})')
 
     @staticmethod
     def si1000(p: float) -> 'NoiseModel':
@@ -260,25 +298,44 @@ class NoiseModel:
 
         raise ValueError(f"No noise (or lack of noise) specified for {split_op=}.")
 
+    def _cached_noise_rule_for_split_operation(self, *, split_op: stim.CircuitInstruction) -> Optional[NoiseRule]:
+        """Memoized `_noise_rule_for_split_operation`.
+
+        The rule only depends on the gate name and, for MPP, the measured Pauli
+        product. The exception is two qubit gates, which may be classically
+        controlled depending on their targets.
+        """
+        name = split_op.name
+        if OP_TYPES[name] == CLIFFORD_2Q and occurs_in_classical_control_system(split_op):
+            return None
+        key = (name, _measure_basis(split_op=split_op) if name == 'MPP' else None)
+        try:
+            return self._rule_cache[key]
+        except KeyError:
+            pass
+        rule = self._noise_rule_for_split_operation(split_op=split_op)
+        self._rule_cache[key] = rule
+        return rule
+
     def _append_idle_error(self,
                            *,
                            moment_split_ops: List[stim.CircuitInstruction],
-                           out: stim.Circuit,
+                           moment_split_op_texts: List[str],
+                           out: List[str],
                            system_qubits: AbstractSet[int],
                            immune_qubits: AbstractSet[int],
                            ) -> None:
         collapse_qubits = []
         clifford_qubits = []
-        for split_op in moment_split_ops:
+        for split_op, split_op_text in zip(moment_split_ops, moment_split_op_texts):
             if occurs_in_classical_control_system(split_op):
                 continue
             if split_op.name in COLLAPSING_OPS:
                 qubits_out = collapse_qubits
             else:
                 qubits_out = clifford_qubits
-            for target in split_op.targets_copy():
-                if not target.is_combiner:
-                    qubits_out.append(target.value)
+            _, targets_text = _split_instruction_text(split_op_text)
+            qubits_out.extend(int(q) for q in TARGET_QUBIT_PATTERN.findall(targets_text))
 
         # Safety check for operation collisions.
         usage_counts = collections.Counter(collapse_qubits + clifford_qubits)
@@ -295,12 +352,13 @@ class NoiseModel:
         collapse_qubits_set = set(collapse_qubits)
         clifford_qubits_set = set(clifford_qubits)
         idle = sorted(system_qubits - collapse_qubits_set - clifford_qubits_set - immune_qubits)
+        idle_text = ' '.join(str(q) for q in idle)
         if idle and self.idle_depolarization:
-            out.append('DEPOLARIZE1', idle, self.idle_depolarization)
+            out.append(f'DEPOLARIZE1({float(self.idle_depolarization)!r}) {idle_text}')
 
         waiting_for_mr = sorted(system_qubits - collapse_qubits_set - immune_qubits)
         if collapse_qubits_set and waiting_for_mr and self.additional_depolarization_waiting_for_m_or_r:
-            out.append('DEPOLARIZE1', idle, self.additional_depolarization_waiting_for_m_or_r)
+            out.append(f'DEPOLARIZE1({float(self.additional_depolarization_waiting_for_m_or_r)!r}) {idle_text}')
 
     def _append_noisy_moment(self,
                              *,
@@ -308,34 +366,82 @@ class NoiseModel:
                              out: stim.Circuit,
                              system_qubits: AbstractSet[int],
                              immune_qubits: AbstractSet[int],
+                             immune_mask: int,
                              ) -> None:
-        after = collections.defaultdict(stim.Circuit)
-        for split_op in moment_split_ops:
-            rule = self._noise_rule_for_split_operation(split_op=split_op)
+        # The moment is assembled as text and parsed once, because appending
+        # instructions target by target from python is far slower.
+        lines = []
+        texts = [str(split_op) for split_op in moment_split_ops]
+        after = collections.defaultdict(list)
+        for split_op, split_op_text in zip(moment_split_ops, texts):
+            rule = self._cached_noise_rule_for_split_operation(split_op=split_op)
             if rule is None:
-                out.append(split_op)
+                lines.append(split_op_text)
             else:
                 rule.append_noisy_version_of(
                     split_op=split_op,
-                    out_during_moment=out,
+                    split_op_text=split_op_text,
+                    out_during_moment=lines,
                     after_moments=after,
-                    immune_qubits=immune_qubits,
+                    immune_mask=immune_mask,
                 )
         for k in sorted(after.keys()):
-            out += after[k]
+            op_name, arg = k
+            if after[k]:
+                lines.append(f'{op_name}({float(arg)!r}) {" ".join(after[k])}')
 
         self._append_idle_error(
             moment_split_ops=moment_split_ops,
-            out=out,
+            moment_split_op_texts=texts,
+            out=lines,
+            system_qubits=system_qubits,
+            immune_qubits=immune_qubits,
+        )
+        out += stim.Circuit('\n'.join(lines))
+
+    def _noisy_repeat_body(self,
+                           body: stim.Circuit,
+                           *,
+                           system_qubits: AbstractSet[int],
+                           immune_qubits: AbstractSet[int]) -> stim.Circuit:
+        """Returns the noisy version of a REPEAT block's body (ending with a TICK), memoized."""
+        key = (str(body), frozenset(system_qubits), frozenset(immune_qubits))
+        noisy_body = self._repeat_body_cache.get(key)
+        if noisy_body is not None:
+            self.repeat_body_cache_hits += 1
+            self._repeat_body_cache.move_to_end(key)
+            return noisy_body
+        self.repeat_body_cache_misses += 1
+        noisy_body = self.noisy_circuit(
+            body,
             system_qubits=system_qubits,
             immune_qubits=immune_qubits,
         )
+        noisy_body.append('TICK')
+        self._repeat_body_cache[key] = noisy_body
+        while len(self._repeat_body_cache) > REPEAT_BODY_CACHE_MAXSIZE:
+            self._repeat_body_cache.popitem(last=False)
+        return noisy_body
+
+    def clear_repeat_body_cache(self) -> None:
+        """Forgets the memoized noisy REPEAT bodies and resets the hit/miss counters.
+
+        Noisy REPEAT bodies are memoized per model so that identical loops (in one
+        circuit or across `noisy_circuit` calls) are only noised once. The memo
+        keeps the `REPEAT_BODY_CACHE_MAXSIZE` most recently used bodies. Call this
+        after mutating the model's rules, or to release the memory.
+        """
+        self._repeat_body_cache.clear()
+        self._rule_cache.clear()
+        self.repeat_body_cache_hits = 0
+        self.repeat_body_cache_misses = 0
 
     def noisy_circuit(self,
                       circuit: stim.Circuit,
                       *,
                       system_qubits: Optional[Set[int]] = None,
                       immune_qubits: Optional[Set[int]] = None,
+                      fuse_instructions: bool = False,
                       ) -> stim.Circuit:
         """Returns a noisy version of the given circuit, by applying the receiving noise model.
 
@@ -343,6 +449,8 @@ class NoiseModel:
             circuit: The circuit to layer noise over.
             system_qubits: All qubits used by the circuit. These are the qubits eligible for idling noise.
             immune_qubits: Qubits to not apply noise to, even if they are operated on.
+            fuse_instructions: Merge same-gate instructions within each moment of the
+                result, using `stim_circuit_with_fused_instructions`.
 
         Returns:
             The noisy version of the circuit.
@@ -351,6 +459,7 @@ class NoiseModel:
             system_qubits = set(range(circuit.num_qubits))
         if immune_qubits is None:
             immune_qubits = set()
+        immune_mask = _qubit_mask(immune_qubits)
 
         result = stim.Circuit()
 
@@ -363,12 +472,11 @@ class NoiseModel:
             else:
                 result.append('TICK')
             if isinstance(moment_split_ops, stim.CircuitRepeatBlock):
-                noisy_body = self.noisy_circuit(
+                noisy_body = self._noisy_repeat_body(
                     moment_split_ops.body_copy(),
                     system_qubits=system_qubits,
                     immune_qubits=immune_qubits,
                 )
-                noisy_body.append('TICK')
                 result.append(stim.CircuitRepeatBlock(repeat_count=moment_split_ops.repeat_count, body=noisy_body))
             else:
                 self._append_noisy_moment(
@@ -376,10 +484,125 @@ class NoiseModel:
                     out=result,
                     system_qubits=system_qubits,
                     immune_qubits=immune_qubits,
+                    immune_mask=immune_mask,
                 )
 
+        if fuse_instructions:
+            result = stim_circuit_with_fused_instructions(result)
         return result
 
+    def iter_noisy_circuit_lines(self,
+                                 circuit: stim.Circuit,
+                                 *,
+                                 system_qubits: Optional[Set[int]] = None,
+                                 immune_qubits: Optional[Set[int]] = None,
+                                 indent: str = '') -> Iterator[str]:
+        """Yields the text of `noisy_circuit(circuit)` one moment at a time.
+
+        Only one moment of noisy output is held in memory at once, so this can
+        produce circuits that would be too large to build as a `stim.Circuit`.
+        REPEAT blocks are emitted as REPEAT blocks (not unrolled).
+
+        Args:
+            circuit: The circuit to layer noise over.
+            system_qubits: All qubits used by the circuit. These are the qubits eligible for idling noise.
+            immune_qubits: Qubits to not apply noise to, even if they are operated on.
+            indent: Prefix added to every yielded line.
+
+        Yields:
+            Lines of stim circuit text (without trailing newlines). Joining them
+            with newlines gives text that parses into a circuit equal to
+            `noisy_circuit(circuit)`.
+        """
+        if system_qubits is None:
+            system_qubits = set(range(circuit.num_qubits))
+        if immune_qubits is None:
+            immune_qubits = set()
+        immune_mask = _qubit_mask(immune_qubits)
+
+        first = True
+        last_was_repeat = False
+        for moment_split_ops in _iter_split_op_moments(circuit, immune_qubits=immune_qubits):
+            if first:
+                first = False
+            elif not last_was_repeat:
+                yield f'{indent}TICK'
+            if isinstance(moment_split_ops, stim.CircuitRepeatBlock):
+                yield f'{indent}REPEAT {moment_split_ops.repeat_count} {{'
+                yield from self.iter_noisy_circuit_lines(
+                    moment_split_ops.body_copy(),
+                    system_qubits=system_qubits,
+                    immune_qubits=immune_qubits,
+                    indent=indent + '    ',
+                )
+                yield f'{indent}    TICK'
+                yield f'{indent}}}'
+                last_was_repeat = True
+            else:
+                moment = stim.Circuit()
+                self._append_noisy_moment(
+                    moment_split_ops=moment_split_ops,
+                    out=moment,
+                    system_qubits=system_qubits,
+                    immune_qubits=immune_qubits,
+                    immune_mask=immune_mask,
+                )
+                for line in str(moment).splitlines():
+                    yield indent + line
+                    # Like `noisy_circuit`, only skip the TICK when the REPEAT block
+                    # is the last thing emitted; empty moments don't count.
+                    last_was_repeat = False
+
+    def write_noisy_circuit(self,
+                            circuit: stim.Circuit,
+                            out: Union[TextIO, str, pathlib.Path],
+                            *,
+                            system_qubits: Optional[Set[int]] = None,
+                            immune_qubits: Optional[Set[int]] = None,
+                            ) -> None:
+        """Writes a noisy version of the given circuit, in stim's text format, moment by moment.
+
+        This is the streaming counterpart of `noisy_circuit`: the result is never
+        materialized as a whole, so memory use is bounded by the size of one moment.
+
+        Args:
+            circuit: The circuit to layer noise over.
+            out: A writable text file handle, or a path to write to.
+            system_qubits: All qubits used by the circuit. These are the qubits eligible for idling noise.
+            immune_qubits: Qubits to not apply noise to, even if they are operated on.
+        """
+        if isinstance(out, (str, pathlib.Path)):
+            with open(out, 'w') as f:
+                self.write_noisy_circuit(circuit, f, system_qubits=system_qubits, immune_qubits=immune_qubits)
+            return
+        for line in self.iter_noisy_circuit_lines(circuit, system_qubits=system_qubits, immune_qubits=immune_qubits):
+            out.write(line)
+            out.write('\n')
+
+
+def _sorted_dict(d: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Returns a copy of a dict with sorted keys, so its repr doesn't depend on insertion order."""
+    if d is None:
+        return None
+    return dict(sorted(d.items()))
+
+
+def _qubit_mask(qubits: Iterable[int]) -> int:
+    """Returns an int with bit q set for each qubit q."""
+    mask = 0
+    for q in qubits:
+        mask |= 1 << q
+    return mask
+
+
+def _split_instruction_text(text: str) -> Tuple[str, str]:
+    """Splits the text of an instruction into its head (name and args) and its targets."""
+    # Gate args may contain spaces, but targets never contain parens.
+    k = text.find(' ', text.find(')') + 1)
+    if k == -1:
+        return text, ''
+    return text[:k], text[k + 1:]
+
 
 def occurs_in_classical_control_system(op: stim.CircuitInstruction) -> bool:
     """Determines if an operation is an annotation or a classical control system update."""
@@ -1,6 +1,8 @@
+import io
+
 import stim
 
-from midout.gen._noise import _measure_basis, _iter_split_op_moments, occurs_in_classical_control_system, NoiseModel
+from midout.gen._noise import _measure_basis, _iter_split_op_moments, occurs_in_classical_control_system, NoiseModel, NoiseRule
 
 
 def test_measure_basis():
@@ -121,4 +123,139 @@ def test_si_1000():
         DEPOLARIZE1(0.001) 0 1 2 3
         DEPOLARIZE1(0.0001) 4 5 6 7
         DEPOLARIZE1(0.002) 4 5 6 7
-    """)
\ No newline at end of file
+    """)
+
+
+def test_write_noisy_circuit_matches_noisy_circuit(tmp_path):
+    model = NoiseModel.si1000(1e-3)
+    circuit = stim.Circuit("""
+        R 0 1 2 3
+        TICK
+        REPEAT 3 {
+            H 0 1
+            TICK
+            CX 0 2 1 3
+            TICK
+            REPEAT 2 {
+                M 2 3
+                DETECTOR rec[-1]
+                TICK
+            }
+        }
+        REPEAT 2 {
+            H 4
+            TICK
+        }
+        M 0 1 2 3
+    """)
+    expected = model.noisy_circuit(circuit, immune_qubits={1})
+
+    out = io.StringIO()
+    model.write_noisy_circuit(circuit, out, immune_qubits={1})
+    assert stim.Circuit(out.getvalue()) == expected
+
+    path = tmp_path / 'noisy.stim'
+    model.write_noisy_circuit(circuit, path, immune_qubits={1})
+    assert stim.Circuit.from_file(path) == expected
+
+
+def test_write_noisy_circuit_matches_noisy_circuit_without_idle_noise():
+    # Without idle noise, the empty moment after the REPEAT block emits nothing,
+    # so no TICK separates the block from the next moment.
+    model = NoiseModel(
+        idle_depolarization=0,
+        gate_rules={},
+        any_clifford_1q_rule=NoiseRule(after={'DEPOLARIZE1': 0.01}),
+    )
+    circuit = stim.Circuit("""
+        H 0
+        TICK
+        REPEAT 3 {
+            H 0
+            TICK
+        }
+        TICK
+        H 0
+    """)
+    out = io.StringIO()
+    model.write_noisy_circuit(circuit, out)
+    assert stim.Circuit(out.getvalue()) == model.noisy_circuit(circuit)
+
+
+def test_noisy_circuit_immune_qubits_and_classical_control():
+    model = NoiseModel.depolarizing_two_body_measurement_noise(1e-3)
+    assert model.noisy_circuit(stim.Circuit("""
+        R 0 1 2 3
+        TICK
+        H 0 1
+        TICK
+        MPP X0*X1 Y2 Z3
+        TICK
+        CX rec[-1] 2 rec[-2] 1
+    """), immune_qubits={1}) == stim.Circuit("""
+        R 0 1 2 3
+        X_ERROR(0.001) 0 2 3
+        TICK
+        H 0 1
+        DEPOLARIZE1(0.001) 0 2 3
+        TICK
+        MPP X0*X1
+        MPP(0.001) Y2 Z3
+        DEPOLARIZE1(0.001) 2 3
+        TICK
+        CX rec[-1] 2 rec[-2] 1
+        DEPOLARIZE1(0.001) 0 2 3
+    """)
+
+
+def test_noisy_circuit_memoizes_repeat_bodies():
+    model = NoiseModel.si1000(1e-3)
+    circuit = stim.Circuit("""
+        R 0 1
+        TICK
+        REPEAT 5 {
+            H 0
+            TICK
+            M 1
+            TICK
+        }
+        CX 0 1
+        TICK
+        REPEAT 7 {
+            H 0
+            TICK
+            M 1
+            TICK
+        }
+    """)
+    noisy = model.noisy_circuit(circuit)
+    assert model.repeat_body_cache_misses == 1
+    assert model.repeat_body_cache_hits == 1
+    blocks = [op for op in noisy if isinstance(op, stim.CircuitRepeatBlock)]
+    assert [b.repeat_count for b in blocks] == [5, 7]
+    assert blocks[0].body_copy() == blocks[1].body_copy()
+
+    assert model.noisy_circuit(circuit) == noisy
+    assert model.repeat_body_cache_hits == 3
+    model.noisy_circuit(circuit, immune_qubits={1})
+    assert model.repeat_body_cache_misses == 2
+
+    model.clear_repeat_body_cache()
+    assert model.repeat_body_cache_hits == model.repeat_body_cache_misses == 0
+    assert model.noisy_circuit(circuit) == noisy
+    assert model.repeat_body_cache_misses == 1
+
+
+def test_repeat_body_cache_is_bounded(monkeypatch):
+    from midout.gen import _noise
+    monkeypatch.setattr(_noise, 'REPEAT_BODY_CACHE_MAXSIZE', 1)
+    model = NoiseModel.uniform_depolarizing(1e-3)
+    a = stim.Circuit("REPEAT 3 {\n H 0\n TICK\n}")
+    b = stim.Circuit("REPEAT 3 {\n S 0\n TICK\n}")
+    model.noisy_circuit(a)
+    model.noisy_circuit(a)
+    assert model.repeat_body_cache_hits == 1
+    model.noisy_circuit(b)
+    model.noisy_circuit(a)
+    assert model.repeat_body_cache_misses == 3
+    assert len(model._repeat_body_cache) == 1
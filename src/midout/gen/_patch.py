@@ -1,5 +1,4 @@
-import functools
-from typing import Tuple, Iterable, FrozenSet, Callable
+from typing import Tuple, Iterable, FrozenSet, Callable, Optional
 
 from midout.gen._tile import Tile
 from midout.gen._util import sorted_complex
@@ -8,36 +7,54 @@ from midout.gen._util import sorted_complex
 class Patch:
     """A collection of annotated stabilizers to measure simultaneously.
     """
+    __slots__ = ('tiles', '_used_set', '_data_set', '_measure_set')
 
     def __init__(self,
                  tiles: Iterable[Tile],
                  *,
                  do_not_sort: bool = False):
         if do_not_sort:
-            self.tiles = tuple(tiles)
+            tiles = tuple(tiles)
         else:
-            self.tiles = tuple(sorted_complex(tiles, key=lambda e: e.measurement_qubit))
+            tiles = tuple(sorted_complex(tiles, key=lambda e: e.measurement_qubit))
+        object.__setattr__(self, 'tiles', tiles)
+        object.__setattr__(self, '_used_set', None)
+        object.__setattr__(self, '_data_set', None)
+        object.__setattr__(self, '_measure_set', None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'Patch is immutable; can\'t set {key!r}.')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'Patch is immutable; can\'t delete {key!r}.')
+
+    def __reduce__(self):
+        return Patch, (self.tiles,)
 
     def after_coordinate_transform(self, coord_transform: Callable[[complex], complex]) -> 'Patch':
         return Patch(
             [e.after_coordinate_transform(coord_transform) for e in self.tiles],
         )
 
-    @functools.cached_property
+    @property
     def used_set(self) -> FrozenSet[complex]:
-        result = set()
-        for e in self.tiles:
-            result |= e.used_set
-        return frozenset(result)
+        if self._used_set is None:
+            result = set()
+            for e in self.tiles:
+                result |= e.used_set
+            object.__setattr__(self, '_used_set', frozenset(result))
+        return self._used_set
 
-    @functools.cached_property
+    @property
     def data_set(self) -> FrozenSet[complex]:
-        result = set()
-        for e in self.tiles:
-            for q in e.ordered_data_qubits:
-                if q is not None:
-                    result.add(q)
-        return frozenset(result)
+        if self._data_set is None:
+            result = set()
+            for e in self.tiles:
+                for q in e.ordered_data_qubits:
+                    if q is not None:
+                        result.add(q)
+            object.__setattr__(self, '_data_set', frozenset(result))
+        return self._data_set
 
     def __eq__(self, other):
         if not isinstance(other, Patch):
@@ -47,9 +64,11 @@ class Patch:
     def __ne__(self, other):
         return not (self == other)
 
-    @functools.cached_property
+    @property
     def measure_set(self) -> FrozenSet[complex]:
-        return frozenset(e.measurement_qubit for e in self.tiles)
+        if self._measure_set is None:
+            object.__setattr__(self, '_measure_set', frozenset(e.measurement_qubit for e in self.tiles))
+        return self._measure_set
 
     def bounding_box(self, extras: Iterable[complex] = ()) -> Tuple[complex, complex]:
         qs = self.used_set | set(extras)
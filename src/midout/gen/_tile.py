@@ -1,5 +1,4 @@
-import functools
-from typing import Iterable, Optional, FrozenSet, Callable
+from typing import Iterable, Optional, FrozenSet, Callable, Tuple
 
 
 class Tile:
@@ -8,6 +7,7 @@ class Tile:
     Annotates the order in which data qubits are touched, the relevant basis of
     each data qubit, and also the measurement ancilla.
     """
+    __slots__ = ('ordered_data_qubits', 'measurement_qubit', 'bases', '_data_set', '_used_set', '__weakref__')
 
     def __init__(self,
                  *,
@@ -27,13 +27,25 @@ class Tile:
                 indicating that no data qubit is interacted with during the
                 corresponding interaction layer.
         """
-        self.ordered_data_qubits = tuple(ordered_data_qubits)
-        self.measurement_qubit = measurement_qubit
+        ordered_data_qubits = tuple(ordered_data_qubits)
         if len(bases) == 1:
-            bases *= len(self.ordered_data_qubits)
-        self.bases: str = bases
-        if len(self.bases) != len(self.ordered_data_qubits):
+            bases *= len(ordered_data_qubits)
+        if len(bases) != len(ordered_data_qubits):
             raise ValueError('len(self.bases_2) != len(self.data_qubits_order)')
+        object.__setattr__(self, 'ordered_data_qubits', ordered_data_qubits)
+        object.__setattr__(self, 'measurement_qubit', measurement_qubit)
+        object.__setattr__(self, 'bases', bases)
+        object.__setattr__(self, '_data_set', None)
+        object.__setattr__(self, '_used_set', None)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'Tile is immutable; can\'t set {key!r}.')
+
+    def __delattr__(self, key):
+        raise AttributeError(f'Tile is immutable; can\'t delete {key!r}.')
+
+    def __reduce__(self):
+        return _make_tile, (self.bases, self.measurement_qubit, self.ordered_data_qubits)
 
     def __eq__(self, other):
         if not isinstance(other, Tile):
@@ -60,16 +72,24 @@ class Tile:
             measurement_qubit=coord_transform(self.measurement_qubit),
         )
 
-    @functools.cached_property
+    @property
     def data_set(self) -> FrozenSet[complex]:
-        return frozenset(e for e in self.ordered_data_qubits if e is not None)
+        if self._data_set is None:
+            object.__setattr__(self, '_data_set', frozenset(e for e in self.ordered_data_qubits if e is not None))
+        return self._data_set
 
-    @functools.cached_property
+    @property
     def used_set(self) -> FrozenSet[complex]:
-        return self.data_set | frozenset([self.measurement_qubit])
+        if self._used_set is None:
+            object.__setattr__(self, '_used_set', self.data_set | frozenset([self.measurement_qubit]))
+        return self._used_set
 
     @property
     def basis(self) -> Optional[str]:
         if self.bases == self.bases[0] * len(self.bases):
             return self.bases[0]
         return None
+
+
+def _make_tile(bases: str, measurement_qubit: complex, ordered_data_qubits: Tuple[Optional[complex], ...]) -> Tile:
+    return Tile(bases=bases, measurement_qubit=measurement_qubit, ordered_data_qubits=ordered_data_qubits)
@@ -0,0 +1,112 @@
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, Union
+
+TCallable = TypeVar('TCallable', bound=Callable[..., Any])
+
+# The tracer receiving spans, or None when tracing is disabled.
+_active_tracer: Optional['Tracer'] = None
+
+
+class Tracer:
+    """Records nested timing spans and exports them as Chrome trace events.
+
+    The exported JSON can be opened in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._origin_ns = time.perf_counter_ns()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        """Records the time spent inside the `with` block as a span."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                'name': name,
+                'ph': 'X',
+                'ts': (start - self._origin_ns) / 1000,
+                'dur': (end - start) / 1000,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+            }
+            if args:
+                event['args'] = {k: v if isinstance(v, (int, float, bool, str)) else repr(v) for k, v in args.items()}
+            self.events.append(event)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Returns the recorded spans in Chrome's trace event format."""
+        return {
+            'traceEvents': sorted(self.events, key=lambda e: (e['ts'], -e['dur'])),
+            'displayTimeUnit': 'ms',
+        }
+
+    def write_chrome_trace(self, path: Union[str, pathlib.Path]) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+@contextlib.contextmanager
+def tracing(tracer: Optional[Tracer] = None) -> Iterator[Tracer]:
+    """Enables tracing within the `with` block.
+
+    Args:
+        tracer: The tracer to record spans into. Defaults to a new tracer.
+
+    Yields:
+        The tracer receiving the spans.
+
+    Example:
+        >>> with gen.tracing() as tracer:
+        ...     make_circuit(...)
+        >>> tracer.write_chrome_trace('trace.json')
+    """
+    global _active_tracer
+    if tracer is None:
+        tracer = Tracer()
+    previous = _active_tracer
+    _active_tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _active_tracer = previous
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def trace_span(name: str, **args: Any) -> contextlib.AbstractContextManager:
+    """Returns a context manager recording a span, if tracing is enabled.
+
+    When tracing is disabled this returns a shared do-nothing context manager,
+    so spans can be left in hot code.
+    """
+    tracer = _active_tracer
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, **args)
+
+
+def traced(name: Optional[str] = None) -> Callable[[TCallable], TCallable]:
+    """Decorates a function so that each call is recorded as a span when tracing is enabled."""
+    def decorator(func: TCallable) -> TCallable:
+        span_name = func.__qualname__ if name is None else name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _active_tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore
+    return decorator
@@ -0,0 +1,62 @@
+import json
+
+from midout import gen
+from midout._make_circuit import make_circuit
+from midout.gen._trace import traced
+
+
+def test_spans_disabled_by_default():
+    tracer = gen.Tracer()
+    with gen.tracing(tracer):
+        pass
+    with gen.trace_span('unused', x=1):
+        pass
+    assert tracer.events == []
+
+
+def test_nested_spans():
+    @traced()
+    def f():
+        with gen.trace_span('inner', k=2, q=1j):
+            pass
+
+    with gen.tracing() as tracer:
+        with gen.trace_span('outer'):
+            f()
+    f()
+
+    names = [e['name'] for e in tracer.chrome_trace()['traceEvents']]
+    assert names == ['outer', 'test_nested_spans.<locals>.f', 'inner']
+    outer, middle, inner = tracer.chrome_trace()['traceEvents']
+    assert outer['ts'] <= middle['ts'] <= inner['ts']
+    assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert inner['args'] == {'k': 2, 'q': '1j'}
+    assert all(e['ph'] == 'X' for e in tracer.events)
+
+
+def test_make_circuit_trace(tmp_path):
+    with gen.tracing() as tracer:
+        make_circuit(
+            basis='X',
+            noise=gen.NoiseModel.uniform_depolarizing(1e-3),
+            boundary_rounds=1,
+            memory_rounds=2,
+            distance=3,
+            verify_chunks=True,
+        )
+    names = {e['name'] for e in tracer.events}
+    assert {
+        'make_circuit',
+        'make_circuit_chunks',
+        'verify_chunks',
+        'compile_chunks_into_circuit',
+        'compile_chunk_into_circuit',
+        'to_z_basis_interaction_circuit',
+        'LayerCircuit.with_squashed_rotations',
+        'noisy_circuit',
+    } <= names
+
+    path = tmp_path / 'trace.json'
+    tracer.write_chrome_trace(path)
+    with open(path) as f:
+        assert len(json.load(f)['traceEvents']) == len(tracer.events)
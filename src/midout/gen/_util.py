@@ -1,3 +1,4 @@
+import hashlib
 from typing import List, Callable, Iterable, TypeVar, Any, Tuple, Dict
 
 import stim
@@ -138,3 +139,119 @@ def stim_circuit_with_transformed_moments(
         result += moment_func(current_moment)
 
     return result
+
+
+# Instructions that are never fused or moved: annotations refer to the measurement
+# record or coordinates at their position, and the targets of a correlated error
+# form a single product.
+_UNFUSABLE_INSTRUCTIONS = frozenset([
+    'DETECTOR',
+    'OBSERVABLE_INCLUDE',
+    'QUBIT_COORDS',
+    'SHIFT_COORDS',
+    'E',
+    'ELSE_CORRELATED_ERROR',
+])
+
+
+class _FusedInstruction:
+    def __init__(self, instruction: stim.CircuitInstruction):
+        self.name = instruction.name
+        self.key = (instruction.name, tuple(instruction.gate_args_copy()), instruction.tag)
+        self.targets: List[stim.GateTarget] = []
+        self.qubits: set = set()
+        self.uses_record = stim.gate_data(instruction.name).produces_measurements
+        self.add(instruction)
+
+    def add(self, instruction: stim.CircuitInstruction) -> None:
+        for t in instruction.targets_copy():
+            self.targets.append(t)
+            if t.is_measurement_record_target or t.is_sweep_bit_target:
+                self.uses_record = True
+            elif not t.is_combiner:
+                self.qubits.add(t.value)
+
+    def conflicts_with(self, other: '_FusedInstruction') -> bool:
+        if self.uses_record and other.uses_record:
+            return True
+        return not self.qubits.isdisjoint(other.qubits)
+
+
+def _fused_moment(moment: stim.Circuit) -> stim.Circuit:
+    fused: List[_FusedInstruction] = []
+    # Instructions before `barrier` can't be fused into, because an annotation follows them.
+    barrier = 0
+    for instruction in moment:
+        candidate = _FusedInstruction(instruction)
+        if instruction.name in _UNFUSABLE_INSTRUCTIONS:
+            fused.append(candidate)
+            barrier = len(fused)
+            continue
+        for k in range(len(fused) - 1, barrier - 1, -1):
+            if fused[k].key == candidate.key:
+                fused[k].add(instruction)
+                break
+            if fused[k].conflicts_with(candidate):
+                fused.append(candidate)
+                break
+        else:
+            fused.append(candidate)
+
+    result = stim.Circuit()
+    for f in fused:
+        name, args, tag = f.key
+        result.append(stim.CircuitInstruction(name, f.targets, args, tag=tag))
+    return result
+
+
+def stim_circuit_with_fused_instructions(circuit: stim.Circuit) -> stim.Circuit:
+    """Returns an equivalent circuit with fewer, larger instructions.
+
+    Within each moment (a region between TICKs and REPEAT blocks), an instruction is
+    merged into an earlier instruction of the same gate (with the same arguments and
+    tag) when every instruction between them acts on different qubits. Instructions
+    that produce or read measurement results are never moved past each other, so the
+    measurement record is unchanged, and nothing is moved across annotations such as
+    DETECTOR or across correlated errors.
+
+    Note that stim already merges *adjacent* identical instructions when appending or
+    parsing, so this only helps circuits that interleave gates on disjoint qubits.
+
+    Args:
+        circuit: The circuit to fuse.
+
+    Returns:
+        The fused circuit.
+    """
+    return stim_circuit_with_transformed_moments(circuit, moment_func=_fused_moment)
+
+
+def stim_circuit_with_shortened_loops(circuit: stim.Circuit, max_repetitions: int) -> stim.Circuit:
+    """Returns a copy of the circuit with every REPEAT block cut to at most `max_repetitions` iterations.
+
+    Detectors only refer to recent measurements, so for the periodic loops used by
+    memory experiments the result is still a valid (shorter) experiment. Useful for
+    keeping diagrams of long experiments small.
+    """
+    if max_repetitions < 1:
+        raise ValueError(f'{max_repetitions=} < 1')
+    result = stim.Circuit()
+    for instruction in circuit:
+        if isinstance(instruction, stim.CircuitRepeatBlock):
+            result.append(stim.CircuitRepeatBlock(
+                min(instruction.repeat_count, max_repetitions),
+                stim_circuit_with_shortened_loops(instruction.body_copy(), max_repetitions),
+            ))
+        else:
+            result.append(instruction)
+    return result
+
+
+def stim_circuit_fingerprint(circuit: stim.Circuit) -> str:
+    """Returns a stable hash of a circuit's text.
+
+    Circuits with equal fingerprints are identical (including coordinates and
+    tags), so anything derived from one (e.g. its detector error model) can be
+    reused for the other.
+    """
+    return hashlib.sha256(str(circuit).encode('utf8')).hexdigest()
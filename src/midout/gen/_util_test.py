@@ -0,0 +1,77 @@
+import stim
+
+from midout import gen
+
+
+def test_stim_circuit_with_fused_instructions():
+    circuit = stim.Circuit("""
+        H 0
+        X_ERROR(0.1) 0
+        H 1
+        X_ERROR(0.1) 1
+        X_ERROR(0.2) 2
+        M 0
+        CX rec[-1] 2
+        M 1
+        DETECTOR rec[-1]
+        H 3
+        CZ 0 1
+        E(0.1) X0
+        E(0.1) X1
+        H 4
+        TICK
+        H 5
+        REPEAT 2 {
+            H 0
+            S 1
+            H 2
+        }
+        H 6
+    """)
+    assert gen.stim_circuit_with_fused_instructions(circuit) == stim.Circuit("""
+        H 0 1
+        X_ERROR(0.1) 0 1
+        X_ERROR(0.2) 2
+        M 0
+        CX rec[-1] 2
+        M 1
+        DETECTOR rec[-1]
+        H 3
+        CZ 0 1
+        E(0.1) X0
+        E(0.1) X1
+        H 4
+        TICK
+        H 5
+        REPEAT 2 {
+            H 0 2
+            S 1
+        }
+        H 6
+    """)
+
+
+def test_fuse_instructions_options_preserve_circuit_meaning():
+    circuit = stim.Circuit("""
+        R 0 1 2
+        TICK
+        H 0
+        X 1
+        H 2
+        TICK
+        M 0 1 2
+        DETECTOR rec[-2]
+    """)
+    noise = gen.NoiseModel.uniform_depolarizing(1e-3)
+    noisy = noise.noisy_circuit(circuit)
+    fused = noise.noisy_circuit(circuit, fuse_instructions=True)
+    assert fused == gen.stim_circuit_with_fused_instructions(noisy)
+    assert len(fused) < len(noisy)
+    assert fused.detector_error_model() == noisy.detector_error_model()
+
+
+def test_stim_circuit_with_shortened_loops():
+    circuit = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=100)
+    shortened = gen.stim_circuit_with_shortened_loops(circuit, 3)
+    assert shortened == stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=4)
+    assert gen.stim_circuit_with_shortened_loops(shortened, 10) == shortened
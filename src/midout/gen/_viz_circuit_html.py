@@ -2,13 +2,16 @@ import base64
 import collections
 import dataclasses
 import math
+import multiprocessing
 import random
 import sys
-from typing import Tuple, Dict, List, Set, Optional, Union, Iterable, Callable
+import time
+from typing import Tuple, Dict, List, Set, Optional, Union, Iterable, Callable, FrozenSet
 
 import stim
 
 from midout.gen._patch import Patch
+from midout.gen._util import stim_circuit_fingerprint, stim_circuit_with_shortened_loops
 
 PITCH = 48 * 2
 DIAM = 32
@@ -90,6 +93,7 @@ class _SvgLayer:
         self.used_indices: Set[int] = set()
         self.used_positions: Set[Tuple[float, float]] = set()
         self.measurement_positions: Dict[int, Tuple[float, float]] = {}
+        self.notes: List[str] = []
 
     def add(self, tag, *, content: Union[bool, str] = False, **kwargs) -> None:
         self.svg_instructions.append("    " + tag_str(tag, content=content, **kwargs))
@@ -154,6 +158,17 @@ class _SvgLayer:
                     content=True,
                     **kwargs),
             *self.svg_instructions,
+            *[
+                "    " + tag_str("text",
+                                 x=min_x + 5,
+                                 y=min_y + 5 + 28 * k,
+                                 fill="purple",
+                                 content=note,
+                                 text_anchor="left",
+                                 dominant_baseline="hanging",
+                                 font_size=24)
+                for k, note in enumerate(self.notes)
+            ],
             "</svg>",
         ])
         if as_img_with_data_uri:
@@ -171,19 +186,54 @@ class _SvgState:
     def __init__(self):
         self.layers: List[_SvgLayer] = [_SvgLayer()]
         self.coord_shift: List[int] = [0, 0]
-        self.measurement_layer_indices: List[int] = []
+        # Layer of each drawn measurement (and tick). Loop iterations that are
+        # skipped when collapsing loops advance the counts without being drawn.
+        self.num_measurements = 0
+        self.measurement_layer_indices: Dict[int, int] = {}
+        self.num_ticks = 0
+        self.tick_layer_indices: Dict[int, int] = {0: 0}
+        self._after_skip = False
         self.detector_index = 0
         self.detector_coords = {}
         self.measurement_marks = collections.Counter()
         self.highlighted_detectors = set()
+        # Detector labels are drawn once it's known which detectors to highlight.
+        self.detector_labels: List[Tuple[_SvgLayer, float, float, int]] = []
         self.highlighted_errors: List[Tuple[int, int, str]] = []
         self.flipped_measurements: Set[int] = set()
         self.noted_errors: List[Tuple[int, int, str]] = []
         self.control_count = 0
 
     def tick(self) -> None:
+        self.num_ticks += 1
+        self._start_layer(reuse_empty=self._after_skip)
+
+    def _start_layer(self, *, reuse_empty: bool = False) -> None:
+        self._after_skip = False
+        last = len(self.layers) - 1
+        if reuse_empty and not self.layers[last].svg_instructions:
+            # Nothing was drawn since a layer break next to skipped iterations, so
+            # the break's tick belongs to them and the empty layer can be reused.
+            for t in [t for t, k in self.tick_layer_indices.items() if k == last]:
+                del self.tick_layer_indices[t]
+            self.tick_layer_indices[self.num_ticks] = last
+            return
         self.layers.append(_SvgLayer())
         self.layers[-1].q2i_dict = dict(self.layers[-2].q2i_dict)
+        self.tick_layer_indices[self.num_ticks] = len(self.layers) - 1
+
+    def skip(self, circuit: stim.Circuit, repetitions: int) -> None:
+        """Accounts for undrawn repetitions of a circuit, without drawing them."""
+        self.num_measurements += circuit.num_measurements * repetitions
+        self.detector_index += circuit.num_detectors * repetitions
+        dx, dy = _coord_shift(circuit)
+        self.coord_shift[0] += dx * repetitions
+        self.coord_shift[1] += dy * repetitions
+        ticks = circuit.num_ticks * repetitions
+        if ticks:
+            self.num_ticks += ticks
+            self._start_layer(reuse_empty=True)
+            self._after_skip = True
 
     def q2i(self, i: int) -> Tuple[float, float]:
         x, y = self.layers[-1].q2i_dict.setdefault(i, (i, 0))
@@ -208,8 +258,9 @@ class _SvgState:
 
     def add_measurement(self, target: stim.GateTarget) -> None:
         assert target.is_qubit_target or target.is_x_target or target.is_y_target or target.is_z_target
-        m_index = len(self.measurement_layer_indices)
-        self.measurement_layer_indices.append(len(self.layers) - 1)
+        m_index = self.num_measurements
+        self.num_measurements += 1
+        self.measurement_layer_indices[m_index] = len(self.layers) - 1
         self.layers[-1].measurement_positions[m_index] = self.q2i(target.value)
 
     def mark_measurements(self, targets: List[stim.GateTarget], prefix: str, index: Optional[int]) -> None:
@@ -218,9 +269,7 @@ class _SvgState:
             index = self.detector_index
             self.detector_index += 1
         if prefix == 'D':
-            color = "black"
-            if index in self.highlighted_detectors:
-                color = "red"
+            color = None
         elif prefix == 'L':
             color = "blue"
         elif prefix == 'C':
@@ -229,27 +278,44 @@ class _SvgState:
             color = 'black'
         name = f"{prefix}{index}"
         for t in targets:
-            m_index = len(self.measurement_layer_indices) + t.value
+            m_index = self.num_measurements + t.value
             if m_index < 0:
                 print("Attempted to mark a measurement before the beginning of time.\n"
                       "Skipping this mark.", file=sys.stderr)
                 continue
             assert m_index >= 0, m_index
             assert t.is_measurement_record_target
-            layer = self.layers[self.measurement_layer_indices[m_index]]
+            layer_index = self.measurement_layer_indices.get(m_index)
+            if layer_index is None:
+                # The measurement is in a collapsed loop iteration that wasn't drawn.
+                continue
+            layer = self.layers[layer_index]
             x, y = layer.measurement_positions[m_index]
             x += RAD + 1
             y -= RAD
             y += self.measurement_marks[m_index] * 15
             self.measurement_marks[m_index] += 1
-            layer.add("text",
-                      x=x,
-                      y=y,
-                      fill=color,
-                      content=name,
-                      text_anchor="left",
-                      alignment_baseline="hanging",
-                      font_size=16)
+            if color is None:
+                self.detector_labels.append((layer, x, y, index))
+            else:
+                _add_measurement_label(layer, x, y, color=color, name=name)
+
+    def draw_detector_labels(self) -> None:
+        for layer, x, y, index in self.detector_labels:
+            color = "red" if index in self.highlighted_detectors else "black"
+            _add_measurement_label(layer, x, y, color=color, name=f"D{index}")
+        self.detector_labels.clear()
+
+
+def _add_measurement_label(layer: _SvgLayer, x: float, y: float, *, color: str, name: str) -> None:
+    layer.add("text",
+              x=x,
+              y=y,
+              fill=color,
+              content=name,
+              text_anchor="left",
+              alignment_baseline="hanging",
+              font_size=16)
 
 
 def _draw_endpoint(x: float, y: float, style: str, *, out: _SvgState) -> None:
@@ -391,12 +457,67 @@ def _draw_1q(instruction: stim.CircuitInstruction, *, out: _SvgState):
         out.add_box(x, y, style.label, fill=style.fill_color, text_color=style.text_color)
 
 
-def _stim_circuit_to_svg_helper(circuit: stim.Circuit, state: _SvgState) -> None:
+def _coord_shift(circuit: stim.Circuit) -> Tuple[float, float]:
+    """Returns the total qubit coordinate shift applied by SHIFT_COORDS in a circuit."""
+    dx = dy = 0
+    for instruction in circuit:
+        if isinstance(instruction, stim.CircuitRepeatBlock):
+            bx, by = _coord_shift(instruction.body_copy())
+            dx += bx * instruction.repeat_count
+            dy += by * instruction.repeat_count
+        elif instruction.name == "SHIFT_COORDS":
+            pos = instruction.gate_args_copy()
+            if len(pos) >= 1:
+                dx += pos[0]
+            if len(pos) >= 2:
+                dy += pos[1]
+    return dx, dy
+
+
+def _stim_circuit_to_svg_helper(
+        circuit: stim.Circuit,
+        state: _SvgState,
+        *,
+        collapse_loops: Optional[Tuple[int, int]] = None,
+) -> None:
+    """Draws a circuit's layers into the given state.
+
+    Args:
+        circuit: The circuit to draw.
+        state: Where to draw.
+        collapse_loops: When not None, a (head, tail) pair. Each REPEAT block
+            with more than head + tail + 1 iterations is drawn as its first head
+            iterations, then a single iteration standing in for the middle ones
+            (labelled with how many iterations it stands for), then its last
+            tail iterations. Otherwise loops are fully unrolled.
+    """
     for instruction in circuit:
         if isinstance(instruction, stim.CircuitRepeatBlock):
             body = instruction.body_copy()
-            for _ in range(instruction.repeat_count):
-                _stim_circuit_to_svg_helper(body, state)
+            reps = instruction.repeat_count
+            if collapse_loops is None or reps <= sum(collapse_loops) + 1:
+                for _ in range(reps):
+                    _stim_circuit_to_svg_helper(body, state, collapse_loops=collapse_loops)
+                continue
+            head, tail = collapse_loops
+            middle = reps - head - tail
+            for _ in range(head):
+                _stim_circuit_to_svg_helper(body, state, collapse_loops=collapse_loops)
+            first_layer = len(state.layers) - 1
+            first_layer_size = len(state.layers[first_layer].svg_instructions)
+            _stim_circuit_to_svg_helper(body, state, collapse_loops=collapse_loops)
+            marked_layers = state.layers[first_layer:]
+            if len(marked_layers) > 1 and not marked_layers[-1].svg_instructions:
+                # Opened by the iteration's final TICK; it will hold the next iteration.
+                marked_layers.pop()
+            if len(marked_layers) > 1 and len(marked_layers[0].svg_instructions) == first_layer_size:
+                # The iteration started with a TICK, so nothing of it is in this layer.
+                marked_layers.pop(0)
+            for layer in marked_layers:
+                layer.notes.append(f"REPEAT ×{middle} (iterations {head + 1}..{head + middle} of {reps})")
+            state.skip(body, middle - 1)
+            for _ in range(tail):
+                _stim_circuit_to_svg_helper(body, state, collapse_loops=collapse_loops)
         elif isinstance(instruction, stim.CircuitInstruction):
             targets: List[stim.GateTarget] = instruction.targets_copy()
             if instruction.name == "QUBIT_COORDS":
@@ -433,6 +554,93 @@ def _stim_circuit_to_svg_helper(circuit: stim.Circuit, state: _SvgState) -> None
             raise NotImplementedError(repr(instruction))
 
 
+@dataclasses.dataclass(frozen=True)
+class _ErrorHighlights:
+    """What to highlight to show an error (plain data, so it can cross processes)."""
+    errors: Tuple[Tuple[int, int, str], ...]  # (qubit, tick, basis) of each flipped pauli.
+    flipped_measurements: FrozenSet[int]
+    detectors: FrozenSet[int]
+
+
+def _error_highlights(known_error: Iterable[stim.ExplainedError]) -> _ErrorHighlights:
+    errors = []
+    flipped_measurements = set()
+    detectors = set()
+    for product in known_error:
+        loc = next(iter(product.circuit_error_locations))
+        for flipped in loc.flipped_pauli_product:
+            if flipped.gate_target.is_x_target:
+                b = 'X'
+            elif flipped.gate_target.is_y_target:
+                b = 'Y'
+            elif flipped.gate_target.is_z_target:
+                b = 'Z'
+            else:
+                raise NotImplementedError(repr(loc))
+            errors.append((flipped.gate_target.value, loc.tick_offset, b))
+        if loc.flipped_measurement is not None:
+            flipped_measurements.add(loc.flipped_measurement.record_index)
+        for term in product.dem_error_terms:
+            target = term.dem_target
+            if target.is_relative_detector_id():
+                detectors.add(target.val)
+    return _ErrorHighlights(
+        errors=tuple(errors),
+        flipped_measurements=frozenset(flipped_measurements),
+        detectors=frozenset(detectors),
+    )
+
+
+def _shortest_error_highlights(circuit: stim.Circuit) -> Optional[_ErrorHighlights]:
+    # noinspection PyBroadException
+    try:
+        known_error = circuit.shortest_graphlike_error(
+            ignore_ungraphlike_errors=True,
+            canonicalize_circuit_errors=True,
+        )
+    except Exception:
+        return None
+    return _error_highlights(known_error)
+
+
+# Highlights of recently viewed circuits' shortest graphlike errors, by circuit fingerprint.
+_SHORTEST_ERROR_HIGHLIGHTS: 'collections.OrderedDict[str, Optional[_ErrorHighlights]]' = collections.OrderedDict()
+SHORTEST_ERROR_CACHE_MAXSIZE = 32
+
+
+def _cache_shortest_error_highlights(key: str, highlights: Optional[_ErrorHighlights]) -> None:
+    _SHORTEST_ERROR_HIGHLIGHTS[key] = highlights
+    _SHORTEST_ERROR_HIGHLIGHTS.move_to_end(key)
+    while len(_SHORTEST_ERROR_HIGHLIGHTS) > SHORTEST_ERROR_CACHE_MAXSIZE:
+        _SHORTEST_ERROR_HIGHLIGHTS.popitem(last=False)
+
+
+class _PendingErrorHighlights:
+    """A circuit's shortest graphlike error, being found in a worker process."""
+
+    def __init__(self, circuit: stim.Circuit, *, key: str, time_budget: Optional[float]):
+        self._key = key
+        self._deadline = None if time_budget is None else time.monotonic() + time_budget
+        self._pool = multiprocessing.Pool(1)
+        self._result = self._pool.apply_async(_shortest_error_highlights, (circuit,))
+
+    def get(self) -> Optional[_ErrorHighlights]:
+        """Waits for the result, until the time budget runs out (then returns None)."""
+        timeout = None if self._deadline is None else max(0.0, self._deadline - time.monotonic())
+        try:
+            highlights = self._result.get(timeout)
+        except multiprocessing.TimeoutError:
+            return None
+        finally:
+            self.close()
+        _cache_shortest_error_highlights(self._key, highlights)
+        return highlights
+
+    def close(self) -> None:
+        """Stops the worker process, if it's still searching."""
+        self._pool.terminate()
+
+
 def append_patch_polygons(*, out: List[str], patch: Patch, q2i: Dict[complex, int]):
     for e in patch.tiles:
         if e.basis == 'X':
@@ -461,42 +669,79 @@ def stim_circuit_html_viewer(circuit: stim.Circuit,
                              patch: Union[None, Patch, Dict[int, Patch]] = None,
                              width: int = 500,
                              height: int = 500,
-                             known_error: Optional[Iterable[stim.ExplainedError]] = None) -> str:
+                             known_error: Optional[Iterable[stim.ExplainedError]] = None,
+                             collapse_loops: bool = False,
+                             loop_head_iterations: int = 1,
+                             loop_tail_iterations: int = 1,
+                             known_error_time_budget: Optional[float] = None,
+                             known_error_in_background: bool = False) -> str:
+    """Returns HTML for stepping through the layers of a circuit.
+
+    Args:
+        circuit: The circuit to show.
+        patch: Patches to overlay in the Crumble link, by tick.
+        width: Width of the viewer, in pixels.
+        height: Height of the viewer, in pixels.
+        known_error: An error to highlight. Defaults to the circuit's shortest
+            graphlike error, when it can be found. Found errors are cached by
+            circuit fingerprint, so viewing the same circuit again is cheap.
+        collapse_loops: When set, REPEAT blocks aren't fully unrolled. Each one is
+            drawn as its first `loop_head_iterations` iterations, one iteration
+            marked as standing for the middle iterations ("REPEAT ×N"), and its
+            last `loop_tail_iterations` iterations. Marks and highlights that
+            fall in the undrawn iterations are omitted, and the Crumble link gets
+            the loops cut to the same number of iterations.
+        loop_head_iterations: See `collapse_loops`.
+        loop_tail_iterations: See `collapse_loops`.
+        known_error_time_budget: When set, and `known_error` isn't given, the
+            shortest graphlike error is searched for in a worker process, and
+            highlighting is skipped if it isn't found within this many seconds.
+        known_error_in_background: When set, and `known_error` isn't given, the
+            shortest graphlike error is searched for in a worker process while
+            the layers are drawn. Combined with `known_error_time_budget`, the
+            budget covers both.
+    """
+    if loop_head_iterations < 0 or loop_tail_iterations < 0:
+        raise ValueError(f'{loop_head_iterations=} < 0 or {loop_tail_iterations=} < 0')
     q2i = {v[0] + 1j * v[1]: k
            for k, v in circuit.get_final_qubit_coordinates().items()}
 
     state = _SvgState()
     state.detector_coords = circuit.get_detector_coordinates()
-    if known_error is None:
-        # noinspection PyBroadException
-        try:
-            known_error = circuit.shortest_graphlike_error(
-                ignore_ungraphlike_errors=True,
-                canonicalize_circuit_errors=True,
-            )
-        except Exception:
-            pass
+    highlights: Optional[_ErrorHighlights] = None
+    pending: Optional[_PendingErrorHighlights] = None
     if known_error is not None:
-        for product in known_error:
-            loc = next(iter(product.circuit_error_locations))
-            for flipped in loc.flipped_pauli_product:
-                if flipped.gate_target.is_x_target:
-                    b = 'X'
-                elif flipped.gate_target.is_y_target:
-                    b = 'Y'
-                elif flipped.gate_target.is_z_target:
-                    b = 'Z'
-                else:
-                    raise NotImplementedError(repr(loc))
-                state.highlighted_errors.append((flipped.gate_target.value, loc.tick_offset, b))
-            if loc.flipped_measurement is not None:
-                state.flipped_measurements.add(loc.flipped_measurement.record_index)
-            for term in product.dem_error_terms:
-                target = term.dem_target
-                if target.is_relative_detector_id():
-                    state.highlighted_detectors.add(target.val)
-
-    _stim_circuit_to_svg_helper(circuit, state)
+        highlights = _error_highlights(known_error)
+    else:
+        key = stim_circuit_fingerprint(circuit)
+        if key in _SHORTEST_ERROR_HIGHLIGHTS:
+            _SHORTEST_ERROR_HIGHLIGHTS.move_to_end(key)
+            highlights = _SHORTEST_ERROR_HIGHLIGHTS[key]
+        elif known_error_in_background or known_error_time_budget is not None:
+            pending = _PendingErrorHighlights(circuit, key=key, time_budget=known_error_time_budget)
+            if not known_error_in_background:
+                highlights = pending.get()
+                pending = None
+        else:
+            highlights = _shortest_error_highlights(circuit)
+            _cache_shortest_error_highlights(key, highlights)
+
+    try:
+        _stim_circuit_to_svg_helper(
+            circuit,
+            state,
+            collapse_loops=(loop_head_iterations, loop_tail_iterations) if collapse_loops else None,
+        )
+        if pending is not None:
+            highlights = pending.get()
+    finally:
+        if pending is not None:
+            pending.close()
+    if highlights is not None:
+        state.highlighted_errors.extend(highlights.errors)
+        state.flipped_measurements |= highlights.flipped_measurements
+        state.highlighted_detectors |= highlights.detectors
+    state.draw_detector_labels()
     all_pos = {pt for layer in state.layers for pt in layer.used_positions}
     while state.layers and not state.layers[-1].svg_instructions:
         state.layers.pop()
@@ -504,11 +749,17 @@ def stim_circuit_html_viewer(circuit: stim.Circuit,
         layer.add_idles(all_pos)
 
     for m in state.flipped_measurements:
-        layer = state.layers[state.measurement_layer_indices[m]]
+        layer_index = state.measurement_layer_indices.get(m)
+        if layer_index is None:
+            continue
+        layer = state.layers[layer_index]
         x, y = layer.measurement_positions[m]
         layer.add("rect", x=x - RAD, y=y - RAD, width=DIAM, height=DIAM, fill="#FF000080", stroke="#FF0000")
-    for qubit, time, basis in state.highlighted_errors:
-        layer = state.layers[time]
+    for qubit, tick_offset, basis in state.highlighted_errors:
+        layer_index = state.tick_layer_indices.get(tick_offset)
+        if layer_index is None:
+            continue
+        layer = state.layers[layer_index]
         x, y = state.q2i(qubit)
         layer.add("text",
                   x=x,
@@ -518,8 +769,8 @@ def stim_circuit_html_viewer(circuit: stim.Circuit,
                   text_anchor="middle",
                   dominant_baseline="middle",
                   font_size=64)
-    for qubit, time, basis in set(state.noted_errors):
-        layer = state.layers[time]
+    for qubit, layer_index, basis in set(state.noted_errors):
+        layer = state.layers[layer_index]
         x, y = state.q2i(qubit)
         layer.add("text",
                   x=x - RAD,
@@ -541,7 +792,12 @@ def stim_circuit_html_viewer(circuit: stim.Circuit,
         )
     all_svg_image_tags = '\n'.join(svg_image_tags)
 
-    flattened = circuit.flattened()
+    if collapse_loops:
+        # Crumble gets the loops cut to the iterations drawn above, instead of fully unrolled.
+        flattened = stim_circuit_with_shortened_loops(
+            circuit, loop_head_iterations + loop_tail_iterations + 1).flattened()
+    else:
+        flattened = circuit.flattened()
     circuit_coords = [str(inst) for inst in flattened if inst.name == "QUBIT_COORDS"]
     if isinstance(patch, Patch):
         patch = {0: patch}
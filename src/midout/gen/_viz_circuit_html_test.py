@@ -0,0 +1,145 @@
+import base64
+import collections
+import re
+import time
+
+import pytest
+import stim
+
+from midout import gen
+
+
+def _num_layers(html: str) -> int:
+    return html.count('<img ')
+
+
+def _layer_svgs(html: str) -> list:
+    return [base64.standard_b64decode(e).decode('utf8') for e in re.findall('base64,([^"]+)"', html)]
+
+
+def test_collapse_loops():
+    circuit = stim.Circuit.generated(
+        'surface_code:rotated_memory_z',
+        distance=3,
+        rounds=100,
+        after_clifford_depolarization=1e-3,
+    )
+    loop, = [e for e in circuit if isinstance(e, stim.CircuitRepeatBlock)]
+    assert loop.repeat_count == 99
+
+    full = gen.stim_circuit_html_viewer(circuit, known_error=[])
+    collapsed = gen.stim_circuit_html_viewer(circuit, known_error=[], collapse_loops=True)
+    longer = gen.stim_circuit_html_viewer(
+        circuit,
+        known_error=[],
+        collapse_loops=True,
+        loop_head_iterations=2,
+        loop_tail_iterations=3,
+    )
+    num_ticks_per_round = loop.body_copy().num_ticks
+    assert _num_layers(full) - _num_layers(collapsed) == 96 * num_ticks_per_round
+    assert _num_layers(longer) - _num_layers(collapsed) == 3 * num_ticks_per_round
+    assert len(collapsed) < len(full) / 10
+    marked = [svg for svg in _layer_svgs(collapsed) if 'REPEAT ×97 (iterations 2..98 of 99)' in svg]
+    assert len(marked) == num_ticks_per_round
+
+    # Loops short enough to not benefit are unrolled as usual.
+    short = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=4)
+    assert gen.stim_circuit_html_viewer(short, known_error=[], collapse_loops=True) == gen.stim_circuit_html_viewer(short, known_error=[])
+
+
+def test_collapse_loops_has_as_many_layers_as_the_drawn_iterations():
+    for rounds in [5, 50]:
+        circuit = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=rounds)
+        # Three drawn iterations of the loop, and the round before it.
+        unrolled = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=4)
+        collapsed = gen.stim_circuit_html_viewer(circuit, known_error=[], collapse_loops=True)
+        assert _num_layers(collapsed) == _num_layers(gen.stim_circuit_html_viewer(unrolled, known_error=[]))
+
+    # A loop body ending with (instead of starting with) a TICK.
+    def ends_with_tick(reps: int) -> stim.Circuit:
+        return stim.Circuit(f"""
+            R 0 1
+            TICK
+            REPEAT {reps} {{
+                H 0
+                TICK
+                CX 0 1
+                TICK
+                M 1
+                TICK
+            }}
+            M 0
+        """)
+    collapsed = gen.stim_circuit_html_viewer(ends_with_tick(50), known_error=[], collapse_loops=True)
+    assert _num_layers(collapsed) == _num_layers(gen.stim_circuit_html_viewer(ends_with_tick(3), known_error=[]))
+    marked = [svg for svg in _layer_svgs(collapsed) if 'REPEAT ×48' in svg]
+    assert len(marked) == 3
+
+
+def test_collapse_loops_highlights_known_error():
+    circuit = stim.Circuit.generated(
+        'surface_code:rotated_memory_z',
+        distance=3,
+        rounds=50,
+        after_clifford_depolarization=1e-3,
+    )
+    # Errors inside skipped iterations are dropped instead of crashing.
+    gen.stim_circuit_html_viewer(circuit, collapse_loops=True, loop_head_iterations=0, loop_tail_iterations=0)
+    gen.stim_circuit_html_viewer(circuit, collapse_loops=True)
+
+
+def test_shortest_error_is_cached(monkeypatch):
+    from midout.gen import _viz_circuit_html
+    monkeypatch.setattr(_viz_circuit_html, '_SHORTEST_ERROR_HIGHLIGHTS', collections.OrderedDict())
+    circuit = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=3, after_clifford_depolarization=1e-3)
+
+    calls = []
+    original = stim.Circuit.shortest_graphlike_error
+    monkeypatch.setattr(stim.Circuit, 'shortest_graphlike_error', lambda *args, **kwargs: calls.append(1) or original(*args, **kwargs))
+    first = gen.stim_circuit_html_viewer(circuit)
+    assert gen.stim_circuit_html_viewer(circuit.copy()) == first
+    assert len(calls) == 1
+    assert first != gen.stim_circuit_html_viewer(circuit, known_error=[])
+
+
+def test_shortest_error_time_budget_and_background(monkeypatch):
+    from midout.gen import _viz_circuit_html
+    circuit = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=3, after_clifford_depolarization=1e-3)
+    expected = gen.stim_circuit_html_viewer(circuit)
+
+    monkeypatch.setattr(_viz_circuit_html, '_SHORTEST_ERROR_HIGHLIGHTS', collections.OrderedDict())
+    assert gen.stim_circuit_html_viewer(circuit, known_error_in_background=True) == expected
+    assert len(_viz_circuit_html._SHORTEST_ERROR_HIGHLIGHTS) == 1
+
+    monkeypatch.setattr(_viz_circuit_html, '_SHORTEST_ERROR_HIGHLIGHTS', collections.OrderedDict())
+    assert gen.stim_circuit_html_viewer(circuit, known_error_time_budget=60) == expected
+
+    # Out of time: highlighting is skipped, and nothing is cached.
+    monkeypatch.setattr(_viz_circuit_html, '_SHORTEST_ERROR_HIGHLIGHTS', collections.OrderedDict())
+    monkeypatch.setattr(_viz_circuit_html, '_shortest_error_highlights', _slow_shortest_error_highlights)
+    skipped = gen.stim_circuit_html_viewer(circuit, known_error_time_budget=0.1, known_error_in_background=True)
+    assert skipped == gen.stim_circuit_html_viewer(circuit, known_error=[])
+    assert not _viz_circuit_html._SHORTEST_ERROR_HIGHLIGHTS
+
+
+def _slow_shortest_error_highlights(circuit: stim.Circuit):
+    time.sleep(60)
+
+
+def test_background_search_is_stopped_when_drawing_fails(monkeypatch):
+    from midout.gen import _viz_circuit_html
+    monkeypatch.setattr(_viz_circuit_html, '_SHORTEST_ERROR_HIGHLIGHTS', collections.OrderedDict())
+    monkeypatch.setattr(_viz_circuit_html, '_shortest_error_highlights', _slow_shortest_error_highlights)
+    closed = []
+    original_close = _viz_circuit_html._PendingErrorHighlights.close
+    monkeypatch.setattr(_viz_circuit_html._PendingErrorHighlights, 'close', lambda self: closed.append(1) or original_close(self))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('drawing failed')
+    monkeypatch.setattr(_viz_circuit_html, '_stim_circuit_to_svg_helper', fail)
+
+    circuit = stim.Circuit.generated('surface_code:rotated_memory_z', distance=3, rounds=3, after_clifford_depolarization=1e-3)
+    with pytest.raises(RuntimeError, match='drawing failed'):
+        gen.stim_circuit_html_viewer(circuit, known_error_in_background=True)
+    assert closed
@@ -1 +1,31 @@
-from zxxz_surface_code_circuits.zxxz_circuit import make_zxxz_memory_circuit
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from zxxz_surface_code_circuits.zxxz_circuit import make_zxxz_memory_circuit
+    from zxxz_surface_code_circuits.batch import make_zxxz_memory_circuits
+    from zxxz_surface_code_circuits.tasks import CircuitSpec, sinter_tasks
+
+# The submodule defining each public name. Submodules are imported on first
+# use, so that e.g. sampling workers don't import sinter via `tasks`.
+_LAZY_ATTRIBUTES = {
+    "make_zxxz_memory_circuit": "zxxz_circuit",
+    "make_zxxz_memory_circuits": "batch",
+    "CircuitSpec": "tasks",
+    "sinter_tasks": "tasks",
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module_name}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,114 @@
+import concurrent.futures
+import functools
+import os
+import pathlib
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar, Union
+
+import stim
+
+from zxxz_surface_code_circuits.zxxz_circuit import make_zxxz_memory_circuit
+
+GridPoint = Tuple[int, str, int]
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def zxxz_memory_circuit_file_name(*, distance: int, basis: str, rounds: int) -> str:
+    """Returns the file name used when writing the given grid point to disk."""
+    return f"zxxz_memory,d={distance},b={basis},r={rounds}.stim"
+
+
+def _make_grid_point(
+    point: GridPoint,
+    out_dir: Optional[str],
+) -> Tuple[GridPoint, Union[stim.Circuit, pathlib.Path]]:
+    distance, basis, rounds = point
+    circuit = make_zxxz_memory_circuit(distance=distance, basis=basis, rounds=rounds)
+    if out_dir is None:
+        return point, circuit
+    path = pathlib.Path(out_dir) / zxxz_memory_circuit_file_name(
+        distance=distance, basis=basis, rounds=rounds
+    )
+    tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+    circuit.to_file(tmp_path)
+    os.replace(tmp_path, path)
+    return point, path
+
+
+def make_zxxz_memory_circuits(
+    grid: Iterable[GridPoint],
+    *,
+    workers: Optional[int] = None,
+    out_dir: Union[None, str, pathlib.Path] = None,
+) -> Iterator[Tuple[GridPoint, Union[stim.Circuit, pathlib.Path]]]:
+    """Generates ZXXZ memory circuits for many parameter choices, in parallel.
+
+    Args:
+        grid: The (distance, basis, rounds) combinations to generate. For example,
+            `itertools.product(range(3, 26, 2), "XZ", [10, 100])`.
+        workers: Number of worker processes. Defaults to `os.cpu_count()`. When
+            set to 1, circuits are generated in the calling process.
+        out_dir: When specified, each worker writes its circuit to a `.stim` file
+            in this directory (named by `zxxz_memory_circuit_file_name`) and the
+            file path is yielded instead of the circuit. This avoids sending large
+            circuits back to the calling process.
+
+    Yields:
+        (grid_point, circuit_or_path) pairs, in the order the circuits finish.
+        The iterator is lazy: only a bounded number of grid points are in
+        flight at any time.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"{workers=} < 1")
+    if out_dir is not None:
+        out_dir = pathlib.Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        out_dir = str(out_dir)
+
+    points = ((int(d), str(b), int(r)) for d, b, r in grid)
+    yield from imap_unordered(
+        functools.partial(_make_grid_point, out_dir=out_dir),
+        points,
+        workers=workers,
+    )
+
+
+def imap_unordered(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    workers: int,
+) -> Iterator[R]:
+    """Lazily maps a picklable function over items using a process pool.
+
+    Only `2 * workers` items are in flight at any time, so `items` can be a
+    long (or slow) iterator. Results are yielded in completion order. When
+    `workers` is 1 the function is called in the calling process.
+    """
+    items = iter(items)
+    if workers == 1:
+        for item in items:
+            yield func(item)
+        return
+
+    max_in_flight = 2 * workers
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(func, item))
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                yield future.result()
@@ -0,0 +1,21 @@
+import itertools
+
+import stim
+
+from zxxz_surface_code_circuits import make_zxxz_memory_circuit, make_zxxz_memory_circuits
+
+
+def test_make_zxxz_memory_circuits_matches_serial():
+    grid = list(itertools.product([3, 5], "XZ", [1, 4]))
+    results = dict(make_zxxz_memory_circuits(grid, workers=2))
+    assert results.keys() == set(grid)
+    for (d, b, r), circuit in results.items():
+        assert circuit == make_zxxz_memory_circuit(distance=d, basis=b, rounds=r)
+
+
+def test_make_zxxz_memory_circuits_out_dir(tmp_path):
+    grid = [(3, "Z", 3), (3, "X", 3)]
+    results = dict(make_zxxz_memory_circuits(grid, workers=1, out_dir=tmp_path))
+    for (d, b, r), path in results.items():
+        assert path.parent == tmp_path
+        assert stim.Circuit.from_file(path) == make_zxxz_memory_circuit(distance=d, basis=b, rounds=r)
@@ -0,0 +1,165 @@
+import dataclasses
+import functools
+import os
+import pathlib
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import sinter
+import stim
+
+from midout._make_circuit import make_circuit
+from midout.gen._noise import NoiseModel
+from zxxz_surface_code_circuits.batch import imap_unordered
+from zxxz_surface_code_circuits.zxxz_circuit import make_zxxz_memory_circuit
+
+FAMILIES = ("zxxz_memory", "midout")
+
+
+@dataclasses.dataclass(frozen=True)
+class CircuitSpec:
+    """The parameters of one noisy experiment circuit.
+
+    Attributes:
+        family: "zxxz_memory" for `make_zxxz_memory_circuit` or "midout" for
+            `midout._make_circuit.make_circuit`.
+        basis: The experiment basis. For "zxxz_memory" this is "X" or "Z". For
+            "midout" it is any basis accepted by `make_circuit` (e.g. "Y_braid").
+        distance: The code distance.
+        rounds: The number of memory rounds.
+        noise_strength: The physical error rate passed to the noise model.
+        noise_model: The name of a `NoiseModel` factory method, such as
+            "si1000" or "uniform_depolarizing".
+        boundary_rounds: The boundary rounds of "midout" experiments. Ignored
+            for "zxxz_memory".
+    """
+
+    family: str
+    basis: str
+    distance: int
+    rounds: int
+    noise_strength: float
+    noise_model: str = "si1000"
+    boundary_rounds: int = 0
+
+    def __post_init__(self):
+        if self.family not in FAMILIES:
+            raise ValueError(f"{self.family=} not in {FAMILIES=}")
+        if not callable(getattr(NoiseModel, self.noise_model, None)):
+            raise ValueError(f"{self.noise_model=} isn't a NoiseModel factory method.")
+
+    def json_metadata(self) -> Dict[str, Any]:
+        """Returns the metadata attached to the sinter task for this circuit."""
+        metadata = {
+            "family": self.family,
+            "b": self.basis,
+            "d": self.distance,
+            "r": self.rounds,
+            "p": self.noise_strength,
+            "noise": self.noise_model,
+        }
+        if self.family == "midout":
+            metadata["br"] = self.boundary_rounds
+        return metadata
+
+    def file_name(self) -> str:
+        """Returns the file name used when writing this circuit to disk."""
+        fields = ",".join(f"{k}={v}" for k, v in self.json_metadata().items() if k != "family")
+        return f"{self.family},{fields}.stim"
+
+    def make_circuit(self) -> stim.Circuit:
+        """Generates the noisy circuit described by this spec."""
+        noise = getattr(NoiseModel, self.noise_model)(self.noise_strength)
+        if self.family == "zxxz_memory":
+            circuit = make_zxxz_memory_circuit(
+                distance=self.distance, basis=self.basis, rounds=self.rounds
+            )
+            return noise.noisy_circuit(circuit)
+        return make_circuit(
+            basis=self.basis,
+            noise=noise,
+            boundary_rounds=self.boundary_rounds,
+            memory_rounds=self.rounds,
+            distance=self.distance,
+        )
+
+
+def _write_spec_circuit(spec: CircuitSpec, circuit_dir: str) -> Tuple[CircuitSpec, pathlib.Path]:
+    path = pathlib.Path(circuit_dir) / spec.file_name()
+    tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+    spec.make_circuit().to_file(tmp_path)
+    os.replace(tmp_path, path)
+    return spec, path
+
+
+def sinter_tasks(
+    specs: Iterable[CircuitSpec],
+    *,
+    circuit_dir: Union[str, pathlib.Path],
+    workers: Optional[int] = None,
+    decoder: Optional[str] = None,
+    overwrite: bool = False,
+) -> Iterator[sinter.Task]:
+    """Yields a `sinter.Task` for each circuit spec, for use with `sinter.collect`.
+
+    Circuits are generated by a pool of worker processes and written to
+    `circuit_dir`. Each task only references its circuit file (via
+    `circuit_path`), so the parent process never holds the circuits, and the
+    detector error models and strong ids are computed by sinter's own workers
+    when they load the files.
+
+    Args:
+        specs: The circuits to make tasks for.
+        circuit_dir: Where to write the circuit files. Created if missing.
+            Files that already exist are reused, so an interrupted collection
+            can be restarted without regenerating its circuits.
+        workers: Number of worker processes generating circuits. Defaults to
+            `os.cpu_count()`. When set to 1, circuits are generated in the
+            calling process.
+        decoder: The decoder to set on each task. Defaults to leaving it unset,
+            so the decoders passed to `sinter.collect` are used.
+        overwrite: Regenerate circuit files even if they already exist.
+
+    Yields:
+        The tasks, in the order their circuit files become available.
+
+    Example:
+        >>> specs = [
+        ...     CircuitSpec(family="zxxz_memory", basis=b, distance=d, rounds=d, noise_strength=1e-3)
+        ...     for d in [3, 5, 7]
+        ...     for b in "XZ"
+        ... ]
+        >>> sinter.collect(
+        ...     num_workers=8,
+        ...     tasks=sinter_tasks(specs, circuit_dir="circuits"),
+        ...     decoders=["pymatching"],
+        ...     max_shots=10**6,
+        ... )
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"{workers=} < 1")
+    circuit_dir = pathlib.Path(circuit_dir)
+    circuit_dir.mkdir(parents=True, exist_ok=True)
+
+    def task(spec: CircuitSpec, path: pathlib.Path) -> sinter.Task:
+        return sinter.Task(
+            circuit_path=path,
+            decoder=decoder,
+            json_metadata=spec.json_metadata(),
+        )
+
+    missing = []
+    for spec in specs:
+        path = circuit_dir / spec.file_name()
+        if not overwrite and path.exists():
+            yield task(spec, path)
+        else:
+            missing.append(spec)
+
+    for spec, path in imap_unordered(
+        functools.partial(_write_spec_circuit, circuit_dir=str(circuit_dir)),
+        missing,
+        workers=workers,
+    ):
+        yield task(spec, path)
@@ -0,0 +1,35 @@
+import stim
+
+from midout._make_circuit import make_circuit
+from midout.gen._noise import NoiseModel
+from zxxz_surface_code_circuits import CircuitSpec, make_zxxz_memory_circuit, sinter_tasks
+
+
+def test_sinter_tasks_write_circuit_files(tmp_path):
+    specs = [
+        CircuitSpec(family="zxxz_memory", basis="X", distance=3, rounds=2, noise_strength=1e-3),
+        CircuitSpec(family="midout", basis="Z", distance=3, rounds=2, noise_strength=1e-3, boundary_rounds=1),
+    ]
+    tasks = list(sinter_tasks(specs, circuit_dir=tmp_path, workers=1))
+    assert [task.json_metadata for task in tasks] == [
+        {"family": "zxxz_memory", "b": "X", "d": 3, "r": 2, "p": 1e-3, "noise": "si1000"},
+        {"family": "midout", "b": "Z", "d": 3, "r": 2, "p": 1e-3, "noise": "si1000", "br": 1},
+    ]
+    assert all(task.circuit is None for task in tasks)
+
+    noise = NoiseModel.si1000(1e-3)
+    assert stim.Circuit.from_file(tasks[0].circuit_path) == noise.noisy_circuit(
+        make_zxxz_memory_circuit(distance=3, basis="X", rounds=2)
+    )
+    assert stim.Circuit.from_file(tasks[1].circuit_path) == make_circuit(
+        basis="Z", noise=noise, boundary_rounds=1, memory_rounds=2, distance=3
+    )
+
+
+def test_sinter_tasks_reuse_existing_files(tmp_path):
+    spec = CircuitSpec(family="zxxz_memory", basis="Z", distance=3, rounds=2, noise_strength=1e-3)
+    (tmp_path / spec.file_name()).write_text("H 0\n")
+    (task,) = sinter_tasks([spec], circuit_dir=tmp_path, workers=1)
+    assert stim.Circuit.from_file(task.circuit_path) == stim.Circuit("H 0")
+    (task,) = sinter_tasks([spec], circuit_dir=tmp_path, workers=1, overwrite=True)
+    assert stim.Circuit.from_file(task.circuit_path) == spec.make_circuit()
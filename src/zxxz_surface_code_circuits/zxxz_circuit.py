@@ -6,9 +6,11 @@ from midout.circuits.steps._patches import (
     DR,
     UL,
     UR,
+    memoized_patch_factory,
     rectangular_surface_code_patch,
 )
 from midout.gen._builder import AtLayer, Builder
+from midout.gen._circuit_cache import CircuitCache
 from midout.gen._chunk import Chunk
 from midout.gen._flow import PauliString, Flow
 from midout.gen._flow_util import compile_chunks_into_circuit
@@ -84,9 +86,22 @@ def zxxz_surface_code_chunk(
     )
 
     def paulis(tile: Tile) -> PauliString:
-        return PauliString(
-            {k: v for k, v in zip(tile.ordered_data_qubits, "ZXXZ") if k is not None}
+        return PauliString.from_tile_data(tile, bases="ZXXZ")
+
+    tile_measurements = out.tracker.measurement_indices_batch(
+        [AtLayer(tile.measurement_qubit, save_layer)] for tile in patch.tiles
+    )
+    measured_tiles = [
+        tile
+        for tile in patch.tiles
+        if all(
+            q is None or measure_data_basis.get(q) == b
+            for q, b in zip(tile.ordered_data_qubits, "ZXXZ")
         )
+    ]
+    measured_tile_measurements = out.tracker.measurement_indices_batch(
+        [AtLayer(q, save_layer) for q in tile.used_set] for tile in measured_tiles
+    )
 
     flows = []
     if not init_data_basis:
@@ -94,31 +109,25 @@ def zxxz_surface_code_chunk(
             Flow(
                 center=tile.measurement_qubit,
                 start=paulis(tile),
-                measurement_indices=out.tracker.measurement_indices(
-                    [AtLayer(tile.measurement_qubit, save_layer)]
-                ),
+                measurement_indices=ms,
             )
-            for tile in patch.tiles
+            for tile, ms in zip(patch.tiles, tile_measurements)
         )
     if not measure_data_basis:
         flows.extend(
             Flow(
                 center=tile.measurement_qubit,
                 end=paulis(tile),
-                measurement_indices=out.tracker.measurement_indices(
-                    [AtLayer(tile.measurement_qubit, save_layer)]
-                ),
+                measurement_indices=ms,
             )
-            for tile in patch.tiles
+            for tile, ms in zip(patch.tiles, tile_measurements)
         )
     flows.extend(
         Flow(
             center=tile.measurement_qubit,
-            measurement_indices=out.tracker.measurement_indices(
-                [AtLayer(tile.measurement_qubit, save_layer)]
-            ),
+            measurement_indices=ms,
         )
-        for tile in patch.tiles
+        for tile, ms in zip(patch.tiles, tile_measurements)
         if all(
             q is None or init_data_basis.get(q) == b
             for q, b in zip(tile.ordered_data_qubits, "ZXXZ")
@@ -127,15 +136,9 @@ def zxxz_surface_code_chunk(
     flows.extend(
         Flow(
             center=tile.measurement_qubit,
-            measurement_indices=out.tracker.measurement_indices(
-                [AtLayer(q, save_layer) for q in tile.used_set]
-            ),
-        )
-        for tile in patch.tiles
-        if all(
-            q is None or measure_data_basis.get(q) == b
-            for q, b in zip(tile.ordered_data_qubits, "ZXXZ")
+            measurement_indices=ms,
         )
+        for tile, ms in zip(measured_tiles, measured_tile_measurements)
     )
     if obs is not None:
         start_obs = dict(obs.qubits)
@@ -166,6 +169,7 @@ def zxxz_surface_code_chunk(
     return Chunk(circuit=out.circuit, q2i=out.q2i, flows=flows)
 
 
+@memoized_patch_factory
 def make_ztop_qubit_patch(*, distance: int) -> Patch:
     def order_func(m: complex) -> List[complex]:
         if checkerboard_basis(m) == "Z":
@@ -240,7 +244,20 @@ def make_zxxz_memory_circuit(
     distance: int,
     basis: str,
     rounds: int,
+    cache: Optional[CircuitCache] = None,
 ) -> stim.Circuit:
+    if cache is not None:
+        return cache.get_or_make(
+            {
+                "generator": "zxxz_memory",
+                "distance": distance,
+                "basis": basis,
+                "rounds": rounds,
+            },
+            lambda: make_zxxz_memory_circuit(
+                distance=distance, basis=basis, rounds=rounds
+            ),
+        )
     chunks = make_zxxz_memory_experiment_chunks(
         distance=distance, basis=basis, rounds=rounds
     )